@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+"""Scaling of the spatial domain decomposition on a 100 km corridor."""
+
+import os
+import time
+
+import numpy as np
+
+from itstools.connectv2x.decomposition import DomainDecomposition
+from itstools.connectv2x.engine import PlatoonEngine
+from itstools.connectv2x.support import speed_pulse
+
+L_CORRIDOR = 100000  # [m]
+SPACING = 25  # [m]
+N_STEP = 600
+
+
+def lead_spd(x):
+    """ Leader speed drop of 20 m/s 2 Km before the corridor end"""
+    return speed_pulse(x, drop=20, delay=L_CORRIDOR + 2000, duration=2000)
+
+
+if __name__ == "__main__":
+    x0 = np.arange(L_CORRIDOR, 0, -SPACING, dtype=float)
+    engine = PlatoonEngine(x0, 25, sigma=0)
+    start = time.perf_counter()
+    engine.run(N_STEP, lead_spd)
+    reference = time.perf_counter() - start
+    print(f"engine        n={len(x0)}  time={reference:.3f} s")
+    for domains in sorted({1, 2, 4, 8, os.cpu_count()}):
+        corridor = DomainDecomposition(x0, 25, domains=domains, sigma=0)
+        start = time.perf_counter()
+        x, _, _ = corridor.run(N_STEP, lead_spd)
+        elapsed = time.perf_counter() - start
+        error = np.abs(x - engine.x).max()
+        print(
+            f"domains={domains:3d}  time={elapsed:.3f} s  "
+            f"speedup={reference / elapsed:5.2f}  error={error:.1e} m"
+        )
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+"""Accuracy vs step size of the integration schemes (engine and platoon chain)."""
+
+import time
+
+import numpy as np
+
+from itstools.connectv2x.engine import PlatoonEngine
+from itstools.connectv2x.support import speed_pulse
+from itstools.vplatoon.vehicles import RegularVehicle, DT
+
+N_VEH = 20
+T_TOTAL = 480  # [s]
+STEP_FACTORS = (0.25, 0.5, 1, 2, 3)
+
+
+def lead_spd(x):
+    """ Leader speed drop of 20 m/s between 5 and 7 Km"""
+    return speed_pulse(x, drop=20, delay=5000, duration=2000)
+
+
+def run_engine(scheme, dt):
+    """ Final engine state for a noise free run"""
+    x0 = np.flip(np.arange(N_VEH) * 5 / 2)
+    engine = PlatoonEngine(x0, 25, sigma=0, dt=dt, scheme=scheme)
+    engine.run(int(round(T_TOTAL / dt)), lead_spd)
+    return engine.x
+
+
+def run_chain(scheme, dt, t_total=60):
+    """ Final position of a platoon vehicle for a unit control step"""
+    veh = RegularVehicle(0, 20, 0, scheme=scheme, ts=dt)
+    for _ in range(int(round(t_total / dt))):
+        veh(1.0)
+    return veh.x_t
+
+
+def report(name, schemes, runner, reference):
+    for scheme in schemes:
+        for factor in STEP_FACTORS:
+            start = time.perf_counter()
+            value = runner(scheme, DT * factor)
+            elapsed = time.perf_counter() - start
+            error = np.max(np.abs(value - reference))
+            print(
+                f"{name:8s} {scheme:10s} dt={factor:5.2f} DT  "
+                f"error={error:10.3e} m  time={elapsed:.3f} s"
+            )
+
+
+if __name__ == "__main__":
+    report(
+        "engine",
+        ("euler", "ballistic", "heun"),
+        run_engine,
+        run_engine("heun", DT / 32),
+    )
+    report("platoon", ("euler", "heun", "rk4"), run_chain, run_chain("rk4", DT / 64))
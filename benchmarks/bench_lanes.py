@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+"""Thread-parallel stepping of array-backed lanes."""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from itstools.connectv2x.controller import SimulationControl
+from itstools.connectv2x.engine import PlatoonEngine
+from itstools.connectv2x.network import EngineLane, TrafficNetwork
+
+N_LANES = 8
+N_VEH = 50000  # Per lane
+N_STEP = 100
+
+
+def network():
+    """ A link of N_LANES array-backed lanes"""
+    net = TrafficNetwork(lanes_per_link=(N_LANES,))
+    link = net[next(iter(net))]
+    for n, key in enumerate(link):
+        link[key] = EngineLane(
+            PlatoonEngine(np.flip(np.arange(N_VEH) * 30.0), 25, seed=n)
+        )
+    return net
+
+
+if __name__ == "__main__":
+    for workers in sorted({None, 2, 4, os.cpu_count()}, key=lambda w: w or 0):
+        executor = None if workers is None else ThreadPoolExecutor(workers)
+        sim = SimulationControl(network(), N_STEP, executor=executor)
+        start = time.perf_counter()
+        sim.run_simulation()
+        elapsed = time.perf_counter() - start
+        print(f"threads={str(workers or 'serial'):>7s}  time={elapsed:.3f} s")
+        if executor is not None:
+            executor.shutdown()
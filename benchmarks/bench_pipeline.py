@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+"""Scaling of the wavefront pipeline on a single long platoon."""
+
+import os
+import time
+
+import numpy as np
+
+from itstools.connectv2x.engine import PlatoonEngine
+from itstools.connectv2x.pipeline import WavefrontPipeline
+from itstools.connectv2x.support import speed_pulse
+
+N_VEH = 10000
+N_STEP = 600
+
+
+def lead_spd(x):
+    """ Leader speed drop of 20 m/s between 5 and 7 Km"""
+    return speed_pulse(x, drop=20, delay=5000, duration=2000)
+
+
+if __name__ == "__main__":
+    x0 = np.flip(np.arange(N_VEH) * 30.0) + 3000
+    engine = PlatoonEngine(x0, 25, sigma=0)
+    start = time.perf_counter()
+    engine.run(N_STEP, lead_spd)
+    reference = time.perf_counter() - start
+    print(f"engine       time={reference:.3f} s")
+    for blocks in sorted({1, 2, 4, os.cpu_count()}):
+        pipeline = WavefrontPipeline(x0, 25, blocks=blocks, sigma=0)
+        start = time.perf_counter()
+        _, x, _ = pipeline.run(N_STEP, lead_spd, every=N_STEP)
+        elapsed = time.perf_counter() - start
+        error = np.abs(x[-1] - engine.x).max()
+        print(
+            f"blocks={blocks:3d}   time={elapsed:.3f} s  "
+            f"speedup={reference / elapsed:5.2f}  error={error:.1e} m"
+        )
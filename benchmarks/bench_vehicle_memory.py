@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+
+"""Memory footprint of the object-based vehicle API (bytes per vehicle)."""
+
+import gc
+import tracemalloc
+
+from itstools.connectv2x.carfollow import Tampere
+
+N_VEH = 100000
+
+
+def bytes_per_vehicle(n_veh: int = N_VEH) -> float:
+    """ Traced allocation per Tampere vehicle in a platoon of n_veh"""
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    veh_list = [
+        Tampere(x0=float(-i * 40), v0=25.0, veh_type="HDV") for i in range(n_veh)
+    ]
+    for i in range(1, n_veh):
+        veh_list[i].set_leader(veh_list[i - 1])
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (end - start) / n_veh
+
+
+if __name__ == "__main__":
+    print(f"Tampere: {bytes_per_vehicle():.1f} bytes/vehicle ({N_VEH} vehicles)")
@@ -0,0 +1,194 @@
+"""
+    Car following calibration on leader-follower trajectory pairs
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+import numpy as np
+
+from .carfollow import A_MAX, A_MIN, B, C_1, C_2, C_3, DELTA, S_0IDM, V_0
+from .engine import idm_acceleration, tampere_acceleration
+from .optimizer import cross_entropy
+from .vehicles import DT, K_X, U_I, W_I
+
+# ==============================================================================
+# Constants
+# ==============================================================================
+
+MODELS = ("tampere", "idm")
+
+# Default value and search bounds of each parameter
+DEFAULTS = {
+    "tampere": {"c1": C_1, "c2": C_2, "c3": C_3, "vd": U_I, "w": W_I, "k_x": K_X},
+    "idm": {"vd": V_0, "a_max": A_MAX, "b": B, "delta": DELTA, "s0": S_0IDM, "T": DT},
+}
+BOUNDS = {
+    "c1": (0.01, 2),
+    "c2": (0.01, 2),
+    "c3": (0.01, 2),
+    "vd": (15, 40),
+    "w": (3, 10),
+    "k_x": (0.1, 0.25),
+    "a_max": (0.2, 4),
+    "b": (0.5, 4),
+    "delta": (1, 6),
+    "s0": (0.5, 5),
+    "T": (0.3, 3),
+}
+
+# ==============================================================================
+# Functions
+# ==============================================================================
+
+
+def pairs_from_record(record) -> tuple:
+    """
+        Leader-follower pairs of a platoon record (steps, vehicles)
+
+        Returns x_lead, v_lead, x_fol, v_fol as (pairs, steps) arrays.
+    """
+    x, v = np.asarray(record.x), np.asarray(record.v, dtype=np.float64)
+    return x[:, :-1].T, v[:, :-1].T, x[:, 1:].T, v[:, 1:].T
+
+
+def replay_followers(
+    x_lead, v_lead, x0, v0, model: str = "tampere", dt: float = DT, **params
+):
+    """
+        Followers of replayed leaders for a batch of parameter vectors
+
+        x_lead, v_lead are (pairs, steps) leader trajectories and x0, v0 the
+        initial follower states (pairs,). Parameters are scalars or (P, 1)
+        columns, so followers of shape (P, pairs) advance together with the
+        update of PlatoonEngine (euler, noise free). Returns follower
+        positions and speeds of shape (steps, P, pairs).
+    """
+    if model not in MODELS:
+        raise ValueError(f"Unknown model {model}, use one of {MODELS}")
+    values = {**DEFAULTS[model], **params}
+    x_lead, v_lead = np.asarray(x_lead, dtype=float), np.asarray(v_lead, dtype=float)
+    n_steps = x_lead.shape[-1]
+    shape = np.broadcast_shapes(*(np.shape(p) for p in values.values()), np.shape(x0))
+    x = np.array(np.broadcast_to(x0, shape), dtype=float)
+    v = np.array(np.broadcast_to(v0, shape), dtype=float)
+    if model == "tampere":
+        s0, gamma = 1 / values["k_x"], 1 / (values["w"] * values["k_x"])
+        terms = (values["vd"], values["c1"], values["c2"], values["c3"], s0, gamma)
+    else:
+        terms = tuple(values[name] for name in ("vd", "a_max", "b", "delta", "s0", "T"))
+
+    x_out = np.empty((n_steps,) + shape)
+    v_out = np.empty((n_steps,) + shape)
+    with np.errstate(all="ignore"):
+        for k in range(n_steps):
+            x_out[k], v_out[k] = x, v
+            dv, s = v_lead[..., k] - v, x_lead[..., k] - x
+            if model == "tampere":
+                a = np.clip(tampere_acceleration(dv, s, v, *terms), A_MIN, A_MAX)
+            else:
+                a = idm_acceleration(dv, s, v, *terms)
+            np.maximum(v + a * dt, 0, out=v)
+            x += v * dt
+    return x_out, v_out
+
+
+def rmse(simulated, observed, axis=(0, -1)) -> np.ndarray:
+    """
+        Root mean square error over time and pairs (non finite -> inf)
+    """
+    with np.errstate(all="ignore"):
+        error = np.sqrt(np.mean((simulated - observed) ** 2, axis=axis))
+    return np.where(np.isfinite(error), error, np.inf)
+
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class Calibration:
+    """
+        Fit car following parameters to leader-follower trajectory pairs
+
+        The instance is a batch objective: called with a (P, D) array of
+        values of `names` it replays all leaders once for the P candidates
+        and returns the RMSE of the follower spacing (or speed, see
+        `measure`) of each candidate. Parameters not calibrated keep
+        `fixed` or default values. fit() minimizes it with the cross entropy
+        method of the optimizer module.
+    """
+
+    def __init__(
+        self,
+        x_lead,
+        v_lead,
+        x_fol,
+        v_fol,
+        model: str = "tampere",
+        names=("c1", "c2", "c3"),
+        measure: str = "spacing",
+        dt: float = DT,
+        **fixed,
+    ) -> None:
+        if measure not in ("spacing", "speed"):
+            raise ValueError(f"Unknown measure {measure}, use spacing or speed")
+        unknown = set(names) - set(DEFAULTS.get(model, names))
+        if unknown:
+            raise ValueError(
+                f"Parameters {sorted(unknown)} are not part of the {model} model"
+            )
+        self.x_lead, self.v_lead = np.atleast_2d(x_lead), np.atleast_2d(v_lead)
+        self.x_fol, self.v_fol = np.atleast_2d(x_fol), np.atleast_2d(v_fol)
+        self.model = model
+        self.names = tuple(names)
+        self.measure = measure
+        self.dt = dt
+        self.fixed = fixed
+        self.evaluations = 0
+
+    @property
+    def bounds(self) -> np.ndarray:
+        """ Default search bounds of the calibrated parameters"""
+        return np.array([BOUNDS[name] for name in self.names], dtype=float)
+
+    def simulate(self, theta) -> tuple:
+        """
+            Follower trajectories (steps, P, pairs) of a (P, D) batch
+        """
+        theta = np.atleast_2d(np.asarray(theta, dtype=float))
+        params = {name: theta[:, [j]] for j, name in enumerate(self.names)}
+        return replay_followers(
+            self.x_lead,
+            self.v_lead,
+            self.x_fol[:, 0],
+            self.v_fol[:, 0],
+            self.model,
+            self.dt,
+            **{**self.fixed, **params},
+        )
+
+    def __call__(self, theta) -> np.ndarray:
+        """ Error of each parameter vector of a (P, D) batch"""
+        x, v = self.simulate(theta)
+        self.evaluations += x.shape[1]
+        if self.measure == "speed":
+            return rmse(v, self.v_fol.T[:, None, :])
+        return rmse(
+            self.x_lead.T[:, None, :] - x, (self.x_lead - self.x_fol).T[:, None, :]
+        )
+
+    def fit(self, bounds=None, **kwargs) -> tuple:
+        """
+            Best parameters (as a dict) and their error
+        """
+        bounds = self.bounds if bounds is None else bounds
+        theta, value, _ = cross_entropy(self, bounds, **kwargs)
+        return dict(zip(self.names, theta.tolist())), value
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(model={self.model},"
+            f"pairs={len(self.x_lead)},names={self.names})"
+        )
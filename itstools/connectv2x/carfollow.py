@@ -9,6 +9,7 @@
 import numpy as np
 from math import sqrt
 from typing import Union
+from weakref import WeakValueDictionary
 from .vehicles import Vehicle, DT, K_X, W_I, U_I
 
 # ==============================================================================
@@ -41,11 +42,93 @@ SIGMA_A = 0.05
 # ==============================================================================
 
 
+class TrafficParameters:
+    """
+        Shared traffic parameters (flyweight)
+
+        Instances are interned: vehicles created with the same (u, w, k_x)
+        point to a single object instead of storing the values per vehicle.
+        Shared objects are read only, and the pool only keeps the ones still
+        referenced by some vehicle.
+    """
+
+    __slots__ = ["u", "w", "k_x", "s0", "gamma", "__weakref__"]
+
+    _pool = WeakValueDictionary()
+
+    def __new__(cls, u: float = U_I, w: float = W_I, k_x: float = K_X):
+        key = (u, w, k_x)
+        obj = cls._pool.get(key)
+        if obj is None:
+            obj = super().__new__(cls)
+            object.__setattr__(obj, "u", u)
+            object.__setattr__(obj, "w", w)
+            object.__setattr__(obj, "k_x", k_x)
+            object.__setattr__(obj, "s0", 1 / k_x)  # Minimum spacing
+            object.__setattr__(obj, "gamma", 1 / (w * k_x))  # Time gap
+            cls._pool[key] = obj
+        return obj
+
+    def __setattr__(self, name, value) -> None:
+        raise AttributeError(f"{self.__class__.__name__} is shared and read only")
+
+    def __reduce__(self) -> tuple:
+        """ Copies and unpickled objects are interned again"""
+        return self.__class__, (self.u, self.w, self.k_x)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(u={self.u},w={self.w},k_x={self.k_x})"
+
+
+class TampereParameters:
+    """
+        Shared Tampere coefficients (flyweight)
+
+        Interned and read only like TrafficParameters, use replace() to
+        change coefficients.
+    """
+
+    __slots__ = ["c1", "c2", "c3", "__weakref__"]
+
+    _pool = WeakValueDictionary()
+
+    def __new__(cls, c1: float = C_1, c2: float = C_2, c3: float = C_3):
+        key = (c1, c2, c3)
+        obj = cls._pool.get(key)
+        if obj is None:
+            obj = super().__new__(cls)
+            object.__setattr__(obj, "c1", c1)
+            object.__setattr__(obj, "c2", c2)
+            object.__setattr__(obj, "c3", c3)
+            cls._pool[key] = obj
+        return obj
+
+    def __setattr__(self, name, value) -> None:
+        raise AttributeError(f"{self.__class__.__name__} is shared and read only")
+
+    def __reduce__(self) -> tuple:
+        """ Copies and unpickled objects are interned again"""
+        return self.__class__, (self.c1, self.c2, self.c3)
+
+    def replace(self, **kwargs) -> "TampereParameters":
+        """
+            Shared parameters with some coefficients changed
+        """
+        values = {"c1": self.c1, "c2": self.c2, "c3": self.c3}
+        values.update(kwargs)
+        return self.__class__(**values)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(c1={self.c1},c2={self.c2},c3={self.c3})"
+
+
 class CarFollowLaw(Vehicle):
     """
         Generic Car Following Behavior
     """
 
+    __slots__ = ["behavior", "acc", "_vd", "_traffic"]
+
     def __init__(
         self,
         x0: float,
@@ -62,47 +145,51 @@ class CarFollowLaw(Vehicle):
             init_lane=l0,
             veh_type=veh_type,
             veh_lead=veh_lead,
-            **kwargs,
         )
         self.behavior = behavior
         self.acc = False
+        self._vd = None
         self.set_traffic(**kwargs)
 
     def set_traffic(self, **kwargs):
-        self._u = kwargs.get("u", U_I)
-        self._w = kwargs.get("w", W_I)
-        self._k_x = kwargs.get("k_x", K_X)
-        # self.u = u
-        # self.w = w
-        # self.k_x = k_x
+        self._traffic = TrafficParameters(
+            kwargs.get("u", U_I), kwargs.get("w", W_I), kwargs.get("k_x", K_X)
+        )
+
+    @property
+    def traffic(self) -> TrafficParameters:
+        """
+            Shared traffic parameters
+        """
+        return self._traffic
 
     @property
     def u(self) -> float:
         """
             Free flow speed
         """
-        return self._u
+        return self._traffic.u
 
     @property
     def w(self) -> float:
         """
             Shockwave speed
         """
-        return self._w
+        return self._traffic.w
 
     @property
     def k_x(self) -> float:
         """
             Jam density
         """
-        return self._k_x
+        return self._traffic.k_x
 
     @property
     def s0(self) -> float:
         """
             Minimum spacing
         """
-        return 1 / self.k_x
+        return self._traffic.s0
 
     @property
     def vl(self) -> float:
@@ -183,7 +270,7 @@ class Tampere(CarFollowLaw):
         Tampere Car Following Model
     """
 
-    __slots__ = ["_c1", "_c2", "_c3"]
+    __slots__ = ["_params"]
 
     def __init__(
         self,
@@ -205,53 +292,58 @@ class Tampere(CarFollowLaw):
         )
         self.set_parameters(**kwargs)
 
+    @property
+    def params(self) -> TampereParameters:
+        """
+            Shared Tampere coefficients
+        """
+        return self._params
+
     @property
     def c1(self) -> float:
         """
             Speed difference coefficient
         """
-        return self._c1
+        return self._params.c1
 
     @property
     def c2(self) -> float:
         """
             Spacing coefficient
         """
-        return self._c2
+        return self._params.c2
 
     @property
     def c3(self) -> float:
         """        
             Tampere coefficient
         """
-        return self._c3
+        return self._params.c3
 
     @c1.setter
     def c1(self, value: float = C_1) -> None:
-        self._c1 = value
+        self._params = self._params.replace(c1=value)
 
     @c2.setter
     def c2(self, value: float = C_2) -> None:
-        self._c2 = value
+        self._params = self._params.replace(c2=value)
 
     @c3.setter
     def c3(self, value: float = C_3) -> None:
-        self._c3 = value
+        self._params = self._params.replace(c3=value)
 
-    def set_parameters(self, c1=C_1, c2=C_2, c3=C_3) -> None:
+    def set_parameters(self, c1=C_1, c2=C_2, c3=C_3, **kwargs) -> None:
         """
             Set default parameters
         """
-        self.c1 = c1
-        self.c2 = c2
-        self.c3 = c3
+        self._params = TampereParameters(c1, c2, c3)
 
     @property
     def s_d(self) -> float:
         """
             Determine desired spacing  (d + gamma * v )
         """
-        return self.s0 + 1 / (self.w * self.k_x) * self.v_t
+        return self.s0 + self._traffic.gamma * self.v_t
 
     def cong_acc(self) -> float:
         """
@@ -0,0 +1,177 @@
+"""
+    V2V communication channel
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+import numpy as np
+
+from .engine import PlatoonEngine
+from .vehicles import DT
+
+# ==============================================================================
+# Constants
+# ==============================================================================
+
+DEPTH = 10  # Broadcasts kept per vehicle
+LATENCY = 0.1  # Base latency [s]
+JITTER = 0.05  # Mean of the exponential latency jitter [s]
+LOSS = 0.1  # Packet loss probability
+V2V_RANGE = 300  # Communication range between vehicles [m]
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class V2VChannel:
+    """
+        Broadcast channel with latency, range and packet loss
+
+        Every vehicle writes its state (x, v, a) into its own ring buffer of
+        `depth` broadcasts, so the buffers are (depth,) + shape arrays with
+        vehicles on the last axis. Receivers read a copy of a sender's state
+        delayed by floor(latency / dt) broadcasts, latency being the base
+        latency plus exponential jitter. Packets are lost with probability
+        `loss` or when sender and receiver are farther than `radius`; the
+        receiver then keeps its last received copy. Delays and losses of all
+        links are sampled in one batch per call.
+    """
+
+    def __init__(
+        self,
+        shape,
+        depth: int = DEPTH,
+        latency: float = LATENCY,
+        jitter: float = JITTER,
+        loss: float = LOSS,
+        radius: float = V2V_RANGE,
+        dt: float = DT,
+        seed=None,
+    ) -> None:
+        shape = (shape,) if np.ndim(shape) == 0 else tuple(shape)
+        self.depth = depth
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.radius = radius
+        self.dt = dt
+        self.rng = np.random.default_rng(seed)
+        self.x = np.zeros((depth,) + shape)
+        self.v = np.zeros((depth,) + shape)
+        self.a = np.zeros((depth,) + shape)
+        self.k = 0  # Broadcasts performed
+        # Last copy received by each vehicle (k = -1 when none)
+        self.rx_x = np.zeros(shape)
+        self.rx_v = np.zeros(shape)
+        self.rx_a = np.zeros(shape)
+        self.rx_k = np.full(shape, -1, dtype=np.int64)
+        self.sent = 0
+        self.delivered = 0
+
+    def broadcast(self, x, v, a) -> None:
+        """
+            Write the current state of every vehicle into its ring buffer
+        """
+        slot = self.k % self.depth
+        self.x[slot] = x
+        self.v[slot] = v
+        self.a[slot] = a
+        self.k += 1
+
+    def delays(self, shape) -> np.ndarray:
+        """
+            Delay in broadcasts of a batch of packets
+        """
+        latency = self.latency + self.rng.exponential(self.jitter, shape)
+        return np.minimum(np.floor(latency / self.dt).astype(np.int64), self.depth - 1)
+
+    def receive(self, senders, receivers, x_receivers) -> tuple:
+        """
+            State of senders as last received by receivers
+
+            senders and receivers index the last axis, x_receivers are the
+            receiver positions. Returns x, v, a and the age [s] of the copies
+            (inf when nothing was received yet).
+        """
+        senders, receivers = np.asarray(senders), np.asarray(receivers)
+        shape = self.rx_k[..., receivers].shape
+        delay = self.delays(shape)
+        slot = (self.k - 1 - delay) % self.depth
+        lead = np.ogrid[tuple(slice(n) for n in shape[:-1]) + (slice(1),)][:-1]
+        index = (slot,) + tuple(lead) + (senders,)
+
+        x, v, a = self.x[index], self.v[index], self.a[index]
+        sent_k = self.k - 1 - delay
+        delivered = (
+            (sent_k >= 0)
+            & (self.rng.random(shape) >= self.loss)
+            & (np.abs(x - x_receivers) <= self.radius)
+            & (sent_k > self.rx_k[..., receivers])
+        )
+        self.sent += delay.size
+        self.delivered += int(delivered.sum())
+
+        rx = (Ellipsis, receivers)
+        self.rx_x[rx] = np.where(delivered, x, self.rx_x[rx])
+        self.rx_v[rx] = np.where(delivered, v, self.rx_v[rx])
+        self.rx_a[rx] = np.where(delivered, a, self.rx_a[rx])
+        self.rx_k[rx] = np.where(delivered, sent_k, self.rx_k[rx])
+
+        held = self.rx_k[rx]
+        age = np.where(held >= 0, (self.k - 1 - held) * self.dt, np.inf)
+        return self.rx_x[rx], self.rx_v[rx], self.rx_a[rx], age
+
+    @property
+    def delivery_ratio(self) -> float:
+        """ Fraction of packets delivered"""
+        return self.delivered / self.sent if self.sent else 1.0
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(latency={self.latency},"
+            f"loss={self.loss},radius={self.radius})"
+        )
+
+
+class ConnectedPlatoonEngine(PlatoonEngine):
+    """
+        Platoon engine whose connected followers see their leader through V2V
+
+        After each state shift every vehicle broadcasts on the channel.
+        Connected followers (mask over vehicles) replace the sensed leader
+        state by the last received copy, extrapolated over its age with the
+        received speed. Others, and connected followers that have not
+        received anything yet, use the exact leader state.
+    """
+
+    def __init__(self, x0, v0, channel: V2VChannel, connected=True, **kwargs) -> None:
+        super().__init__(x0, v0, **kwargs)
+        if self.scheme == "heun":
+            raise ValueError("The heun scheme would read the channel twice per step")
+        self.channel = channel
+        self.connected = np.broadcast_to(connected, self.shape)[..., 1:]
+        self.senders = np.arange(len(self) - 1)
+        self.receivers = np.arange(1, len(self))
+        self.channel.broadcast(self.x, self.v, self.a)
+
+    def leader_state(self, x, v) -> tuple:
+        """
+            Leader state, received through the channel for connected vehicles
+        """
+        rx_x, rx_v, _, age = self.channel.receive(
+            self.senders, self.receivers, x[..., 1:]
+        )
+        use = self.connected & np.isfinite(age)
+        x_lead = np.where(use, rx_x + rx_v * np.where(use, age, 0), x[..., :-1])
+        v_lead = np.where(use, rx_v, v[..., :-1]).astype(v.dtype)
+        return x_lead, v_lead
+
+    def shift_state(self, control=None) -> None:
+        """
+            Shift state and broadcast it
+        """
+        super().shift_state(control)
+        self.channel.broadcast(self.x, self.v, self.a)
@@ -7,27 +7,114 @@
 # ==============================================================================
 
 from .network import TrafficNetwork
+from .vehicles import DT
 
+from concurrent.futures import Executor, ThreadPoolExecutor
 from typing import Iterator
 
+import numpy as np
+
 # ==============================================================================
 # Constants
 # ==============================================================================
 
 T_TOTAL = 720  # Simulation time
+SHIFT_CONG = 500  # Latest message acceptance time [s]
+PERCEP_RADIOUS = 100  # Mean acceptance advance before SHIFT_CONG [s]
 
 # ==============================================================================
 # Classes
 # ==============================================================================
 
 
+class AcceptanceSchedule:
+    """ Time ordered queue of message acceptances
+
+        Acceptance times of the CAVs are sorted once; each step a cursor
+        advances over the times already reached (binary search), so only
+        the vehicles accepting at that step are touched. CAVs that accepted
+        a control meanwhile are skipped. Acceptances are logged as
+        (time, vehicle idx).
+    """
+
+    def __init__(self, vehicles, t_accept, message) -> None:
+        self.vehicles = list(vehicles)
+        t_accept = np.asarray(t_accept, dtype=float)
+        if t_accept.shape != (len(self.vehicles),):
+            raise ValueError("One acceptance time per vehicle is required")
+        self.order = np.argsort(t_accept, kind="stable")
+        self.times = t_accept[self.order]
+        self.message = message
+        self.cursor = 0
+        self.log = []
+
+    @classmethod
+    def sample(
+        cls,
+        vehicles,
+        message,
+        t_max: float = SHIFT_CONG,
+        t_mean: float = PERCEP_RADIOUS,
+        seed=None,
+    ) -> "AcceptanceSchedule":
+        """ Schedule the CAVs of vehicles at t_max - Exp(t_mean) within (0, t_max)
+
+            The truncated exponential is sampled in bulk by inverting its
+            cumulative distribution.
+        """
+        cavs = [veh for veh in vehicles if veh.type == "CAV"]
+        rng = np.random.default_rng(seed)
+        mass = -np.expm1(-t_max / t_mean)  # Probability of an advance below t_max
+        advance = -t_mean * np.log1p(-mass * rng.random(len(cavs)))
+        return cls(cavs, t_max - advance, message)
+
+    def __len__(self) -> int:
+        """ Pending acceptances"""
+        return len(self.times) - self.cursor
+
+    def accept(self, t: float) -> int:
+        """ Register the message on vehicles accepting up to time t"""
+        stop = int(np.searchsorted(self.times, t, side="right"))
+        accepted = 0
+        for i in self.order[self.cursor : stop].tolist():
+            veh = self.vehicles[i]
+            if not veh.acc:
+                veh.register_control_speed(self.message)
+                self.log.append((t, veh.idx))
+                accepted += 1
+        self.cursor = stop
+        return accepted
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(pending={len(self)})"
+
+
 class SimulationControl:
     """  Simulation control
+
+        With an executor (a concurrent.futures.Executor or a number of
+        threads) each step has two phases. Lanes marked parallel (e.g.
+        EngineLane) are stepped by the executor while the other lanes are
+        stepped in order by the calling thread; monitors run once all lanes
+        are done, so results do not depend on thread scheduling. Merges are
+        not solved yet (solve_merges is a no-op).
+
+        A pool created from a number of threads belongs to the simulation:
+        it is shut down at the end of run_simulation (or by close) and
+        created again when needed. Executors given by the caller are left
+        open.
     """
 
-    def __init__(self, traffic_network, time_total):
+    def __init__(self, traffic_network, time_total=T_TOTAL, executor=None):
         self.tfnet = traffic_network
         self.time_iterator = time_total
+        self.k = 0  # Current time step
+        self._monitors = []
+        self._schedule = None
+        self._threads = None  # Size of the owned pool
+        if executor is not None and not isinstance(executor, Executor):
+            self._threads, executor = executor, None
+        self._executor = executor
 
     def set_demand(self, demand):
         self._dmd = demand
@@ -44,35 +131,64 @@ class SimulationControl:
 
     @time_iterator.setter
     def time_iterator(self, value=T_TOTAL) -> None:
-        self._tsim = range(T_TOTAL)
+        self._tsim = range(value)
 
-    def solve_merges(self) -> None:
-        """ Solve potential merges for a network """
+    def add_monitor(self, monitor) -> None:
+        """ Register a callable monitor(k, network) run after each step.
 
-    def run_simulation(self) -> None:
-        """ Execute a traffic simulator"""
-        for _ in self.time_iterator:
-            # self.solve_merges() # 1 link at a time
-            for link in self.tfnet:
-                link.evolve_step()
+            The simulation stops when a monitor returns True.
+        """
+        self._monitors.append(monitor)
 
-        # for t, u in zip(time, lead_acc):
-        #     for veh in veh_list:
-        #         if veh.type == "CAV" and not veh.acc:
-        #             t_accept = T_ACCEPT[veh.idx]
-        #             # t_accept = 100
-        #             if t >= t_accept:
-        #                 acc = U_I + speed_change(time, SPEED_REDUCTION, SHIFT_CONG - t)
-        #                 veh.register_control_speed(acc)
-        #         veh.step_evolution(control=u)
-
-    # for lk in self.network:
-
-    #     ID_CAV = np.random.randint(1, N - 1, int(N * MPR))  # Id Connected Vehicles
-
-    # # ID_CAV = (2,)
-    # D_CLASS = {k: "CAV" for k in ID_CAV}
-    # V_CLASS = [D_CLASS.get(i, "HDV") for i in range(N)]  # All vehicle types
-    # T_ACCEPT = SHIFT_CONG - np.random.exponential(PERCEP_RADIOUS, N * 1000)
-    # T_ACCEPT = T_ACCEPT[(T_ACCEPT > 0) & (T_ACCEPT < SHIFT_CONG)]
-    # T_ACCEPT = np.random.choice(T_ACCEPT, N)
+    def set_schedule(self, schedule: AcceptanceSchedule, dt: float = DT) -> None:
+        """ Consume an acceptance schedule before each step"""
+        self._schedule = schedule
+        self._dt = dt
+
+    def solve_merges(self) -> None:
+        """ Solve potential merges for a network (not implemented, no-op)"""
+
+    def close(self) -> None:
+        """ Shut down the thread pool owned by the simulation, if any"""
+        if self._threads is not None and self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> "SimulationControl":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def evolve_lanes(self) -> None:
+        """ Lane phase of a step, parallel lanes on the executor"""
+        if self._executor is None and self._threads is not None:
+            self._executor = ThreadPoolExecutor(self._threads)
+        if self._executor is None:
+            for link in self.tfnet.values():
+                link.evolve_step()
+            return
+        lanes = [lane for link in self.tfnet.values() for lane in link.values()]
+        futures = [
+            self._executor.submit(lane.evolve_step) for lane in lanes if lane.parallel
+        ]
+        for lane in lanes:
+            if not lane.parallel:
+                lane.evolve_step()
+        for future in futures:
+            future.result()
+
+    def run_simulation(self) -> int:
+        """ Execute a traffic simulator, returns the number of steps run"""
+        try:
+            for k in self.time_iterator:
+                if self._schedule is not None:
+                    self._schedule.accept(k * self._dt)
+                self.evolve_lanes()
+                self.solve_merges()  # No-op, merges are not solved yet
+                self.k = k + 1
+                if any([monitor(self.k, self.tfnet) for monitor in self._monitors]):
+                    break
+        finally:
+            self.close()
+        return self.k
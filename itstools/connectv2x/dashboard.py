@@ -0,0 +1,146 @@
+"""
+    Live dashboard for running simulations
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+import time
+from functools import partial
+
+import numpy as np
+from bokeh.layouts import row
+from bokeh.models import ColumnDataSource
+from bokeh.palettes import Viridis256
+from bokeh.plotting import figure
+from bokeh.transform import linear_cmap
+
+from .network import L_MAX
+from .vehicles import DT, U_I
+
+# ==============================================================================
+# Constants
+# ==============================================================================
+
+EVERY = 10  # Steps between updates
+MIN_INTERVAL = 0.5  # Minimum wall time between updates [s]
+ROLLOVER = 50000  # Trajectory points kept in the browser
+X_BIN = 500  # Speed field resolution [m]
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class LiveDashboard:
+    """
+        Live view of a running simulation
+
+        Register it as a monitor of SimulationControl. Every `every` steps,
+        and at most once per `min_interval` seconds of wall time, it streams
+        new trajectory points (rolled over), the speed field along the road
+        and the vehicle count to bokeh ColumnDataSources. Between updates a
+        call costs a counter check only.
+
+        With a bokeh server document (doc) updates are scheduled with
+        add_next_tick_callback, so the simulation can run in its own thread.
+        Calling abort() stops the simulation at the next step.
+    """
+
+    def __init__(
+        self,
+        every: int = EVERY,
+        min_interval: float = MIN_INTERVAL,
+        rollover: int = ROLLOVER,
+        x_bin: float = X_BIN,
+        length: float = L_MAX,
+        dt: float = DT,
+        doc=None,
+    ) -> None:
+        self.every = every
+        self.min_interval = min_interval
+        self.rollover = rollover
+        self.dt = dt
+        self.doc = doc
+        self.x_edges = np.arange(0, length + x_bin, x_bin)
+        self.trajectories = ColumnDataSource(dict(t=[], x=[], v=[]))
+        self.speed_field = ColumnDataSource(
+            dict(
+                x=self.x_edges[:-1] + x_bin / 2,
+                v=np.full(len(self.x_edges) - 1, np.nan),
+            )
+        )
+        self.counts = ColumnDataSource(dict(t=[], n=[]))
+        self.updates = 0
+        self._last = -np.inf
+        self._aborted = False
+
+    def abort(self) -> None:
+        """ Request the simulation to stop"""
+        self._aborted = True
+
+    def collect(self, network) -> tuple:
+        """ Positions and speeds of all vehicles in the network"""
+        states = [lane.state() for link in network.values() for lane in link.values()]
+        if not states:
+            return np.zeros(0), np.zeros(0)
+        x, v = zip(*states)
+        return np.concatenate(x), np.concatenate(v)
+
+    def __call__(self, k: int, network) -> bool:
+        """ Monitor callback, returns True to stop the simulation"""
+        if k % self.every:
+            return self._aborted
+        now = time.perf_counter()
+        if now - self._last < self.min_interval:
+            return self._aborted
+        self._last = now
+        self.update(k * self.dt, *self.collect(network))
+        return self._aborted
+
+    def update(self, t: float, x, v) -> None:
+        """ Push the state at time t to the sources"""
+        n_bins = len(self.x_edges) - 1
+        cell = np.digitize(x, self.x_edges) - 1
+        inside = (cell >= 0) & (cell < n_bins)
+        count = np.bincount(cell[inside], minlength=n_bins)
+        total = np.bincount(cell[inside], weights=v[inside], minlength=n_bins)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            field = total / count
+        new_points = dict(t=np.full(len(x), t), x=x, v=v)
+        new_count = dict(t=[t], n=[len(x)])
+        if self.doc is None:
+            self.push(new_points, field, new_count)
+        else:
+            self.doc.add_next_tick_callback(
+                partial(self.push, new_points, field, new_count)
+            )
+        self.updates += 1
+
+    def push(self, new_points, field, new_count) -> None:
+        """ Stream new data into the sources"""
+        self.trajectories.stream(new_points, rollover=self.rollover)
+        self.speed_field.data = dict(self.speed_field.data, v=field)
+        self.counts.stream(new_count)
+
+    def layout(self):
+        """ Bokeh layout with trajectories, speed field and vehicle count"""
+        mapper = linear_cmap(
+            field_name="v", palette=list(reversed(Viridis256)), low=0, high=U_I
+        )
+        traj = figure(title="Trajectories", height=400, width=400)
+        traj.scatter(x="t", y="x", color=mapper, size=2, source=self.trajectories)
+        traj.xaxis.axis_label = "Time [secs]"
+        traj.yaxis.axis_label = "Position [m]"
+
+        spd = figure(title="Speed field", height=400, width=400, y_range=(0, U_I + 5))
+        spd.line(x="x", y="v", source=self.speed_field)
+        spd.xaxis.axis_label = "Position [m]"
+        spd.yaxis.axis_label = "Speed [m/s]"
+
+        cnt = figure(title="Vehicles", height=400, width=400)
+        cnt.line(x="t", y="n", source=self.counts)
+        cnt.xaxis.axis_label = "Time [secs]"
+        cnt.yaxis.axis_label = "Vehicles"
+        return row(traj, spd, cnt)
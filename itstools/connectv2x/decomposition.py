@@ -0,0 +1,317 @@
+"""
+    Spatial domain decomposition of a corridor across processes
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+import multiprocessing as mp
+import os
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from .carfollow import A_MAX, A_MIN, C_1, C_2, C_3, SIGMA_A
+from .engine import tampere_acceleration
+from .pipeline import TIMEOUT, join_workers
+from .vehicles import DT, K_X, U_I, W_I
+
+# ==============================================================================
+# Constants
+# ==============================================================================
+
+# Columns of the migration buffers
+MIGRANT = ("idx", "x", "v", "a")
+
+# ==============================================================================
+# Functions
+# ==============================================================================
+
+
+def _run_domain(spec: dict) -> None:
+    """
+        Worker loop of a subdomain
+    """
+    segments = {key: SharedMemory(name=name) for key, name in spec["names"].items()}
+    try:
+        arrays = {
+            key: np.ndarray(shape, dtype=np.float64, buffer=segments[key].buf)
+            for key, shape in spec["shapes"].items()
+        }
+        Subdomain(spec, arrays).run(spec["n_steps"], spec["control"], spec["barrier"])
+    except BaseException:
+        spec["barrier"].abort()  # Release the other domains
+        raise
+    finally:
+        for segment in segments.values():
+            segment.close()
+
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class Subdomain:
+    """
+        Vehicles of the corridor section [lower, upper) of a domain
+
+        State arrays are kept head first. Each step:
+
+            1. shift the state with the last accelerations (euler)
+            2. vehicles past `upper` leave through the outbox      | barrier
+            3. migrants of the upstream domain join at the tail
+            4. publish the tail as ghost of the upstream domain     | barrier
+            5. accelerations, the head following the nearest ghost downstream
+
+        Ghosts and outboxes live in shared memory and are written and read
+        on opposite sides of a barrier.
+    """
+
+    def __init__(self, spec: dict, arrays: dict) -> None:
+        self.d = spec["domain"]
+        self.upper = spec["upper"]
+        self.idx, self.x, self.v = spec["idx"], spec["x0"], spec["v0"]
+        self.a = np.zeros_like(self.x)
+        self.params = spec["params"]
+        self.dt = spec["dt"]
+        self.rng = np.random.default_rng(spec["seed"])
+        self.ghost = arrays["ghost"]  # (domains, 3): present, x, v
+        self.outbox = arrays["outbox"]  # (domains, capacity, 4)
+        self.moved = arrays["moved"]  # (domains,) migrants per domain
+        self.result = arrays["result"]  # (3, n): x, v, a by vehicle idx
+
+    def shift(self) -> None:
+        """ Euler update of speeds and positions"""
+        np.maximum(self.v + self.a * self.dt, 0, out=self.v)
+        self.x += self.v * self.dt
+
+    def emigrate(self) -> None:
+        """ Move the vehicles past the upper edge to the outbox"""
+        n_out = int(np.searchsorted(-self.x, -self.upper, side="right"))
+        capacity = self.outbox.shape[1]
+        if n_out > capacity:
+            raise RuntimeError(
+                f"{n_out} vehicles left domain {self.d} in one step, "
+                f"capacity is {capacity}"
+            )
+        if n_out:
+            self.outbox[self.d, :n_out] = np.stack(
+                [arr[:n_out] for arr in (self.idx, self.x, self.v, self.a)], axis=-1
+            )
+        self.moved[self.d] = n_out
+        self.idx, self.x, self.v, self.a = (
+            arr[n_out:] for arr in (self.idx, self.x, self.v, self.a)
+        )
+
+    def immigrate(self) -> None:
+        """ Append the migrants of the upstream domain at the tail"""
+        if self.d == 0:
+            return
+        n_in = int(self.moved[self.d - 1])
+        if not n_in:
+            return
+        incoming = self.outbox[self.d - 1, :n_in].T
+        self.idx, self.x, self.v, self.a = (
+            np.concatenate([arr, new])
+            for arr, new in zip((self.idx, self.x, self.v, self.a), incoming)
+        )
+
+    def publish(self) -> None:
+        """ Tail state as ghost leader of the upstream domain"""
+        if len(self.x):
+            self.ghost[self.d] = 1, self.x[-1], self.v[-1]
+        else:
+            self.ghost[self.d] = 0, 0, 0
+
+    def leader(self) -> tuple:
+        """ Ghost leader of the head vehicle, None for the corridor leader"""
+        for g in self.ghost[self.d + 1 :]:
+            if g[0]:
+                return g[1], g[2]
+        return None
+
+    def acceleration(self, control) -> None:
+        """ Tampere accelerations, head vehicle following its ghost leader"""
+        p = self.params
+        n = len(self.x)
+        if not n:
+            return
+        ghost = self.leader()
+        if ghost is None:
+            x_lead, v_lead, fol = self.x[:-1], self.v[:-1], slice(1, None)
+        else:
+            x_lead, v_lead, fol = (
+                np.r_[ghost[0], self.x[:-1]],
+                np.r_[ghost[1], self.v[:-1]],
+                slice(None),
+            )
+        acc = tampere_acceleration(
+            v_lead - self.v[fol],
+            x_lead - self.x[fol],
+            self.v[fol],
+            p["vd"],
+            p["c1"],
+            p["c2"],
+            p["c3"],
+            1 / p["k_x"],
+            1 / (p["w"] * p["k_x"]),
+        )
+        if p["sigma"]:
+            acc += p["sigma"] * self.rng.standard_normal(acc.shape)
+        self.a[fol] = np.clip(acc, A_MIN, A_MAX)
+        if ghost is None:
+            vd = (
+                control(self.x[0])
+                if callable(control)
+                else (p["u"] if control is None else control)
+            )
+            self.a[0] = np.clip(p["c3"] * (vd - self.v[0]) / 4, A_MIN, A_MAX)
+
+    def run(self, n_steps: int, control, barrier) -> None:
+        """ Advance n_steps in lockstep with the other domains"""
+        for _ in range(n_steps):
+            self.shift()
+            self.emigrate()
+            barrier.wait()
+            self.immigrate()
+            self.publish()
+            barrier.wait()
+            self.acceleration(control)
+        ids = self.idx.astype(np.int64)
+        self.result[:, ids] = self.x, self.v, self.a
+
+
+class DomainDecomposition:
+    """
+        Single lane corridor split in spatial subdomains, one process each
+
+        Vehicles belong to the domain holding their position and migrate
+        downstream when they cross an edge. Every step each domain publishes
+        its tail vehicle as a ghost so the head of the upstream domain can
+        follow it; ghosts and migrants are exchanged through
+        multiprocessing.shared_memory with two barriers per step (see
+        Subdomain). The corridor leader follows `control` like the
+        PlatoonEngine leader.
+
+        Outboxes hold `capacity` migrants per step, by default the vehicles
+        at jam density within the distance travelled in one step at the
+        highest expected speed; a domain losing more vehicles in one step
+        fails.
+
+        Edges default to equal vehicle counts at start. Parameters are
+        shared scalars; noise free runs match PlatoonEngine (euler), with
+        noise each domain draws its own stream.
+    """
+
+    def __init__(
+        self,
+        x0,
+        v0,
+        domains: int = None,
+        edges=None,
+        u: float = U_I,
+        w: float = W_I,
+        k_x: float = K_X,
+        c1: float = C_1,
+        c2: float = C_2,
+        c3: float = C_3,
+        vd: float = U_I,
+        sigma: float = SIGMA_A,
+        dt: float = DT,
+        capacity: int = None,
+        timeout: float = TIMEOUT,
+        seed=None,
+    ) -> None:
+        self.x0 = np.array(x0, dtype=np.float64)
+        if self.x0.ndim != 1 or np.any(np.diff(self.x0) > 0):
+            raise ValueError("Positions must be a single lane sorted head first")
+        n = len(self.x0)
+        self.v0 = np.array(np.broadcast_to(v0, n), dtype=np.float64)
+        if edges is None:
+            domains = os.cpu_count() if domains is None else domains
+            cut = np.linspace(0, n, min(domains, n) + 1).round().astype(int)[1:-1]
+            edges = (self.x0[cut - 1] + self.x0[cut]) / 2
+        self.edges = np.sort(np.asarray(edges, dtype=float))  # Interior edges
+        self.params = {
+            "u": u,
+            "w": w,
+            "k_x": k_x,
+            "c1": c1,
+            "c2": c2,
+            "c3": c3,
+            "vd": vd,
+            "sigma": sigma,
+        }
+        self.dt = dt
+        if capacity is None:
+            v_max = max(self.v0.max(initial=0), u, vd) + A_MAX * dt
+            capacity = int(np.ceil(v_max * dt * k_x)) + 1
+        self.capacity = min(capacity, n)
+        self.timeout = timeout
+        self.seed = seed
+
+    @property
+    def domains(self) -> int:
+        """ Number of subdomains (processes)"""
+        return len(self.edges) + 1
+
+    def run(self, n_steps: int, control=None) -> tuple:
+        """
+            Advance n_steps, returns final positions, speeds and accelerations
+        """
+        n, n_dom = len(self.x0), self.domains
+        shapes = {
+            "ghost": (n_dom, 3),
+            "outbox": (n_dom, self.capacity, len(MIGRANT)),
+            "moved": (n_dom,),
+            "result": (3, n),
+        }
+        segments = {
+            key: SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+            for key, shape in shapes.items()
+        }
+        try:
+            names = {key: segment.name for key, segment in segments.items()}
+            barrier = mp.Barrier(n_dom, timeout=self.timeout)
+            upper = np.r_[self.edges, np.inf]
+            domain = np.searchsorted(self.edges, self.x0, side="right")
+            workers = []
+            for d in range(n_dom):
+                own = np.flatnonzero(domain == d)
+                spec = {
+                    "domain": d,
+                    "upper": upper[d],
+                    "idx": own.astype(np.float64),
+                    "x0": self.x0[own],
+                    "v0": self.v0[own],
+                    "params": self.params,
+                    "dt": self.dt,
+                    "seed": None if self.seed is None else self.seed + d,
+                    "names": names,
+                    "shapes": shapes,
+                    "n_steps": n_steps,
+                    "control": control,
+                    "barrier": barrier,
+                }
+                workers.append(mp.Process(target=_run_domain, args=(spec,)))
+            for worker in workers:
+                worker.start()
+            failed = join_workers(workers)
+            if failed:
+                raise RuntimeError(f"Subdomains {failed} failed")
+            result = np.ndarray(
+                shapes["result"], dtype=np.float64, buffer=segments["result"].buf
+            )
+            return tuple(result.copy())
+        finally:
+            for segment in segments.values():
+                segment.close()
+                segment.unlink()
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(n={len(self.x0)},"
+            f"domains={self.domains},capacity={self.capacity})"
+        )
@@ -0,0 +1,252 @@
+"""
+    Congestion detection from CAV probe speeds
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+from itertools import chain
+
+import numpy as np
+
+from .messages import SPEED_REDUCTION, Msg2
+from .network import L_MAX
+from .simulatorinf2veh import range_query
+from .vehicles import DT
+
+# ==============================================================================
+# Constants
+# ==============================================================================
+
+X_BIN = 100  # Spatial bin [m]
+FORGET = 0.9  # Weight kept by past samples after each update
+V_CONGESTION = 15  # Congested below this mean speed [m/s]
+MIN_WEIGHT = 1.0  # Minimum sample weight of an observed bin
+ANTICIPATION = 1000  # Distance between speed drop and front [m]
+HORIZON = 3000  # CAVs upstream of a front reached by its message [m]
+TOLERANCE = 200  # Front displacement triggering a new message [m]
+
+# ==============================================================================
+# Functions
+# ==============================================================================
+
+
+def detect_fronts(speed, observed, v_congestion: float = V_CONGESTION) -> np.ndarray:
+    """
+        Bins where a congested run starts, seen from upstream
+
+        A bin is congested when observed and slower than v_congestion. The
+        front of a run of consecutive congested bins is its most upstream
+        bin (the tail of the queue, traffic flows towards increasing x).
+    """
+    congested = np.asarray(observed) & (np.asarray(speed) < v_congestion)
+    start = congested.copy()
+    start[1:] &= ~congested[:-1]
+    return np.flatnonzero(start)
+
+
+def pulse_message(
+    front: float, anticipation: float = ANTICIPATION, drop: float = SPEED_REDUCTION
+):
+    """
+        Speed pulse starting anticipation upstream a front, lasting past it
+    """
+    return Msg2(front - anticipation, drop=drop, x_congestion=front)
+
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class StreamingBins:
+    """
+        Exponentially weighted mean and variance of speeds per spatial bin
+
+        Each update bins a batch of samples with np.bincount and merges the
+        batch moments into the running ones (Chan's parallel update of
+        Welford's algorithm), after multiplying past weights by `forget`.
+        With forget = 1 the moments are those of all samples so far. The
+        cost of an update depends on the batch and the bins, not on the
+        number of past updates.
+    """
+
+    def __init__(self, n_bins: int, dx: float = X_BIN, forget: float = FORGET) -> None:
+        if not 0 < forget <= 1:
+            raise ValueError(f"forget must be in (0, 1], got {forget}")
+        self.n_bins = n_bins
+        self.dx = dx
+        self.forget = forget
+        self.weight = np.zeros(n_bins)
+        self.mean = np.zeros(n_bins)
+        self.m2 = np.zeros(n_bins)  # Weighted sum of squared deviations
+        self.updates = 0
+
+    @property
+    def x(self) -> np.ndarray:
+        """ Upstream edge of the bins"""
+        return np.arange(self.n_bins) * self.dx
+
+    @property
+    def variance(self) -> np.ndarray:
+        """ Weighted speed variance (0 on empty bins)"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.weight > 0, self.m2 / self.weight, 0.0)
+
+    def observed(self, min_weight: float = MIN_WEIGHT) -> np.ndarray:
+        """ Bins with enough sample weight"""
+        return self.weight >= min_weight
+
+    def update(self, x, v) -> None:
+        """
+            Merge a batch of samples at positions x with speeds v
+        """
+        x, v = np.asarray(x, dtype=float), np.asarray(v, dtype=float)
+        cell = np.floor(x / self.dx).astype(np.int64)
+        inside = (cell >= 0) & (cell < self.n_bins)
+        cell, v = cell[inside], v[inside]
+
+        count = np.bincount(cell, minlength=self.n_bins).astype(float)
+        total = np.bincount(cell, weights=v, minlength=self.n_bins)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            batch_mean = np.where(count > 0, total / count, 0.0)
+        batch_m2 = np.bincount(
+            cell, weights=(v - batch_mean[cell]) ** 2, minlength=self.n_bins
+        )
+
+        self.weight *= self.forget
+        self.m2 *= self.forget
+        weight = self.weight + count
+        delta = batch_mean - self.mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            share = np.where(weight > 0, count / weight, 0.0)
+        self.mean += delta * share
+        self.m2 += batch_m2 + delta ** 2 * self.weight * share
+        self.weight = weight
+        self.updates += 1
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(n_bins={self.n_bins},"
+            f"dx={self.dx},forget={self.forget})"
+        )
+
+
+class CongestionMonitor:
+    """
+        Detect congestion fronts from CAV speeds and warn upstream CAVs
+
+        Every step the positions and speeds of the CAVs of all lanes update
+        a StreamingBins aggregate. Fronts are detected on the binned mean
+        speed (see detect_fronts) and, when a front is new or has moved more
+        than `tolerance` from where it was last announced, the speed drop
+        message built by `message(front)` is registered by every CAV within
+        `horizon` upstream of it, replacing any previous control. CAVs are
+        found with a binary search in the (sorted) lane positions.
+
+        Register it as a monitor of SimulationControl. Announcements are
+        logged as (time, front, CAVs reached).
+    """
+
+    def __init__(
+        self,
+        length: float = L_MAX,
+        dx: float = X_BIN,
+        forget: float = FORGET,
+        v_congestion: float = V_CONGESTION,
+        min_weight: float = MIN_WEIGHT,
+        horizon: float = HORIZON,
+        tolerance: float = TOLERANCE,
+        message=pulse_message,
+        dt: float = DT,
+    ) -> None:
+        self.bins = StreamingBins(int(np.ceil(length / dx)), dx, forget)
+        self.v_congestion = v_congestion
+        self.min_weight = min_weight
+        self.horizon = horizon
+        self.tolerance = tolerance
+        self.message = message
+        self.dt = dt
+        self.fronts = np.zeros(0)  # Announced front positions
+        self.log = []
+
+    def observe(self, vehicles) -> None:
+        """
+            Aggregate the speeds of the CAVs of a vehicle sequence
+
+            A call is one update of the bins: pass all vehicles of a step.
+        """
+        vehicles = list(vehicles)
+        n = len(vehicles)
+        cav = np.fromiter((veh.type == "CAV" for veh in vehicles), dtype=bool, count=n)
+        x = np.fromiter((veh.x_t for veh in vehicles), dtype=float, count=n)
+        v = np.fromiter((veh.v_t for veh in vehicles), dtype=float, count=n)
+        self.bins.update(x[cav], v[cav])
+
+    def detect(self) -> np.ndarray:
+        """
+            Current front positions
+        """
+        idx = detect_fronts(
+            self.bins.mean, self.bins.observed(self.min_weight), self.v_congestion
+        )
+        return self.bins.x[idx]
+
+    def moved(self, fronts) -> np.ndarray:
+        """
+            Fronts farther than tolerance from every announced front
+        """
+        if not len(self.fronts):
+            return np.ones(len(fronts), dtype=bool)
+        distance = np.abs(np.subtract.outer(fronts, self.fronts)).min(axis=1)
+        return distance > self.tolerance
+
+    def announce(self, vehicles, fronts) -> np.ndarray:
+        """
+            Register the messages of fronts on the CAVs upstream of them
+
+            Returns the CAVs reached per front.
+        """
+        vehicles = list(vehicles)
+        n = len(vehicles)
+        reached = np.zeros(len(fronts), dtype=np.int64)
+        if not n or not len(fronts):
+            return reached
+        x = np.fromiter((veh.x_t for veh in vehicles), dtype=float, count=n)
+        order = np.argsort(x, kind="stable")
+        half = self.horizon / 2
+        lo, hi = range_query(x[order], np.asarray(fronts) - half, half)
+        for j, (start, stop) in enumerate(zip(lo.tolist(), hi.tolist())):
+            message = self.message(fronts[j])
+            for i in order[start:stop].tolist():
+                veh = vehicles[i]
+                if veh.type == "CAV":
+                    veh.register_control_speed(message)
+                    reached[j] += 1
+        return reached
+
+    def __call__(self, k: int, network) -> bool:
+        """ Monitor callback, aggregates all lanes then announces fronts"""
+        lanes = [lane for link in network.values() for lane in link.values()]
+        self.observe(chain.from_iterable(lane.veh_list for lane in lanes))
+        fronts = self.detect()
+        moved = self.moved(fronts)
+        new = fronts[moved]
+        if len(new):
+            reached = sum(self.announce(lane.veh_list, new) for lane in lanes)
+            self.log.extend(
+                zip([k * self.dt] * len(new), new.tolist(), reached.tolist())
+            )
+        # Fronts that did not move enough keep their announced position
+        if len(self.fronts) and len(fronts):
+            nearest = np.abs(np.subtract.outer(fronts, self.fronts)).argmin(axis=1)
+            fronts = np.where(moved, fronts, self.fronts[nearest])
+        self.fronts = fronts
+        return False
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(dx={self.bins.dx},"
+            f"v_congestion={self.v_congestion},horizon={self.horizon})"
+        )
@@ -0,0 +1,346 @@
+"""
+    Array-backed simulation engine
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+import numpy as np
+
+from .carfollow import C_1, C_2, C_3, A_MIN, A_MAX, SIGMA_A
+from .vehicles import DT, K_X, W_I, U_I
+
+# ==============================================================================
+# Constants
+# ==============================================================================
+
+# Precision of speeds, accelerations and controller terms. Positions are
+# always kept in float64 (20 km links need it).
+PRECISION = {"float64": np.float64, "float32": np.float32}
+
+# Time integration schemes
+#   euler: v_{k+1} = v_k + a_k T, x_{k+1} = x_k + v_{k+1} T (object API update)
+#   ballistic: trapezoidal position update x_{k+1} = x_k + (v_k + v_{k+1}) T / 2
+#   heun: predictor-corrector re-evaluating the acceleration at the predicted state
+SCHEMES = ("euler", "ballistic", "heun")
+
+# Parameters that can take one value per parameter set (see PlatoonEngine.batch)
+BATCH_PARAMETERS = ("u", "w", "k_x", "c1", "c2", "c3", "vd", "sigma")
+
+# ==============================================================================
+# Kernels
+# ==============================================================================
+
+
+def head(p):
+    """
+        Leader entry of a per-vehicle parameter (scalars broadcast)
+    """
+    if np.ndim(p) == 0:
+        return p
+    return p[..., 0]
+
+
+def tail(p):
+    """
+        Followers entries of a per-vehicle parameter (scalars broadcast)
+    """
+    if np.ndim(p) == 0 or np.shape(p)[-1] == 1:
+        return p
+    return p[..., 1:]
+
+
+def parameter_grid(**axes) -> dict:
+    """
+        Flattened cartesian product of parameter values
+
+        parameter_grid(c1=[...], c2=[...]) gives one entry per combination,
+        ready for PlatoonEngine.batch.
+    """
+    grid = np.meshgrid(
+        *(np.asarray(v, dtype=float) for v in axes.values()), indexing="ij"
+    )
+    return {name: values.ravel() for name, values in zip(axes, grid)}
+
+
+def tampere_acceleration(dv, s, v, vd, c1, c2, c3, s0, gamma):
+    """
+        Tampere acceleration min(c_1 dv + c_2 (s - s_d), c_3 (v_d - v))
+    """
+    cong_acc = c1 * dv + c2 * (s - s0 - gamma * v)
+    free_acc = c3 * (vd - v)
+    return np.minimum(cong_acc, free_acc)
+
+
+def idm_acceleration(dv, s, v, vd, a_max, b, delta, s0, T):
+    """
+        IDM acceleration a_max (1 - (v / v_d)^delta - (s^* / s)^2)
+
+        with s^* = s_0 + max(0, v T - v dv / (2 sqrt(a_max b))), dv being
+        the leader speed minus the follower speed as in tampere_acceleration.
+    """
+    s_star = s0 + np.maximum(0, v * T - v * dv / (2 * np.sqrt(a_max * b)))
+    return a_max * (1 - (v / vd) ** delta - (s_star / s) ** 2)
+
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class PlatoonEngine:
+    """
+        Array-backed platoon of Tampere vehicles
+
+        Vehicle 0 is the leader and vehicle i follows vehicle i - 1. The state
+        is kept as arrays so one step advances the whole platoon at once, with
+        the same update order as stepping Tampere objects leader first.
+
+        Positions are float64. Speeds, accelerations and controller terms
+        (desired speeds, coefficients) are stored with `precision`.
+
+        With `leader` (e.g. a replay.LeaderReplay) the leader state is read
+        from its state(t) after every step instead of following a control.
+    """
+
+    def __init__(
+        self,
+        x0,
+        v0,
+        u: float = U_I,
+        w: float = W_I,
+        k_x: float = K_X,
+        c1=C_1,
+        c2=C_2,
+        c3=C_3,
+        vd=U_I,
+        sigma: float = SIGMA_A,
+        dt: float = DT,
+        precision: str = "float64",
+        scheme: str = "euler",
+        seed=None,
+        leader=None,
+    ) -> None:
+        if scheme not in SCHEMES:
+            raise ValueError(
+                f"Unknown integration scheme {scheme}, use one of {SCHEMES}"
+            )
+        self.scheme = scheme
+        self.precision = precision
+        self.dtype = PRECISION[precision]
+
+        self.x = np.array(x0, dtype=np.float64)
+        self.v = np.array(np.broadcast_to(v0, self.x.shape), dtype=self.dtype)
+        self.a = np.zeros_like(self.v)
+
+        self.u = u
+        self.s0 = self.as_term(1 / np.asarray(k_x))
+        self.gamma = self.as_term(1 / (np.asarray(w) * np.asarray(k_x)))
+        self.c1 = self.as_term(c1)
+        self.c2 = self.as_term(c2)
+        self.c3 = self.as_term(c3)
+        self.vd = self.as_term(vd)
+
+        self.sigma = sigma
+        self.dt = dt
+        self.k = 0
+        self.rng = np.random.default_rng(seed)
+        self.leader = leader
+        if leader is not None:
+            self.replay_leader(0.0)
+
+    @classmethod
+    def batch(cls, x0, v0=U_I, **kwargs) -> "PlatoonEngine":
+        """
+            P parameter sets of the same platoon advancing together
+
+            Parameters of BATCH_PARAMETERS given as sequences of length P
+            hold one value per set and are stored as (P, 1) columns; the
+            initial state is repeated along a leading axis, so state arrays
+            are (P, N) and a step advances all sets at once. Scalar
+            parameters are shared by all sets.
+        """
+        batched = {
+            name: np.asarray(value)
+            for name, value in kwargs.items()
+            if name in BATCH_PARAMETERS and np.ndim(value) == 1
+        }
+        sizes = {len(value) for value in batched.values()}
+        if len(sizes) != 1:
+            raise ValueError(
+                f"Give batched parameters of a common length, got {sizes or 'none'}"
+            )
+        (size,) = sizes
+        kwargs.update({name: value[:, None] for name, value in batched.items()})
+        x0 = np.broadcast_to(np.asarray(x0, dtype=np.float64), (size, np.shape(x0)[-1]))
+        return cls(x0, np.broadcast_to(v0, x0.shape), **kwargs)
+
+    def as_term(self, value) -> np.ndarray:
+        """
+            Store a controller term with the engine precision
+        """
+        return np.asarray(value, dtype=self.dtype)
+
+    def __len__(self) -> int:
+        """ Number of vehicles"""
+        return self.x.shape[-1]
+
+    @property
+    def shape(self) -> tuple:
+        """ State shape"""
+        return self.x.shape
+
+    @property
+    def t(self) -> float:
+        """ Current time"""
+        return self.k * self.dt
+
+    def leader_speed(self, control, x=None) -> np.ndarray:
+        """
+            Leader desired speed from a control (function of position or value)
+        """
+        if control is None:
+            return head(self.u)
+        if callable(control):
+            return control((self.x if x is None else x)[..., 0])
+        return control
+
+    def shift_state(self, control=None) -> None:
+        """
+            Shift state x_{k-1} = x{k} for all vehicles
+        """
+        dt = self.dt
+        if self.scheme == "heun":
+            v_p = np.maximum(self.v + self.a * dt, 0)
+            x_p = self.x + self.v * dt
+            a_p = self.acceleration(x_p, v_p, control, noise=False)
+            self.x += (self.v + v_p) * (dt / 2)
+            np.maximum(self.v + (self.a + a_p) * (dt / 2), 0, out=self.v)
+        elif self.scheme == "ballistic":
+            v_t = self.v.copy()
+            np.maximum(self.v + self.a * dt, 0, out=self.v)
+            self.x += (v_t + self.v) * (dt / 2)
+        else:
+            np.maximum(self.v + self.a * dt, 0, out=self.v)
+            self.x += self.v * dt
+        if self.leader is not None:
+            self.replay_leader((self.k + 1) * dt)
+
+    def replay_leader(self, t: float) -> None:
+        """
+            Set the leader state from the replayed trajectory at time t
+        """
+        x, v = self.leader.state(t)
+        self.x[..., 0] = x
+        self.v[..., 0] = v
+
+    def leader_state(self, x, v) -> tuple:
+        """
+            Position and speed of the leader of each follower
+        """
+        return x[..., :-1], v[..., :-1]
+
+    def acceleration(
+        self, x, v, control=None, noise: bool = True, out=None
+    ) -> np.ndarray:
+        """
+            Acceleration of leader and followers at state (x, v)
+        """
+        if out is None:
+            out = np.empty_like(v)
+        x_lead, v_lead = self.leader_state(x, v)
+        s = (x_lead - x[..., 1:]).astype(self.dtype)
+        dv = v_lead - v[..., 1:]
+        acc = tampere_acceleration(
+            dv,
+            s,
+            v[..., 1:],
+            tail(self.vd),
+            tail(self.c1),
+            tail(self.c2),
+            tail(self.c3),
+            tail(self.s0),
+            tail(self.gamma),
+        )
+        if noise and np.any(self.sigma):
+            acc += self.sigma * self.rng.standard_normal(acc.shape, dtype=self.dtype)
+        np.clip(acc, A_MIN, A_MAX, out=out[..., 1:])
+
+        vd = self.leader_speed(control, x)
+        lead_acc = head(self.c3) * (vd - v[..., 0]) / 4
+        out[..., 0] = np.clip(lead_acc, A_MIN, A_MAX)
+        return out
+
+    def car_following(self, control=None) -> None:
+        """
+            Update acceleration of leader and followers
+        """
+        self.acceleration(self.x, self.v, control, out=self.a)
+
+    def step(self, control=None) -> None:
+        """
+            Advance the platoon a single time step
+        """
+        self.shift_state(control)
+        self.car_following(control)
+        self.k += 1
+
+    def recorder(self, n_steps: int) -> "TrajectoryRecorder":
+        """
+            Recorder matching the engine shape and precision
+        """
+        return TrajectoryRecorder(n_steps, self.shape, self.precision)
+
+    def run(self, n_steps: int, control=None, recorder=None):
+        """
+            Advance n_steps, optionally storing the state after each step
+        """
+        for _ in range(n_steps):
+            self.step(control)
+            if recorder is not None:
+                recorder.record(self)
+        return recorder
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(n={len(self)},"
+            f"precision={self.precision},scheme={self.scheme})"
+        )
+
+
+class TrajectoryRecorder:
+    """
+        Preallocated trajectories of an engine run
+
+        Positions are stored in float64, speeds and accelerations in the
+        recorder precision.
+    """
+
+    def __init__(self, n_steps: int, shape: tuple, precision: str = "float64") -> None:
+        dtype = PRECISION[precision]
+        self.precision = precision
+        self.t = np.zeros(n_steps)
+        self.x = np.zeros((n_steps,) + tuple(shape), dtype=np.float64)
+        self.v = np.zeros((n_steps,) + tuple(shape), dtype=dtype)
+        self.a = np.zeros((n_steps,) + tuple(shape), dtype=dtype)
+        self.k = 0
+
+    def record(self, engine) -> None:
+        """
+            Store the current engine state
+        """
+        self.t[self.k] = engine.t
+        self.x[self.k] = engine.x
+        self.v[self.k] = engine.v
+        self.a[self.k] = engine.a
+        self.k += 1
+
+    @property
+    def nbytes(self) -> int:
+        """ Output size in bytes"""
+        return self.t.nbytes + self.x.nbytes + self.v.nbytes + self.a.nbytes
+
+    def __len__(self) -> int:
+        """ Number of recorded steps"""
+        return self.k
@@ -0,0 +1,232 @@
+"""
+    Event-skipping fast-forward for free-flowing vehicles
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+import heapq
+
+import numpy as np
+
+from .carfollow import A_MIN, A_MAX
+from .engine import PlatoonEngine, tampere_acceleration
+
+# ==============================================================================
+# Functions
+# ==============================================================================
+
+
+def take(p, idx):
+    """
+        Entries idx of a per-vehicle parameter (scalars broadcast)
+    """
+    if np.ndim(p) == 0:
+        return p
+    return p[idx]
+
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class FastForwardEngine(PlatoonEngine):
+    """
+        Platoon engine that fast-forwards free-flowing vehicles
+
+        A follower on the free branch (c_3 (v_d - v)) whose spacing exceeds a
+        safety horizon is taken out of the step loop. Its state relaxes to v_d
+        in closed form (exact for the Euler update) until the first tick at
+        which it could interact with its leader, assuming the leader stops.
+        Wake-up ticks are kept in a priority queue, so a step costs in the
+        number of interacting vehicles rather than the platoon size (the queue
+        holds one entry per wake-up tick with the batch of vehicles to wake).
+
+        Fast-forwarded vehicles evolve without the random term. Only the
+        "euler" scheme and single platoons (1D state) are supported.
+    """
+
+    def __init__(self, x0, v0, min_skip: int = 2, **kwargs) -> None:
+        super().__init__(x0, v0, **kwargs)
+        if self.scheme != "euler":
+            raise ValueError("Fast-forward requires the euler scheme")
+        if self.x.ndim != 1:
+            raise ValueError("Fast-forward supports a single platoon")
+        if self.leader is not None:
+            raise ValueError("Fast-forward does not replay leaders")
+        n = len(self)
+        self.min_skip = min_skip
+        self.active = np.arange(n)
+        self.free = np.zeros(n, dtype=bool)
+        self.wake = []  # Priority queue of wake-up ticks
+        self.wake_batches = {}  # tick -> [vehicles]
+        self.anchor_k = np.zeros(n, dtype=np.int64)
+        self.anchor_x = np.zeros(n)
+        self.anchor_v = np.zeros(n)
+        self.updates = 0  # Vehicle updates performed
+
+    def relaxation(self, idx, k):
+        """
+            Closed-form state (x, v, a) at tick k of fast-forwarded vehicles
+        """
+        c3 = take(self.c3, idx).astype(np.float64)
+        vd = take(self.vd, idx).astype(np.float64)
+        r = 1 - c3 * self.dt  # 0 < r < 1 for fast-forwarded vehicles
+        n = k - self.anchor_k[idx]
+        e_1 = self.anchor_v[idx] - vd
+        e_n = e_1 * r ** n
+        x = self.anchor_x[idx] + self.dt * (n * vd + e_1 * r * (1 - r ** n) / (1 - r))
+        return x, vd + e_n, -c3 * e_n
+
+    def materialize(self, idx, k) -> None:
+        """
+            Write the closed-form state of fast-forwarded vehicles
+        """
+        if len(idx):
+            x, v, a = self.relaxation(idx, k)
+            self.x[idx] = x
+            self.v[idx] = v
+            self.a[idx] = a
+
+    def sync(self) -> None:
+        """
+            Bring every fast-forwarded vehicle to the current tick
+        """
+        self.materialize(np.flatnonzero(self.free), self.k)
+
+    def shift_state(self, control=None) -> None:
+        """
+            Shift state of interacting vehicles
+        """
+        act, dt = self.active, self.dt
+        self.v[act] = np.maximum(self.v[act] + self.a[act] * dt, 0)
+        self.x[act] += self.v[act] * dt
+
+    def wake_up(self) -> np.ndarray:
+        """
+            Vehicles reaching their interaction time at the current tick
+        """
+        batches = []
+        while self.wake and self.wake[0] <= self.k:
+            batches.extend(self.wake_batches.pop(heapq.heappop(self.wake)))
+        if not batches:
+            return np.array([], dtype=np.int64)
+        woken = np.sort(np.concatenate(batches))
+        if len(woken):
+            self.materialize(woken, self.k)
+            self.free[woken] = False
+            self.active = np.sort(
+                np.concatenate((self.active, woken)), kind="mergesort"
+            )
+        return woken
+
+    def car_following(self, control=None) -> None:
+        """
+            Update acceleration of interacting vehicles
+        """
+        act = self.active
+        fol = act[act > 0]
+        lead = fol - 1
+        ghost = lead[self.free[lead]]
+        self.materialize(ghost, self.k)  # Leaders still fast-forwarded
+
+        x, v = self.x, self.v
+        vd = take(self.vd, fol)
+        c3 = take(self.c3, fol)
+        s = (x[lead] - x[fol]).astype(self.dtype)
+        acc = tampere_acceleration(
+            v[lead] - v[fol],
+            s,
+            v[fol],
+            vd,
+            take(self.c1, fol),
+            take(self.c2, fol),
+            c3,
+            take(self.s0, fol),
+            take(self.gamma, fol),
+        )
+        free_branch = acc == c3 * (vd - v[fol])
+        if self.sigma:
+            acc += self.sigma * self.rng.standard_normal(acc.shape, dtype=self.dtype)
+        self.a[fol] = np.clip(acc, A_MIN, A_MAX)
+
+        if len(act) and act[0] == 0:
+            vd = self.leader_speed(control)
+            lead_acc = take(self.c3, 0) * (vd - v[0]) / 4
+            self.a[0] = np.clip(lead_acc, A_MIN, A_MAX)
+        self.updates += len(act)
+        self.skip(fol, free_branch)
+
+    def skip(self, fol, free_branch) -> None:
+        """
+            Take out free followers that cannot interact before min_skip ticks
+        """
+        dt = self.dt
+        vd = take(self.vd, fol).astype(np.float64)
+        c1 = take(self.c1, fol)
+        c2 = take(self.c2, fol)
+        c3 = take(self.c3, fol)
+
+        v_1 = self.v[fol] + self.a[fol] * dt
+        e_1 = v_1 - vd
+        v_max = np.maximum(v_1, vd)
+        horizon = (
+            take(self.s0, fol)
+            + take(self.gamma, fol) * v_max
+            + (c1 * v_max + c3 * np.maximum(-e_1, 0)) / c2
+        )
+        spacing = self.x[fol - 1] - self.x[fol]
+        n_free = np.floor((spacing - horizon) / np.maximum(v_max * dt, 1e-9))
+
+        eligible = (
+            free_branch
+            & (n_free >= self.min_skip)
+            & (v_1 >= 0)
+            & (np.abs(c3 * e_1) <= A_MAX)
+            & (c3 * dt > 0)
+            & (c3 * dt < 1)
+        )
+        new = fol[eligible]
+        if not len(new):
+            return
+        self.anchor_k[new] = self.k + 1
+        self.anchor_v[new] = v_1[eligible]
+        self.anchor_x[new] = self.x[new] + v_1[eligible] * dt
+        self.free[new] = True
+        self.active = self.active[~self.free[self.active]]
+        self.schedule(new, self.k + n_free[eligible].astype(np.int64))
+
+    def schedule(self, vehicles, ticks) -> None:
+        """
+            Queue vehicles to wake up at the given ticks
+        """
+        order = np.argsort(ticks, kind="stable")
+        ticks, vehicles = ticks[order], vehicles[order]
+        uniq, start = np.unique(ticks, return_index=True)
+        for tick, batch in zip(uniq.tolist(), np.split(vehicles, start[1:])):
+            if tick not in self.wake_batches:
+                self.wake_batches[tick] = []
+                heapq.heappush(self.wake, tick)
+            self.wake_batches[tick].append(batch)
+
+    def step(self, control=None) -> None:
+        """
+            Advance a single time step
+        """
+        self.shift_state(control)
+        self.k += 1
+        self.wake_up()
+        self.car_following(control)
+
+    def run(self, n_steps: int, control=None, recorder=None):
+        """
+            Advance n_steps, optionally storing the (synchronized) state
+        """
+        for _ in range(n_steps):
+            self.step(control)
+            if recorder is not None:
+                self.sync()
+                recorder.record(self)
+        return recorder
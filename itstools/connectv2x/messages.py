@@ -23,7 +23,7 @@ X_CONGESTION = 15000  # Position of congestion in space [m]
 # ==============================================================================
 
 # Speed Selection
-def msg_spd(x, delay):
+def msg_spd(x, delay, drop: float = SPEED_REDUCTION):
     """
         Sent message to specific CAV vehicle
         Initial speed: 25 m/s
@@ -31,10 +31,12 @@ def msg_spd(x, delay):
         Position: 14Km 
         Span: 400m
     """
-    return speed_drop(x, v0=U_I, drop=SPEED_REDUCTION, delay=delay)
+    return speed_drop(x, v0=U_I, drop=drop, delay=delay)
 
 
-def msg_pls(x, delay):
+def msg_pls(
+    x, delay, drop: float = SPEED_REDUCTION, x_congestion: float = X_CONGESTION
+):
     """
         Sent message to specific CAV vehicle (Pulse)
         Initial speed: 25 m/s
@@ -45,27 +47,35 @@ def msg_pls(x, delay):
     return speed_pulse(
         x,
         v0=U_I,
-        drop=SPEED_REDUCTION,
+        drop=drop,
         delay=delay,
-        duration=X_CONGESTION - delay + 1500,
+        duration=x_congestion - delay + 1500,
     )
 
 
 class Msg1:
     """ Creates a random message 1 for a vehicle"""
 
-    def __init__(self, distance):
+    def __init__(self, distance, drop: float = SPEED_REDUCTION):
         self.distance = distance
+        self.drop = drop
 
     def __call__(self, x):
-        return msg_spd(x, self.distance)
+        return msg_spd(x, self.distance, self.drop)
 
 
 class Msg2:
     """ Creates a random message 2 for a vehicle"""
 
-    def __init__(self, distance):
+    def __init__(
+        self,
+        distance,
+        drop: float = SPEED_REDUCTION,
+        x_congestion: float = X_CONGESTION,
+    ):
         self.distance = distance
+        self.drop = drop
+        self.x_congestion = x_congestion
 
     def __call__(self, x):
-        return msg_pls(x, self.distance)
+        return msg_pls(x, self.distance, self.drop, self.x_congestion)
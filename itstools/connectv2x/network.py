@@ -10,6 +10,7 @@ from itertools import count, repeat
 from collections import deque, abc
 
 import networkx as nx
+import numpy as np
 
 
 # ==============================================================================
@@ -26,22 +27,72 @@ class TrafficLane:
 
     __idx = count(0)  # Lane ID
 
-    __slots__ = ["length", "veh_list", "idx"]
+    __slots__ = ["length", "veh_list", "idx", "control"]
+
+    parallel = False  # Vehicle objects share the global random state
 
     def __init__(self, length: float = L_MAX) -> None:
         self.idx = next(self.__class__.__idx)
         self.length = length
         self.veh_list = deque([])
+        self.control = None  # Head vehicle control
 
     def attach_vehicle(self, vehicle) -> None:
         """ Attach a vehicle a vehicle to a lane"""
+        if self.veh_list:
+            vehicle.set_leader(self.veh_list[-1])
         self.veh_list.append(vehicle)
-        vehicle.veh_leader.set_leader(self.veh_list[-1])
 
-    def detach_vehicle(self) -> None:
-        """ Detach head vehicle a vehicle from the  lane"""
-        self.veh_list[1].control = self.veh_list[0].control
-        self.veh_list.pop()
+    def detach_vehicle(self):
+        """ Detach head vehicle from the lane, its follower becomes head"""
+        head = self.veh_list.popleft()
+        if self.veh_list:
+            self.veh_list[0].set_leader(None)
+            self.veh_list[0].control = head.control
+        return head
+
+    def state(self) -> tuple:
+        """ Positions and speeds of the vehicles in the lane"""
+        n = len(self.veh_list)
+        x = np.fromiter((veh.x_t for veh in self.veh_list), dtype=float, count=n)
+        v = np.fromiter((veh.v_t for veh in self.veh_list), dtype=float, count=n)
+        return x, v
+
+    def evolve_step(self) -> None:
+        """ Advance all vehicles in the lane (head first)"""
+        for veh in self.veh_list:
+            veh.step_evolution(control=self.control)
+
+
+class EngineLane(TrafficLane):
+    """ Array-backed lane stepping a PlatoonEngine (head first)
+
+        It has no vehicle objects (veh_list stays empty), monitors read its
+        state(). The engine owns its random generator, so the lane can be
+        stepped in a worker thread (see SimulationControl executor).
+    """
+
+    __slots__ = ["engine"]
+
+    parallel = True
+
+    def __init__(self, engine, length: float = L_MAX) -> None:
+        super().__init__(length)
+        self.engine = engine
+
+    def attach_vehicle(self, vehicle) -> None:
+        raise TypeError("Vehicles of an EngineLane are set by its engine")
+
+    def detach_vehicle(self):
+        raise TypeError("Vehicles of an EngineLane are set by its engine")
+
+    def state(self) -> tuple:
+        """ Positions and speeds of the vehicles in the lane"""
+        return self.engine.x.copy(), self.engine.v.astype(float)
+
+    def evolve_step(self) -> None:
+        """ Advance the engine a single step"""
+        self.engine.step(self.control)
 
 
 class TrafficLink(abc.MutableMapping):
@@ -89,10 +140,20 @@ class TrafficLink(abc.MutableMapping):
         """ Amount of lanes in link """
         return len(self.__lanes)
 
+    @property
+    def length(self) -> float:
+        """ Link length (longest lane)"""
+        return max(lane.length for lane in self.__lanes.values())
+
+    def evolve_step(self) -> None:
+        """ Advance all lanes in the link"""
+        for lane in self.values():
+            lane.evolve_step()
+
 
 class TrafficNetwork(abc.MutableMapping):
 
-    __slots__ = ["__links", "__lro", "idx", "__iter_links"]
+    __slots__ = ["__links", "__lro", "idx", "__iter_links", "__graph"]
     __idx = count(0)  # Network ID
 
     def __init__(
@@ -105,9 +166,36 @@ class TrafficNetwork(abc.MutableMapping):
         )
         self.__links = {lk.idx: lk for lk in tuple_links}
         self.__lro = {lk.idx: lk.lane_order for lk in self.__links.values()}
+        self.__graph = nx.DiGraph()
+        self.__graph.add_nodes_from(self.__links)
+
+    def set_physical_connection(self, matrix_linkid) -> None:
+        """ Connect links from a matrix of split ratios
+
+            Entry (i, j) is the fraction of the flow leaving the i-th link
+            (in link order) that enters the j-th link. Rows of links with
+            downstream connections must add up to 1.
+        """
+        matrix = np.asarray(matrix_linkid, dtype=float)
+        if matrix.shape != (len(self), len(self)):
+            raise ValueError(
+                f"Expected a {len(self)}x{len(self)} matrix, got {matrix.shape}"
+            )
+        total = matrix.sum(axis=1)
+        if not np.all(np.isclose(total, 1) | (total == 0)):
+            raise ValueError("Split ratios of each link must add up to 1")
+        ids = tuple(self.__links)
+        up, down = np.nonzero(matrix)
+        self.__graph.remove_edges_from(tuple(self.__graph.edges))
+        self.__graph.add_weighted_edges_from(
+            ((ids[i], ids[j], float(matrix[i, j])) for i, j in zip(up, down)),
+            weight="split",
+        )
 
-    def set_physical_connection(self, matrix_linkid):
-        pass
+    @property
+    def connections(self) -> tuple:
+        """ Physical connections (upstream link, downstream link, split ratio)"""
+        return tuple(self.__graph.edges(data="split"))
 
     @property
     def link_order(self):
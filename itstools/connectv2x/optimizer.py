@@ -0,0 +1,234 @@
+"""
+    Batch search of V2X message parameters
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .engine import PlatoonEngine
+from .messages import SPEED_REDUCTION, X_CONGESTION, Msg2
+from .support import speed_pulse
+from .vehicles import DT, U_I
+
+# ==============================================================================
+# Constants
+# ==============================================================================
+
+PARAMETERS = ("distance", "drop", "x_congestion")  # Msg2 arguments
+BOUNDS = np.array(
+    [
+        [X_CONGESTION - 5000, X_CONGESTION],  # Distance [m]
+        [0, 2 * SPEED_REDUCTION],  # Drop [m/s]
+        [X_CONGESTION - 1000, X_CONGESTION + 3000],  # Congestion position [m]
+    ]
+)
+N_VEH = 100  # Platoon size
+SPACING = 40  # Initial spacing [m]
+T_HORIZON = 900  # Scenario duration [s]
+CONGESTION_DROP = 20  # Leader speed drop at the congestion [m/s]
+CONGESTION_LENGTH = 2000  # Congestion length [m]
+
+# ==============================================================================
+# Functions
+# ==============================================================================
+
+
+def congestion(x):
+    """
+        Leader speed crossing the congestion at X_CONGESTION
+    """
+    return speed_pulse(
+        x, drop=CONGESTION_DROP, delay=X_CONGESTION, duration=CONGESTION_LENGTH
+    )
+
+
+def speed_variance(record) -> float:
+    """
+        Variance of all recorded speeds (stop and go indicator)
+    """
+    return float(np.var(record.v))
+
+
+def total_travel_time(record, x_end: float = X_CONGESTION + CONGESTION_LENGTH) -> float:
+    """
+        Total time spent by the vehicles before reaching x_end [s]
+
+        Vehicles not reaching it within the record count the whole horizon.
+    """
+    reached = record.x >= x_end
+    steps = np.where(reached.any(axis=0), reached.argmax(axis=0), len(record))
+    return float(steps.sum() * (record.t[1] - record.t[0] if len(record) > 1 else DT))
+
+
+def random_search(evaluate, bounds=BOUNDS, samples: int = 64, seed=None) -> tuple:
+    """
+        Best of a batch of uniform samples within bounds
+
+        evaluate maps a (P, D) batch of parameter vectors to P values to
+        minimize. Returns the best vector and value.
+    """
+    bounds = np.asarray(bounds, dtype=float)
+    rng = np.random.default_rng(seed)
+    theta = rng.uniform(bounds[:, 0], bounds[:, 1], (samples, len(bounds)))
+    value = np.asarray(evaluate(theta))
+    best = int(value.argmin())
+    return theta[best], float(value[best])
+
+
+def cross_entropy(
+    evaluate,
+    bounds=BOUNDS,
+    population: int = 32,
+    elite: float = 0.25,
+    iterations: int = 10,
+    smoothing: float = 0.7,
+    seed=None,
+) -> tuple:
+    """
+        Cross entropy method minimizing evaluate within bounds
+
+        Each iteration samples a population from a Gaussian clipped to the
+        bounds, evaluates it as one batch and refits the Gaussian to the
+        elite fraction (smoothed with the previous one). Returns the best
+        vector, its value and the best value of every iteration.
+    """
+    bounds = np.asarray(bounds, dtype=float)
+    rng = np.random.default_rng(seed)
+    mean = bounds.mean(axis=1)
+    std = (bounds[:, 1] - bounds[:, 0]) / 2
+    n_elite = max(int(np.ceil(elite * population)), 2)
+    best_theta, best_value, history = None, np.inf, []
+    for _ in range(iterations):
+        theta = mean + std * rng.standard_normal((population, len(bounds)))
+        theta = np.clip(theta, bounds[:, 0], bounds[:, 1])
+        value = np.asarray(evaluate(theta))
+        order = np.argsort(value, kind="stable")
+        if value[order[0]] < best_value:
+            best_theta, best_value = theta[order[0]], float(value[order[0]])
+        top = theta[order[:n_elite]]
+        mean = smoothing * top.mean(axis=0) + (1 - smoothing) * mean
+        std = smoothing * top.std(axis=0) + (1 - smoothing) * std
+        history.append(best_value)
+    return best_theta, best_value, history
+
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class MessageScenario:
+    """
+        KPI of a platoon whose CAVs follow a message built from parameters
+
+        The leader crosses a congestion (see congestion) and the CAVs of the
+        platoon (mask over vehicles) take message(*theta)(x) as desired
+        speed, the others U_I. Noise free by default, so a parameter vector
+        always gives the same KPI. Instances are picklable and can be
+        evaluated in worker processes.
+    """
+
+    def __init__(
+        self,
+        x0=None,
+        v0=U_I,
+        cav=None,
+        message=Msg2,
+        kpi=speed_variance,
+        n_steps: int = int(T_HORIZON / DT),
+        control=congestion,
+        **kwargs,
+    ) -> None:
+        if x0 is None:
+            x0 = X_CONGESTION - 5000 - np.arange(N_VEH) * SPACING
+        self.x0 = np.asarray(x0, dtype=float)
+        self.v0 = v0
+        self.cav = np.arange(len(self.x0)) % 3 == 1 if cav is None else np.asarray(cav)
+        self.message = message
+        self.kpi = kpi
+        self.n_steps = n_steps
+        self.control = control
+        self.kwargs = {"sigma": 0, **kwargs}
+
+    def __call__(self, theta) -> float:
+        """ KPI of a single parameter vector"""
+        message = self.message(*np.asarray(theta, dtype=float).tolist())
+        engine = PlatoonEngine(self.x0, self.v0, **self.kwargs)
+        recorder = engine.recorder(self.n_steps)
+        vd = np.full(len(engine), U_I, dtype=engine.dtype)
+        for _ in range(self.n_steps):
+            vd[self.cav] = message(engine.x[self.cav])
+            engine.vd = vd
+            engine.step(self.control)
+            recorder.record(engine)
+        return self.kpi(recorder)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(n={len(self.x0)},cav={int(self.cav.sum())})"
+
+
+class BatchEvaluator:
+    """
+        Evaluate batches of parameter vectors with a result cache
+
+        Results are cached by parameter vector (rounded to `decimals`), so
+        repeated points, within or across batches, are simulated once. The
+        missing points of a batch are mapped over a process pool of
+        `workers` processes, or evaluated in process when workers <= 1.
+    """
+
+    def __init__(self, objective, workers: int = None, decimals: int = 6) -> None:
+        self.objective = objective
+        self.workers = workers
+        self.decimals = decimals
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+        self._pool = None
+
+    def key(self, theta) -> tuple:
+        """ Cache key of a parameter vector"""
+        return tuple(np.round(np.asarray(theta, dtype=float), self.decimals).tolist())
+
+    def map(self, thetas) -> list:
+        """ Objective values of a list of parameter vectors"""
+        if self.workers is not None and self.workers <= 1:
+            return [self.objective(theta) for theta in thetas]
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers)
+        return list(self._pool.map(self.objective, thetas))
+
+    def __call__(self, thetas) -> np.ndarray:
+        """ Objective values of a (P, D) batch"""
+        keys = [self.key(theta) for theta in np.atleast_2d(thetas)]
+        missing = list(dict.fromkeys(key for key in keys if key not in self.cache))
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+        if missing:
+            self.cache.update(
+                zip(missing, self.map([np.array(key) for key in missing]))
+            )
+        return np.array([self.cache[key] for key in keys])
+
+    def close(self) -> None:
+        """ Shut the process pool down"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self) -> "BatchEvaluator":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(cached={len(self.cache)},"
+            f"workers={self.workers})"
+        )
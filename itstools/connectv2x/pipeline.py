@@ -0,0 +1,277 @@
+"""
+    Wavefront pipeline of a platoon across processes
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+import multiprocessing as mp
+import os
+from multiprocessing.connection import wait
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from .engine import PlatoonEngine
+from .vehicles import DT
+
+# ==============================================================================
+# Constants
+# ==============================================================================
+
+DEPTH = 64  # Boundary states buffered between consecutive blocks
+TIMEOUT = 60  # Maximum wait for a neighbour block [s]
+
+# ==============================================================================
+# Functions
+# ==============================================================================
+
+
+def acquire(semaphore, timeout: float = TIMEOUT) -> None:
+    """
+        Block on a semaphore shared with a neighbour block
+    """
+    if not semaphore.acquire(timeout=timeout):
+        raise TimeoutError("A neighbour block of the pipeline stopped responding")
+
+
+def join_workers(workers) -> list:
+    """
+        Wait for worker processes, returns the indices of the failed ones
+
+        As soon as a worker exits with an error the others (possibly waiting
+        on it) are terminated.
+    """
+    pending = list(workers)
+    failed = []
+    while pending:
+        wait([worker.sentinel for worker in pending])
+        pending = [worker for worker in pending if worker.exitcode is None]
+        failed = [i for i, worker in enumerate(workers) if worker.exitcode]
+        if failed:
+            for worker in pending:
+                worker.terminate()
+            break
+    for worker in workers:
+        worker.join()
+    return failed
+
+
+def _attach(names: dict, shapes: dict) -> tuple:
+    """ Shared memory segments and their array views"""
+    segments = {key: SharedMemory(name=name) for key, name in names.items()}
+    arrays = {
+        key: np.ndarray(shape, dtype=dtype, buffer=segments[key].buf)
+        for key, (shape, dtype) in shapes.items()
+    }
+    return segments, arrays
+
+
+def _run_block(spec: dict) -> None:
+    """
+        Worker loop of a block of the pipeline
+    """
+    segments, arrays = _attach(spec["names"], spec["shapes"])
+    try:
+        b, n_blocks, depth = spec["block"], spec["n_blocks"], spec["depth"]
+        ring, filled, free = arrays["ring"], spec["filled"], spec["free"]
+        timeout = spec["timeout"]
+        leader = None
+        if b > 0:
+            boundary = ring[b - 1], filled[b - 1], free[b - 1]
+            leader = RingLeader(*boundary, spec["dt"], timeout)
+        engine = PlatoonEngine(
+            spec["x0"], spec["v0"], dt=spec["dt"], leader=leader, **spec["params"]
+        )
+        own = slice(1 if b > 0 else 0, None)
+        start, stop, every = spec["start"], spec["stop"], spec["every"]
+        control = spec["control"] if b == 0 else None
+        for k in range(spec["n_steps"]):
+            engine.step(control)
+            step = k + 1
+            if b < n_blocks - 1:
+                # Slot of step - depth must have been read by the next block
+                acquire(free[b], timeout)
+                ring[b, step % depth] = engine.x[-1], engine.v[-1]
+                filled[b].release()
+            if step % every == 0:
+                arrays["x"][step // every - 1, start:stop] = engine.x[own]
+                arrays["v"][step // every - 1, start:stop] = engine.v[own]
+    finally:
+        for segment in segments.values():
+            segment.close()
+
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class RingLeader:
+    """
+        Leader state read from the ring buffer filled by the previous block
+
+        Used as the leader (see PlatoonEngine leader=) of a block: state(t)
+        blocks until the previous block has published step t / dt. The
+        producer releases `filled` after writing each slot and acquires
+        `free` before reusing one; both are process shared semaphores, so
+        slot contents are ordered with the handover on any CPU.
+    """
+
+    def __init__(
+        self, ring, filled, free, dt: float = DT, timeout: float = TIMEOUT
+    ) -> None:
+        self.ring = ring
+        self.filled = filled
+        self.free = free
+        self.dt = dt
+        self.timeout = timeout
+        self.available = 1  # Steps published, step 0 is written at start
+        self.released = 0  # Steps whose slot was handed back
+
+    def state(self, t: float) -> tuple:
+        """ Position and speed of the boundary vehicle at time t"""
+        step = int(round(t / self.dt))
+        while self.available <= step:
+            acquire(self.filled, self.timeout)
+            self.available += 1
+        x, v = self.ring[step % len(self.ring)]
+        while self.released < step:
+            self.free.release()
+            self.released += 1
+        return x, v
+
+
+class WavefrontPipeline:
+    """
+        Single platoon split in contiguous blocks advanced by worker processes
+
+        Vehicle i at step k only needs vehicle i - 1 at step k, so block b
+        can compute step k as soon as block b - 1 has published the state of
+        its last vehicle at step k. Each block runs a PlatoonEngine whose
+        leader is that boundary vehicle, read from a shared memory ring of
+        `depth` steps (see RingLeader); blocks run as a wavefront, each at
+        most `depth` steps behind the previous one, and wait on semaphores
+        (not spinning) for their neighbours.
+
+        Noise free runs match a single PlatoonEngine exactly. With noise
+        each block draws its own stream (seed + block). The euler and
+        ballistic schemes are supported (heun needs the leader acceleration).
+    """
+
+    def __init__(
+        self,
+        x0,
+        v0,
+        blocks: int = None,
+        depth: int = DEPTH,
+        timeout: float = TIMEOUT,
+        seed=None,
+        **kwargs,
+    ) -> None:
+        self.x0 = np.array(x0, dtype=np.float64)
+        if self.x0.ndim != 1:
+            raise ValueError("The pipeline runs a single platoon")
+        if kwargs.get("scheme") == "heun":
+            raise ValueError(
+                "The heun scheme needs the leader acceleration, use euler or ballistic"
+            )
+        n = len(self.x0)
+        self.v0 = np.array(np.broadcast_to(v0, n), dtype=np.float64)
+        blocks = os.cpu_count() if blocks is None else blocks
+        self.bounds = np.linspace(0, n, min(blocks, n) + 1).round().astype(int)
+        self.depth = depth
+        self.timeout = timeout
+        self.seed = seed
+        self.kwargs = kwargs
+
+    @property
+    def blocks(self) -> int:
+        """ Number of blocks (processes)"""
+        return len(self.bounds) - 1
+
+    def block_spec(self, b: int) -> dict:
+        """
+            Initial state and parameters of block b (with its boundary leader)
+        """
+        start, stop = self.bounds[b], self.bounds[b + 1]
+        first = start - 1 if b > 0 else start
+        n = len(self.x0)
+        params = {}
+        for key, value in self.kwargs.items():
+            per_vehicle = np.ndim(value) and np.shape(value)[-1] == n
+            params[key] = value[..., first:stop] if per_vehicle else value
+        if self.seed is not None:
+            params["seed"] = self.seed + b
+        return {
+            "block": b,
+            "start": start,
+            "stop": stop,
+            "x0": self.x0[first:stop],
+            "v0": self.v0[first:stop],
+            "params": params,
+        }
+
+    def run(self, n_steps: int, control=None, every: int = 1) -> tuple:
+        """
+            Advance n_steps, returns times, positions and speeds every `every` steps
+        """
+        n, n_rec = len(self.x0), n_steps // every
+        shapes = {
+            "ring": ((self.blocks, self.depth, 2), np.float64),
+            "x": ((n_rec, n), np.float64),
+            "v": ((n_rec, n), np.float64),
+        }
+        segments = {
+            key: SharedMemory(
+                create=True, size=max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            )
+            for key, (shape, dtype) in shapes.items()
+        }
+        try:
+            arrays = {
+                key: np.ndarray(shape, dtype=dtype, buffer=segments[key].buf)
+                for key, (shape, dtype) in shapes.items()
+            }
+            last = self.bounds[1:] - 1
+            arrays["ring"][:, 0, 0] = self.x0[last]
+            arrays["ring"][:, 0, 1] = self.v0[last]
+            # Boundary b: published slots, and free ones (slot 0 holds step 0)
+            filled = [mp.Semaphore(0) for _ in range(self.blocks - 1)]
+            free = [mp.Semaphore(self.depth - 1) for _ in range(self.blocks - 1)]
+
+            common = {
+                "names": {key: segment.name for key, segment in segments.items()},
+                "shapes": shapes,
+                "n_blocks": self.blocks,
+                "depth": self.depth,
+                "filled": filled,
+                "free": free,
+                "timeout": self.timeout,
+                "dt": self.kwargs.get("dt", DT),
+                "n_steps": n_steps,
+                "every": every,
+                "control": control,
+            }
+            workers = [
+                mp.Process(target=_run_block, args=({**common, **self.block_spec(b)},))
+                for b in range(self.blocks)
+            ]
+            for worker in workers:
+                worker.start()
+            failed = join_workers(workers)
+            if failed:
+                raise RuntimeError(f"Pipeline blocks {failed} failed")
+            t = (np.arange(n_rec) + 1) * every * common["dt"]
+            return t, arrays["x"].copy(), arrays["v"].copy()
+        finally:
+            for segment in segments.values():
+                segment.close()
+                segment.unlink()
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(n={len(self.x0)},"
+            f"blocks={self.blocks},depth={self.depth})"
+        )
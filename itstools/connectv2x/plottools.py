@@ -8,11 +8,18 @@ import numpy as np
 
 from .carfollow import U_I
 
+# Above MAX_GLYPH_TRACES vehicles trajectories are packed in single renderers,
+# above RASTER_POINTS points they are rasterized to an image
+MAX_GLYPH_TRACES = 50
+RASTER_POINTS = 1_000_000
+RASTER_SHAPE = (500, 500)  # (rows, columns)
+EMPTY_COLOR = "rgba(0,0,0,0)"  # Pixels without data (NaN) are transparent
+
 
 def plot_single_trajectory(p, x, y, c, mapper, size=2):
     """ Daraws a single trajectory"""
     source = ColumnDataSource(dict(x=x, y=y, color=c))
-    p.circle(
+    p.scatter(
         x="x",
         y="y",
         line_color=mapper,
@@ -25,13 +32,17 @@ def plot_single_trajectory(p, x, y, c, mapper, size=2):
     return p
 
 
-def get_mapper(data_mapper):
+def get_mapper(data_mapper, nan_color="gray"):
     """ Color mapper"""
     color_min, color_max = np.min(data_mapper), np.max(data_mapper)
 
     revViridis256 = list(reversed(Viridis256))
     mapper = linear_cmap(
-        field_name="color", palette=revViridis256, low=color_min, high=color_max
+        field_name="color",
+        palette=revViridis256,
+        low=color_min,
+        high=color_max,
+        nan_color=nan_color,
     )
     return mapper
 
@@ -47,6 +58,98 @@ def post_decoration(p, mapper, xlabel, ylabel):
     return p
 
 
+def lttb(data_x, data_y, n_out):
+    """ Largest-Triangle-Three-Buckets decimation
+
+        data_x: (n,) common time, data_y: (n, n_traces) values
+        Returns indices (n_out, n_traces) of the points kept for each trace
+    """
+    n, n_traces = data_y.shape
+    if n_out >= n or n_out < 3:
+        return np.tile(np.arange(n)[:, None], (1, n_traces))
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    traces = np.arange(n_traces)
+    idx = np.zeros((n_out, n_traces), dtype=int)
+    idx[-1] = n - 1
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # Next bucket average (last point for the last bucket)
+        nxt = slice(hi, edges[b + 2]) if b + 2 < len(edges) else slice(n - 1, n)
+        x_c, y_c = data_x[nxt].mean(), data_y[nxt].mean(axis=0)
+        x_a, y_a = data_x[idx[b]], data_y[idx[b], traces]
+        area = np.abs(
+            (x_a - x_c) * (data_y[lo:hi] - y_a)
+            - (x_a - data_x[lo:hi, None]) * (y_c - y_a)
+        )
+        idx[b + 1] = lo + np.argmax(area, axis=0)
+    return idx
+
+
+def rasterize_points(x, y, c, x_range, y_range, shape=RASTER_SHAPE):
+    """ Mean of c per pixel of a (rows, columns) grid covering the ranges
+
+        Ranges are closed: points on the upper bounds fall in the last pixel.
+    """
+    rows, cols = shape
+    i = np.floor((y - y_range[0]) / (y_range[1] - y_range[0]) * rows).astype(int)
+    j = np.floor((x - x_range[0]) / (x_range[1] - x_range[0]) * cols).astype(int)
+    i[y == y_range[1]] = rows - 1
+    j[x == x_range[1]] = cols - 1
+    inside = (i >= 0) & (i < rows) & (j >= 0) & (j < cols)
+    cell = i[inside] * cols + j[inside]
+    count = np.bincount(cell, minlength=rows * cols)
+    total = np.bincount(cell, weights=c[inside], minlength=rows * cols)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        image = total / count
+    return image.reshape(rows, cols)
+
+
+def plot_packed_trajectories(p, data_x, data_y, data_color, mapper, size=2):
+    """ Draws all trajectories with one line and one marker renderer"""
+    n_traces = data_y.shape[1]
+    xs = [data_x[:, i] if data_x.ndim == 2 else data_x for i in range(n_traces)]
+    p.multi_line(xs=xs, ys=list(data_y.T), color="gainsboro")
+    source = ColumnDataSource(
+        dict(
+            x=np.concatenate(xs),
+            y=data_y.T.ravel(),
+            color=data_color.T.ravel(),
+        )
+    )
+    p.scatter(
+        x="x",
+        y="y",
+        line_color=mapper,
+        color=mapper,
+        fill_alpha=1,
+        size=size,
+        source=source,
+    )
+    return p
+
+
+def plot_raster_trajectories(p, data_x, data_y, data_color, mapper, x_range, y_range):
+    """ Draws all trajectories as a single image colored by mean value
+
+        Empty pixels are transparent.
+    """
+    x = np.broadcast_to(data_x if data_x.ndim == 2 else data_x[:, None], data_y.shape)
+    image = rasterize_points(
+        x.ravel(), data_y.ravel(), data_color.ravel(), x_range, y_range
+    )
+    image_mapper = get_mapper(data_color, nan_color=EMPTY_COLOR)
+    p.image(
+        image=[image],
+        x=x_range[0],
+        y=y_range[0],
+        dw=x_range[1] - x_range[0],
+        dh=y_range[1] - y_range[0],
+        color_mapper=image_mapper["transform"],
+    )
+    return p
+
+
 def plot_multiple_trajectories(
     data_x,
     data_y,
@@ -56,26 +159,139 @@ def plot_multiple_trajectories(
     ylabel=None,
     x_range=(0, 800),
     y_range=(0, 20000),
+    mode="auto",
+    n_out=None,
 ):
-    """ Draw multiple trajectories"""
+    """ Draw multiple trajectories
+
+        mode:
+            "glyphs": one source, marker and line per vehicle
+            "packed": all vehicles in one multi_line and one marker renderer
+            "raster": single image with the mean color per pixel
+            "auto": glyphs up to MAX_GLYPH_TRACES vehicles, raster above
+                RASTER_POINTS points, packed otherwise
+        n_out: points kept per trace with LTTB decimation
+    """
     p = figure(
         title=title,
-        plot_height=500,
-        plot_width=500,
+        height=500,
+        width=500,
         x_range=x_range,
         y_range=y_range,
     )
 
     mapper = get_mapper(data_color)
 
-    for _, data in enumerate(zip(data_y.T, data_color.T)):
-        y, c = data
-        p = plot_single_trajectory(p, data_x, y, c, mapper)
+    n_traces = data_y.shape[1]
+    if mode == "auto":
+        if n_traces <= MAX_GLYPH_TRACES:
+            mode = "glyphs"
+        elif data_y.size > RASTER_POINTS:
+            mode = "raster"
+        else:
+            mode = "packed"
+
+    if mode not in ("glyphs", "packed", "raster"):
+        raise ValueError(f"Unknown plotting mode {mode}")
+
+    if n_out is not None:
+        idx = lttb(data_x, data_y, n_out)
+        traces = np.arange(n_traces)
+        data_x = data_x[idx]
+        data_y, data_color = data_y[idx, traces], data_color[idx, traces]
+
+    if mode == "glyphs":
+        for i, data in enumerate(zip(data_y.T, data_color.T)):
+            y, c = data
+            x = data_x[:, i] if data_x.ndim == 2 else data_x
+            p = plot_single_trajectory(p, x, y, c, mapper)
+    else:
+        if mode == "packed":
+            p = plot_packed_trajectories(p, data_x, data_y, data_color, mapper)
+        else:
+            p = plot_raster_trajectories(
+                p, data_x, data_y, data_color, mapper, x_range, y_range
+            )
 
     p = post_decoration(p, mapper, xlabel, ylabel)
     return p
 
 
+def bin_space_time(
+    time, x, v, dt_bin=30, dx_bin=100, t_range=None, x_range=None, tau=None
+):
+    """ Aggregates sampled trajectories on a time-space grid (Edie's definitions)
+
+        time: (n,) sampling times of x, v (n, n_veh) or same shape as x
+        tau: sampling period [s], inferred from time when not given
+
+        Returns a dict with t_edges, x_edges and (n_x, n_t) grids:
+            count: samples per cell
+            speed: space mean speed [m/s]
+            density: total time spent / cell area [veh/m]
+            flow: total distance travelled / cell area [veh/s]
+    """
+    time, x, v = np.asarray(time), np.asarray(x), np.asarray(v)
+    if tau is None:
+        tau = np.median(np.diff(np.unique(time)))
+    time = np.broadcast_to(
+        time.reshape(time.shape + (1,) * (x.ndim - time.ndim)), x.shape
+    )
+    time, x, v = time.ravel(), x.ravel(), v.ravel()
+    t_range = t_range or (time.min(), time.max() + tau)
+    x_range = x_range or (x.min(), x.max() + dx_bin)
+
+    n_t = int(np.ceil((t_range[1] - t_range[0]) / dt_bin))
+    n_x = int(np.ceil((x_range[1] - x_range[0]) / dx_bin))
+    i = np.floor((x - x_range[0]) / dx_bin).astype(np.int64)
+    j = np.floor((time - t_range[0]) / dt_bin).astype(np.int64)
+    inside = (i >= 0) & (i < n_x) & (j >= 0) & (j < n_t)
+    cell = i[inside] * n_t + j[inside]
+
+    count = np.bincount(cell, minlength=n_x * n_t).reshape(n_x, n_t)
+    distance = np.bincount(cell, weights=v[inside], minlength=n_x * n_t).reshape(
+        n_x, n_t
+    )
+    area = dt_bin * dx_bin
+    with np.errstate(invalid="ignore", divide="ignore"):
+        speed = np.where(count > 0, distance / count, np.nan)
+    return dict(
+        t_edges=t_range[0] + dt_bin * np.arange(n_t + 1),
+        x_edges=x_range[0] + dx_bin * np.arange(n_x + 1),
+        count=count,
+        speed=speed,
+        density=count * tau / area,
+        flow=distance * tau / area,
+    )
+
+
+def plot_space_time(grid, field="speed", title=None, p_height=500, p_width=500):
+    """ Renders a binned field (see bin_space_time) as a single image
+
+        Empty cells are transparent.
+    """
+    values = grid[field]
+    t_edges, x_edges = grid["t_edges"], grid["x_edges"]
+    finite = values[np.isfinite(values)]
+    mapper = get_mapper(finite if finite.size else np.zeros(1), nan_color=EMPTY_COLOR)
+    p = figure(
+        title=title,
+        height=p_height,
+        width=p_width,
+        x_range=(t_edges[0], t_edges[-1]),
+        y_range=(x_edges[0], x_edges[-1]),
+    )
+    p.image(
+        image=[values],
+        x=t_edges[0],
+        y=x_edges[0],
+        dw=t_edges[-1] - t_edges[0],
+        dh=x_edges[-1] - x_edges[0],
+        color_mapper=mapper["transform"],
+    )
+    return post_decoration(p, mapper, "Time [secs]", "Position [m]")
+
+
 def plot_single_trace(
     data_x,
     data_y,
@@ -87,7 +303,7 @@ def plot_single_trace(
 ):
     """ Plots a single trace """
 
-    p = figure(title=title, plot_height=p_height, plot_width=p_width)
+    p = figure(title=title, height=p_height, width=p_width)
     p.yaxis.axis_label_text_font_size = "14pt"
     p.yaxis.major_label_text_font_size = "14pt"
     p.xaxis.axis_label_text_font_size = "14pt"
@@ -101,15 +317,18 @@ def plot_single_trace(
     return p
 
 
-def plot_xva(time, x, v, a, y_range, titles):
-    """ Plots all trajectories pos, speed acceleration"""
+def plot_xva(time, x, v, a, y_range, titles, **kwargs):
+    """ Plots all trajectories pos, speed acceleration
+
+        kwargs are passed to plot_multiple_trajectories (mode, n_out)
+    """
     pos_zoom, spd_zoom, acc_zoom = y_range
     pos_tit, spd_tit, acc_tit = titles
     pos = plot_multiple_trajectories(
-        time, x, v, pos_tit, "Time [secs]", "Position [m]", y_range=pos_zoom
+        time, x, v, pos_tit, "Time [secs]", "Position [m]", y_range=pos_zoom, **kwargs
     )
     spd = plot_multiple_trajectories(
-        time, v, v, spd_tit, "Time [secs]", "Speed [m/s]", y_range=spd_zoom
+        time, v, v, spd_tit, "Time [secs]", "Speed [m/s]", y_range=spd_zoom, **kwargs
     )
     acc = plot_multiple_trajectories(
         time,
@@ -119,6 +338,7 @@ def plot_xva(time, x, v, a, y_range, titles):
         "Time [secs]",
         "Acceleration [m/s²]",
         y_range=acc_zoom,
+        **kwargs,
     )
 
     return (pos, spd, acc)
@@ -130,8 +350,8 @@ def plot_histogram(data_x, var_name=None):
     hist, edges = np.histogram(data_x, density=True)
     p = figure(
         title="Histogram",
-        plot_height=500,
-        plot_width=500,
+        height=500,
+        width=500,
         background_fill_color="#fafafa",
     )
     p.quad(
@@ -162,7 +382,7 @@ def plot_histogram(data_x, var_name=None):
 
 def plot_stairs(data_x, data_y, title=None, xlabel=None, ylabel=None):
     """ Plot stairs plot"""
-    p = figure(title=title, plot_height=500, plot_width=500)
+    p = figure(title=title, height=500, width=500)
     p.step(data_x, data_y, line_width=2, mode="before")
     p.xaxis.axis_label = xlabel
     p.yaxis.axis_label = ylabel
@@ -0,0 +1,234 @@
+"""
+    Replay of recorded leader trajectories
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+import os
+from pathlib import Path
+
+import numpy as np
+
+from .vehicles import DT, Vehicle
+
+# ==============================================================================
+# Constants
+# ==============================================================================
+
+FIELDS = ("t", "x", "v")  # Channels of a trajectory file
+
+# ==============================================================================
+# Functions
+# ==============================================================================
+
+
+def save_trajectories(path, t, x, v) -> None:
+    """
+        Write trajectories (n, steps) to a .npy or .parquet file
+
+        t is shared (steps,) or per trajectory (n, steps) and must be
+        uniformly sampled. The NPY layout is a (3, n, steps) float64 array
+        (t, x, v), so a trajectory is contiguous on disk. Parquet files
+        hold one row per sample with columns id, t, x, v and need pyarrow.
+    """
+    x = np.atleast_2d(np.asarray(x, dtype=np.float64))
+    v = np.broadcast_to(np.asarray(v, dtype=np.float64), x.shape)
+    t = np.broadcast_to(np.asarray(t, dtype=np.float64), x.shape)
+    path = Path(path)
+    if path.suffix == ".parquet":
+        pa, pq = _pyarrow()
+        ids = np.repeat(np.arange(x.shape[0]), x.shape[1])
+        table = pa.table({"id": ids, "t": t.ravel(), "x": x.ravel(), "v": v.ravel()})
+        pq.write_table(table, path, compression="none")
+        return
+    _write_npy(path, t, x, v)
+
+
+def load_trajectories(path) -> "TrajectoryStore":
+    """
+        Memory map a trajectory file written by save_trajectories
+
+        Parquet files cannot be memory mapped as arrays: the first load
+        converts them to a .npy cache next to them (see parquet_cache),
+        which is mapped like any NPY file by every later load.
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        path = parquet_cache(path)
+    return TrajectoryStore(np.load(path, mmap_mode="r"))
+
+
+def parquet_cache(path) -> Path:
+    """
+        NPY copy (name.parquet.npy) of a Parquet trajectory file
+
+        It is written once, with pyarrow, when missing or older than the
+        Parquet file. Loads running concurrently may both convert; the cache
+        is replaced atomically so readers never see a partial file.
+    """
+    path = Path(path)
+    cache = path.with_name(path.name + ".npy")
+    if cache.exists() and cache.stat().st_mtime >= path.stat().st_mtime:
+        return cache
+    _, pq = _pyarrow()
+    table = pq.read_table(path, columns=["id", *FIELDS])
+    if not table.num_rows:
+        raise ValueError(f"No trajectories in {path}")
+    n = table.column("id")[-1].as_py() + 1
+    columns = [table.column(name).to_numpy().reshape(n, -1) for name in FIELDS]
+    partial = cache.with_name(f"{cache.name}.{os.getpid()}.tmp")
+    _write_npy(partial, *columns)
+    os.replace(partial, cache)
+    return cache
+
+
+def _write_npy(path, t, x, v) -> None:
+    """ Write (n, steps) t, x, v as a (3, n, steps) NPY file"""
+    shape = (3,) + np.shape(x)
+    data = np.lib.format.open_memmap(path, mode="w+", dtype=np.float64, shape=shape)
+    data[0], data[1], data[2] = t, x, v
+    data.flush()
+
+
+def _pyarrow():
+    """ Optional Parquet support"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as error:
+        raise ImportError(
+            "Parquet trajectories require pyarrow, use .npy files instead"
+        ) from error
+    return pa, pq
+
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class TrajectoryStore:
+    """
+        Uniformly sampled trajectories (t, x, v) of shape (3, n, steps)
+
+        Usually a read only memory map shared by every process opening the
+        file. Interpolation at a time reads two samples per trajectory
+        (their index follows from the first two times), so replaying a
+        trajectory never loads it whole.
+    """
+
+    def __init__(self, data) -> None:
+        if np.ndim(data) != 3 or len(data) != len(FIELDS) or np.shape(data)[-1] < 2:
+            raise ValueError(
+                "Trajectories must be a (3, n, steps >= 2) array of t, x, v"
+            )
+        self.data = data
+
+    def __len__(self) -> int:
+        """ Number of trajectories"""
+        return self.data.shape[1]
+
+    @property
+    def n_steps(self) -> int:
+        """ Samples per trajectory"""
+        return self.data.shape[2]
+
+    def interpolate(self, field: str, idx, t) -> np.ndarray:
+        """
+            Linear interpolation of a field of trajectories idx at times t
+
+            Times outside a trajectory hold its first or last sample.
+        """
+        idx = np.asarray(idx)
+        t0 = self.data[0, idx, 0]
+        step = self.data[0, idx, 1] - t0
+        pos = (np.asarray(t, dtype=float) - t0) / step
+        j = np.clip(np.floor(pos).astype(np.int64), 0, self.n_steps - 2)
+        w = np.clip(pos - j, 0, 1)
+        values = self.data[FIELDS.index(field)]
+        return values[idx, j] * (1 - w) + values[idx, j + 1] * w
+
+    def leader(self, idx=0, offset: float = 0.0) -> "LeaderReplay":
+        """
+            Replay of trajectories idx, starting offset [s] into them
+        """
+        return LeaderReplay(self, idx, offset)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(n={len(self)},steps={self.n_steps})"
+
+
+class LeaderReplay:
+    """
+        Leader state given by recorded trajectories
+
+        state(t) returns position and speed at simulation time t (plus the
+        offset). With an array of trajectory indices it drives the leaders
+        of a batch of platoons, e.g. PlatoonEngine(..., leader=replay) with
+        states of shape (len(idx), N).
+    """
+
+    def __init__(self, store: TrajectoryStore, idx=0, offset: float = 0.0) -> None:
+        self.store = store
+        self.idx = idx
+        self.offset = offset
+
+    def state(self, t: float) -> tuple:
+        """ Position and speed at time t"""
+        t = t + self.offset
+        x = self.store.interpolate("x", self.idx, t)
+        return x, self.store.interpolate("v", self.idx, t)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(idx={self.idx},offset={self.offset})"
+
+
+class ReplayVehicle(Vehicle):
+    """
+        Vehicle moving along a recorded trajectory
+
+        It can lead a TrafficLane: each step_evolution moves it to the
+        recorded state at the next time step, ignoring the lane control.
+    """
+
+    __slots__ = ["replay", "k", "dt", "acc"]
+
+    def __init__(
+        self,
+        replay: LeaderReplay,
+        veh_type: str = "HDV",
+        l0: float = 0,
+        dt: float = DT,
+    ) -> None:
+        x0, v0 = replay.state(0.0)
+        super().__init__(
+            init_pos=float(x0), init_spd=float(v0), init_lane=l0, veh_type=veh_type
+        )
+        self.replay = replay
+        self.k = 0
+        self.dt = dt
+        self.acc = False  # Does not take messages
+
+    def register_control_speed(self, control) -> None:
+        """ Recorded vehicles ignore speed controls"""
+
+    def shift_state(self) -> None:
+        """
+            Move to the recorded state of the next time step
+        """
+        self.k += 1
+        x, v = self.replay.state(self.k * self.dt)
+        self.a_t = (float(v) - self.v_t) / self.dt
+        self.x_t, self.v_t = float(x), float(v)
+
+    def step_evolution(self, control: float = 0) -> None:
+        """
+            Single simulation step
+        """
+        self.shift_state()
+        self.control = control
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(x0={self.x_t},v0={self.v_t})"
@@ -1 +1,143 @@
-"""Main module."""
+"""
+    Infrastructure to vehicle (I2V) broadcast
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+from bisect import bisect_left, bisect_right
+from itertools import count
+
+import numpy as np
+
+from .vehicles import DT
+
+# ==============================================================================
+# Constants
+# ==============================================================================
+
+RADIUS = 300  # Broadcast radius [m]
+
+# ==============================================================================
+# Functions
+# ==============================================================================
+
+
+def range_query(positions, centers, radius) -> tuple:
+    """
+        Bounds [lo, hi) of the ascending positions within radius of centers
+
+        Two binary searches per center, vectorized over centers.
+    """
+    centers = np.asarray(centers, dtype=float)
+    lo = np.searchsorted(positions, centers - radius, side="left")
+    hi = np.searchsorted(positions, centers + radius, side="right")
+    return lo, hi
+
+
+class _Positions:
+    """
+        Lazy view of -x_t of head first vehicles (ascending, for bisect)
+    """
+
+    __slots__ = ["vehicles"]
+
+    def __init__(self, vehicles) -> None:
+        self.vehicles = vehicles
+
+    def __len__(self) -> int:
+        return len(self.vehicles)
+
+    def __getitem__(self, i: int) -> float:
+        return -self.vehicles[i].x_t
+
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class RoadsideUnit:
+    """
+        Roadside unit broadcasting a message within a radius
+
+        The message is a speed control (function of position) such as Msg1
+        or Msg2, registered by the CAVs receiving it.
+    """
+
+    _idx = count(0)  # RSU ID
+
+    __slots__ = ["idx", "position", "radius", "message", "delivered"]
+
+    def __init__(self, position: float, message, radius: float = RADIUS) -> None:
+        self.idx = next(self.__class__._idx)
+        self.position = position
+        self.radius = radius
+        self.message = message
+        self.delivered = 0  # Vehicles reached
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(position={self.position},radius={self.radius})"
+        )
+
+
+class BroadcastSimulator:
+    """
+        I2V broadcast of roadside units to the CAVs of a network
+
+        Lanes keep their vehicles head first, hence sorted by position, so
+        every RSU finds the vehicles within its radius with two binary
+        searches reading O(log n) positions; positions of the lane are not
+        gathered. CAVs without an accepted control register the message of
+        the first RSU reaching them.
+
+        Register it as a monitor of SimulationControl, or call deliver() on
+        vehicle sequences directly. Deliveries are logged as
+        (time, rsu idx, vehicle idx).
+    """
+
+    def __init__(self, rsus=(), dt: float = DT) -> None:
+        self.rsus = []
+        self.dt = dt
+        self.log = []
+        for rsu in rsus:
+            self.add_rsu(rsu)
+
+    def add_rsu(self, rsu: RoadsideUnit) -> None:
+        """ Register a roadside unit"""
+        self.rsus.append(rsu)
+
+    def deliver(self, vehicles, t: float = 0.0) -> int:
+        """
+            Deliver messages to head first vehicles, returns deliveries
+
+            vehicles is an indexable sequence sorted by decreasing position,
+            such as the veh_list of a lane.
+        """
+        if not len(vehicles) or not self.rsus:
+            return 0
+        positions = _Positions(vehicles)
+        delivered = 0
+        for rsu in self.rsus:
+            start = bisect_left(positions, -(rsu.position + rsu.radius))
+            stop = bisect_right(positions, -(rsu.position - rsu.radius))
+            for i in range(start, stop):
+                veh = vehicles[i]
+                if veh.type == "CAV" and not veh.acc:
+                    veh.register_control_speed(rsu.message)
+                    rsu.delivered += 1
+                    delivered += 1
+                    self.log.append((t, rsu.idx, veh.idx))
+        return delivered
+
+    def __call__(self, k: int, network) -> bool:
+        """ Monitor callback, delivers messages in every lane"""
+        for link in network.values():
+            for lane in link.values():
+                self.deliver(lane.veh_list, k * self.dt)
+        return False
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(rsus={len(self.rsus)})"
@@ -44,6 +44,21 @@ class FundamentalDiagram:
         )
         return flow
 
+    def sending(self, k):
+        """ Sending function (demand) min(u k, C)"""
+        return np.minimum(self.u * k, self.C)
+
+    def receiving(self, k):
+        """ Receiving function (supply) min(C, w (k_x - k))"""
+        return np.minimum(self.C, self.w * (self.k_x - k))
+
+    def speed(self, k):
+        """ Equilibrium speed min(u, w (k_x / k - 1))"""
+        with np.errstate(divide="ignore"):
+            return np.minimum(
+                self.u, self.w * (self.k_x / np.asarray(k, dtype=float) - 1)
+            )
+
     def plot_diagram(self):
         k = np.linspace(0, self.k_x, 100)
         q = self.compute_flow(k)
@@ -52,7 +67,7 @@ class FundamentalDiagram:
         xlabel = "Density [veh/km]"
         ylabel = "Flow [veh/h]"
 
-        p = figure(title=title, tools=[], plot_height=500, plot_width=500)
+        p = figure(title=title, tools=[], height=500, width=500)
         p.line(k, q)
         p.xaxis.axis_label = xlabel
         p.yaxis.axis_label = ylabel
@@ -95,7 +95,7 @@ class Vehicle(object):
         """
             This is a reset vehicle id.
         """
-        cls.idx = count(0)
+        cls._idx = count(0)
 
     @property
     def veh_lead(self) -> "Vehicle":
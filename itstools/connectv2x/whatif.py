@@ -0,0 +1,130 @@
+"""
+    What-if re-simulation of platoons
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+import numpy as np
+
+from .carfollow import C_1, C_2, C_3
+from .engine import PlatoonEngine
+from .replay import TrajectoryStore
+from .vehicles import DT, K_X, U_I, W_I
+
+# ==============================================================================
+# Constants
+# ==============================================================================
+
+# Per vehicle parameters and defaults
+PARAMETERS = {"c1": C_1, "c2": C_2, "c3": C_3, "vd": U_I, "w": W_I, "k_x": K_X}
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class WhatIfPlatoon:
+    """
+        Noise free platoon whose trajectories are kept between edits
+
+        Followers only depend on their leaders, so editing the initial state
+        or the parameters of vehicle k leaves vehicles 0...k-1 unchanged.
+        Edits only mark the first affected vehicle; the next access
+        re-simulates vehicles k... with PlatoonEngine, replaying the cached
+        trajectory of vehicle k - 1 as leader (see replay.LeaderReplay).
+        Editing the leader re-runs the whole platoon.
+
+        `updates` counts the vehicle steps simulated so far.
+    """
+
+    def __init__(
+        self, x0, v0, n_steps: int, control=None, dt: float = DT, **params
+    ) -> None:
+        unknown = set(params) - set(PARAMETERS)
+        if unknown:
+            raise ValueError(
+                f"Unknown parameters {sorted(unknown)}, use {tuple(PARAMETERS)}"
+            )
+        self.x0 = np.array(x0, dtype=np.float64)
+        if self.x0.ndim != 1:
+            raise ValueError("What-if supports a single platoon")
+        n = len(self.x0)
+        self.v0 = np.array(np.broadcast_to(v0, n), dtype=np.float64)
+        self.params = {
+            name: np.array(
+                np.broadcast_to(params.get(name, default), n), dtype=np.float64
+            )
+            for name, default in PARAMETERS.items()
+        }
+        self.n_steps = n_steps
+        self.control = control
+        self.dt = dt
+        self.t = np.arange(n_steps + 1) * dt
+        self._x = np.zeros((n_steps + 1, n))
+        self._v = np.zeros((n_steps + 1, n))
+        self.first = 0  # First vehicle to re-simulate
+        self.updates = 0
+
+    def __len__(self) -> int:
+        """ Number of vehicles"""
+        return len(self.x0)
+
+    def modify(self, idx, x0=None, v0=None, **params) -> None:
+        """
+            Edit initial state or parameters of vehicles idx
+        """
+        unknown = set(params) - set(PARAMETERS)
+        if unknown:
+            raise ValueError(
+                f"Unknown parameters {sorted(unknown)}, use {tuple(PARAMETERS)}"
+            )
+        idx = np.atleast_1d(idx)
+        if x0 is not None:
+            self.x0[idx] = x0
+        if v0 is not None:
+            self.v0[idx] = v0
+        for name, value in params.items():
+            self.params[name][idx] = value
+        self.first = min(self.first, int(idx.min()))
+
+    def simulate(self) -> None:
+        """
+            Re-simulate from the first affected vehicle, if any
+        """
+        first = self.first
+        if first >= len(self):
+            return
+        if first == 0:
+            lead, leader = 0, None
+        else:
+            lead = first - 1
+            data = np.stack([self.t, self._x[:, lead], self._v[:, lead]])[:, None, :]
+            leader = TrajectoryStore(data).leader(0)
+        params = {name: value[lead:] for name, value in self.params.items()}
+        engine = PlatoonEngine(
+            self.x0[lead:], self.v0[lead:], sigma=0, dt=self.dt, leader=leader, **params
+        )
+        record = engine.run(self.n_steps, self.control, engine.recorder(self.n_steps))
+        self._x[0, first:] = self.x0[first:]
+        self._v[0, first:] = self.v0[first:]
+        self._x[1:, first:] = record.x[:, first - lead :]
+        self._v[1:, first:] = record.v[:, first - lead :]
+        self.updates += self.n_steps * (len(self) - lead)
+        self.first = len(self)
+
+    @property
+    def x(self) -> np.ndarray:
+        """ Positions (steps + 1, vehicles), initial state first"""
+        self.simulate()
+        return self._x
+
+    @property
+    def v(self) -> np.ndarray:
+        """ Speeds (steps + 1, vehicles), initial state first"""
+        self.simulate()
+        return self._v
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(n={len(self)},steps={self.n_steps})"
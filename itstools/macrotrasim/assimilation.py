@@ -0,0 +1,158 @@
+"""
+    Ensemble Kalman filter traffic state estimation
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+import numpy as np
+
+from .macrotrasim import CellTransmissionModel
+
+# ==============================================================================
+# Constants
+# ==============================================================================
+
+OBS_STD = 1.0  # Probe speed measurement noise [m/s]
+MODEL_STD = 0.002  # Density model noise [veh/m]
+
+# ==============================================================================
+# Functions
+# ==============================================================================
+
+
+def cav_observations(x, v, dx: float, n_cells: int, cav=None) -> tuple:
+    """
+        Mean probe speed of the cells holding at least one CAV
+
+        x, v are positions and speeds of the vehicles (e.g. a TrafficLane
+        state or an engine recorder row), cav an optional boolean mask of the
+        connected vehicles. Returns the observed cells and their speeds.
+    """
+    x, v = np.asarray(x), np.asarray(v)
+    if cav is not None:
+        x, v = x[cav], v[cav]
+    cell = np.floor(x / dx).astype(np.int64)
+    inside = (cell >= 0) & (cell < n_cells)
+    count = np.bincount(cell[inside], minlength=n_cells)
+    total = np.bincount(cell[inside], weights=v[inside], minlength=n_cells)
+    cells = np.flatnonzero(count)
+    return cells, total[cells] / count[cells]
+
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class EnsembleKalmanFilter:
+    """
+        Ensemble Kalman filter on a cell transmission model
+
+        The ensemble is a (members, cells) density array advanced by a
+        single CellTransmissionModel step, so demands and supplies may be
+        given per member (arrays of shape (members,)) to carry boundary
+        uncertainty. Gaussian model noise (model_std) is added after each
+        forecast.
+
+        Observations are probe speeds of cells (see cav_observations). The
+        observation operator is the equilibrium speed of the fundamental
+        diagram and the analysis uses perturbed observations. Optionally the
+        gain is tapered with exp(-(d / localization)^2), d being the distance
+        between a cell and an observed cell.
+    """
+
+    def __init__(
+        self,
+        n_cells: int,
+        members: int = 50,
+        k0=0.0,
+        k0_std: float = 0.0,
+        obs_std: float = OBS_STD,
+        model_std: float = MODEL_STD,
+        localization: float = None,
+        seed=None,
+        **kwargs,
+    ) -> None:
+        self.rng = np.random.default_rng(seed)
+        k0 = np.broadcast_to(k0, (members, n_cells))
+        self.model = CellTransmissionModel(n_cells, k0=k0, **kwargs)
+        self.model.k += k0_std * self.rng.standard_normal(self.model.k.shape)
+        self.clip()
+        self.obs_std = obs_std
+        self.model_std = model_std
+        self.localization = localization
+
+    @property
+    def members(self) -> int:
+        """ Ensemble size"""
+        return self.model.k.shape[0]
+
+    @property
+    def k(self) -> np.ndarray:
+        """ Ensemble densities (members, cells)"""
+        return self.model.k
+
+    @property
+    def mean(self) -> np.ndarray:
+        """ Ensemble mean density"""
+        return self.model.k.mean(axis=0)
+
+    @property
+    def std(self) -> np.ndarray:
+        """ Ensemble density spread"""
+        return self.model.k.std(axis=0, ddof=1)
+
+    def clip(self) -> None:
+        """ Keep densities within [0, k_x]"""
+        np.clip(self.model.k, 0, self.model.fd.k_x, out=self.model.k)
+
+    def forecast(self, demand=None, supply=None) -> None:
+        """
+            Advance all members a single time step
+        """
+        self.model.step(demand, supply)
+        if self.model_std:
+            self.model.k += self.model_std * self.rng.standard_normal(
+                self.model.k.shape
+            )
+            self.clip()
+
+    def analysis(self, cells, speeds) -> None:
+        """
+            Update the ensemble with probe speeds observed at cells
+        """
+        cells = np.asarray(cells)
+        if not len(cells):
+            return
+        k = self.model.k
+        n_1 = self.members - 1
+        hk = self.model.fd.speed(k[:, cells])
+        anomaly = k - k.mean(axis=0)
+        h_anomaly = hk - hk.mean(axis=0)
+        p_xh = anomaly.T @ h_anomaly / n_1
+        p_hh = h_anomaly.T @ h_anomaly / n_1
+        if self.localization:
+            x = (np.arange(k.shape[1]) + 0.5) * self.model.dx
+            d = x[:, None] - x[cells][None, :]
+            p_xh *= np.exp(-((d / self.localization) ** 2))
+        obs_var = self.obs_std ** 2
+        perturbed = speeds + self.obs_std * self.rng.standard_normal(hk.shape)
+        innovation = perturbed - hk
+        gain = np.linalg.solve(p_hh + obs_var * np.eye(len(cells)), p_xh.T)
+        k += innovation @ gain
+        self.clip()
+
+    def step(self, demand=None, supply=None, observations=None) -> None:
+        """
+            Forecast a time step and assimilate (cells, speeds) if given
+        """
+        self.forecast(demand, supply)
+        if observations is not None:
+            self.analysis(*observations)
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(members={self.members},cells={self.k.shape[1]})"
+        )
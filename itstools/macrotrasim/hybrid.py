@@ -0,0 +1,222 @@
+"""
+    Hybrid micro-macro corridor
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+import numpy as np
+
+from itstools.connectv2x.carfollow import A_MAX, A_MIN, C_3, Tampere
+from itstools.connectv2x.messages import X_CONGESTION
+from itstools.connectv2x.network import TrafficLane
+from itstools.connectv2x.traffic import FundamentalDiagram
+from itstools.connectv2x.vehicles import DT, U_I
+
+from .macrotrasim import DX, CellTransmissionModel
+
+# ==============================================================================
+# Constants
+# ==============================================================================
+
+L_CORRIDOR = 100000  # Corridor length [m]
+WINDOW = (X_CONGESTION - 2000, X_CONGESTION + 2000)  # Microscopic window [m]
+
+# ==============================================================================
+# Functions
+# ==============================================================================
+
+
+def hdv(x0: float, v0: float):
+    """
+        Default vehicle inserted in the microscopic window
+    """
+    return Tampere(x0, v0, "HDV")
+
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class GhostVehicle:
+    """
+        Virtual leader of the window head standing for downstream traffic
+    """
+
+    __slots__ = ["x_t", "v_t"]
+
+    def __init__(self, x0: float = np.inf, v0: float = U_I) -> None:
+        self.x_t = x0
+        self.v_t = v0
+
+
+class HybridCorridor:
+    """
+        Corridor with a microscopic window between two CTM links
+
+        [0, x_in) and [x_out, length) are cell transmission models, while
+        [x_in, x_out) is a TrafficLane of car-following vehicles (absolute
+        positions, so messages located at X_CONGESTION act unchanged).
+
+        Upstream coupling: the supply of the upstream CTM is the receiving
+        flow of the density seen in the first dx of the window. Its outflow
+        accumulates in a counter and a vehicle (built by `vehicle`) enters
+        the window every time the counter reaches one, unless the last
+        vehicle is within the minimum spacing.
+
+        Downstream coupling: vehicles crossing x_out are detached and
+        queued as demand of the downstream CTM. The head vehicle of the
+        window follows a ghost leader standing for the last vehicle that
+        left. Vehicles the downstream CTM cannot receive wait in this point
+        queue: congestion reaching x_out from downstream is not spilled back
+        into the window (the bounded decelerations of the car-following
+        model cannot absorb a CTM shock). Congestion created inside the
+        window spills back into the upstream CTM through its supply.
+    """
+
+    def __init__(
+        self,
+        length: float = L_CORRIDOR,
+        window: tuple = WINDOW,
+        dx: float = DX,
+        dt: float = DT,
+        fd: FundamentalDiagram = None,
+        vehicle=hdv,
+    ) -> None:
+        self.fd = FundamentalDiagram() if fd is None else fd
+        n_up = int(round(window[0] / dx))
+        n_win = int(round((window[1] - window[0]) / dx))
+        n_down = int(round(length / dx)) - n_up - n_win
+        self.x_in = n_up * dx
+        self.x_out = (n_up + n_win) * dx
+        self.dx = dx
+        self.dt = dt
+        self.upstream = CellTransmissionModel(n_up, dx, dt, self.fd)
+        self.downstream = CellTransmissionModel(n_down, dx, dt, self.fd)
+        self.lane = TrafficLane(self.x_out - self.x_in)
+        self.ghost = GhostVehicle()
+        self.n_window = n_win
+        self.vehicle = vehicle
+        self.pending = 0.0  # Vehicles leaving the upstream CTM not inserted yet
+        self.queued = 0.0  # Vehicles leaving the window not in the downstream CTM yet
+        self.step_count = 0
+
+    @property
+    def t(self) -> float:
+        """ Current time"""
+        return self.step_count * self.dt
+
+    @property
+    def vehicles(self) -> float:
+        """ Number of vehicles in the corridor"""
+        return (
+            self.upstream.vehicles
+            + self.pending
+            + len(self.lane.veh_list)
+            + self.queued
+            + self.downstream.vehicles
+        )
+
+    def window_density(self) -> np.ndarray:
+        """ Density of the microscopic window on the cell grid"""
+        x, _ = self.lane.state()
+        cell = np.floor((x - self.x_in) / self.dx).astype(np.int64)
+        inside = (cell >= 0) & (cell < self.n_window)
+        return np.bincount(cell[inside], minlength=self.n_window) / self.dx
+
+    def density(self) -> np.ndarray:
+        """ Density of the corridor on the cell grid"""
+        return np.concatenate(
+            (self.upstream.k, self.window_density(), self.downstream.k)
+        )
+
+    def insert(self) -> None:
+        """
+            Insert a pending vehicle at the window entry when there is room
+
+            The vehicle is placed where it would be had it crossed x_in when
+            the counter reached one, at the speed of the last upstream cell
+            limited by the speed of its leader and the equilibrium speed of
+            its spacing.
+        """
+        v0 = float(self.fd.speed(self.upstream.k[-1]))
+        q = self.upstream.q[-1]
+        x0 = self.x_in + (min((self.pending - 1) / q, self.dt) * v0 if q > 0 else 0.0)
+        veh_list = self.lane.veh_list
+        if veh_list:
+            tail = veh_list[-1]
+            gap = tail.x_t - x0 - tail.traffic.s0
+            if gap < 0:
+                return
+            v0 = min(v0, tail.v_t, gap / tail.traffic.gamma)
+        self.lane.attach_vehicle(self.vehicle(x0, v0))
+        self.pending -= 1
+
+    def update_ghost(self) -> None:
+        """
+            Advance the ghost leader of the window head
+
+            The ghost is the last vehicle that left the window. It tracks the
+            equilibrium speed of the first downstream cell with the platoon
+            leader law c_3 (v_d - v) / 4.
+        """
+        ghost = self.ghost
+        v_eq = float(self.fd.speed(self.downstream.k[0]))
+        acc = min(max(C_3 * (v_eq - ghost.v_t) / 4, A_MIN), A_MAX)
+        ghost.v_t = max(ghost.v_t + acc * self.dt, 0.0)
+        ghost.x_t += ghost.v_t * self.dt
+        if self.lane.veh_list:
+            self.lane.veh_list[0].set_leader(ghost)
+
+    def exit(self) -> None:
+        """
+            Move vehicles past the window exit to the downstream queue
+        """
+        veh_list = self.lane.veh_list
+        while veh_list and veh_list[0].x_t >= self.x_out:
+            head = self.lane.detach_vehicle()
+            self.ghost.x_t, self.ghost.v_t = head.x_t, head.v_t
+            self.queued += 1
+
+    def step(self, demand=None, supply=None) -> None:
+        """
+            Advance a single time step
+        """
+        k_entry = self.window_density()[0] if self.n_window else 0.0
+        receiving = (
+            0.0 if self.pending >= 1 else max(float(self.fd.receiving(k_entry)), 0.0)
+        )
+        self.upstream.step(demand, receiving)
+        self.pending += self.upstream.q[-1] * self.dt
+        if self.pending >= 1:
+            self.insert()
+
+        self.update_ghost()
+        self.lane.evolve_step()
+        self.exit()
+
+        self.downstream.step(self.queued / self.dt, supply)
+        self.queued -= self.downstream.q[0] * self.dt
+        self.step_count += 1
+
+    def run(self, n_steps: int, demand=None, supply=None, every: int = 1) -> tuple:
+        """
+            Advance n_steps, returns times and densities every `every` steps
+        """
+        n_rec = n_steps // every
+        t = np.zeros(n_rec)
+        k = np.zeros((n_rec, len(self.upstream) + self.n_window + len(self.downstream)))
+        for step in range(n_steps):
+            self.step(demand, supply)
+            if (step + 1) % every == 0:
+                i = (step + 1) // every - 1
+                t[i] = self.t
+                k[i] = self.density()
+        return t, k
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(window=({self.x_in},{self.x_out}),dx={self.dx})"
+        )
@@ -0,0 +1,110 @@
+"""
+    Junction (node) models
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+import numpy as np
+
+# ==============================================================================
+# Functions
+# ==============================================================================
+
+
+def merge(sending, receiving):
+    """
+        Demand-proportional merge of n_in links into one
+
+        sending (..., n_in), receiving (...) -> flows (..., n_in)
+    """
+    demand = np.sum(sending, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        theta = np.where(demand > receiving, receiving / demand, 1.0)
+    return sending * theta[..., None]
+
+
+def diverge(sending, receiving, split):
+    """
+        FIFO diverge of one link into n_out links with split ratios
+
+        sending (...), receiving (..., n_out), split (..., n_out)
+        -> flows (..., n_out)
+    """
+    with np.errstate(divide="ignore"):
+        bound = np.where(split > 0, receiving / split, np.inf)
+    inflow = np.minimum(sending, np.min(bound, axis=-1))
+    return split * inflow[..., None]
+
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class Incidence:
+    """
+        Sparse incidence between movements (columns) and links (rows)
+
+        Stored in compressed row form: movements sorted by row and the start
+        of each row. Reductions over the movements of every row run with a
+        single ufunc.reduceat along the last axis, so leading axes are
+        supported.
+    """
+
+    def __init__(self, rows, n_rows: int) -> None:
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.n_rows = n_rows
+        self.order = np.argsort(self.rows, kind="stable")
+        counts = np.bincount(self.rows, minlength=n_rows)
+        self.indptr = np.concatenate(([0], np.cumsum(counts)))
+        self.nonempty = np.flatnonzero(counts)
+
+    def __len__(self) -> int:
+        """ Number of movements"""
+        return len(self.rows)
+
+    def reduce(self, ufunc, values, empty) -> np.ndarray:
+        """
+            Reduce per-movement values over each row (empty rows get `empty`)
+        """
+        values = np.asarray(values)
+        out = np.full(values.shape[:-1] + (self.n_rows,), empty, dtype=values.dtype)
+        if len(self):
+            sorted_values = values[..., self.order]
+            out[..., self.nonempty] = ufunc.reduceat(
+                sorted_values, self.indptr[self.nonempty], axis=-1
+            )
+        return out
+
+    def sum(self, values) -> np.ndarray:
+        """ Row sums (A x)"""
+        return self.reduce(np.add, values, 0)
+
+    def min(self, values) -> np.ndarray:
+        """ Row minima (inf for rows without movements)"""
+        return self.reduce(np.minimum, values, np.inf)
+
+    def expand(self, row_values) -> np.ndarray:
+        """ Row value of every movement (A^T y)"""
+        return np.asarray(row_values)[..., self.rows]
+
+
+def node_flows(sending, receiving, split, upstream: Incidence, downstream: Incidence):
+    """
+        Movement flows of any number of junctions at once
+
+        sending (..., n_links) and receiving (..., n_links) are evaluated at
+        the last and first cell of each link. Movement m goes from link
+        upstream.rows[m] to link downstream.rows[m] with split ratio
+        split[m]. Each receiving link accepts the same fraction of all its
+        demands (merge) and each sending link is held by its most restrictive
+        receiving link (FIFO diverge).
+    """
+    demand = split * upstream.expand(sending)
+    total = downstream.sum(demand)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        accept = np.where(total > receiving, receiving / total, 1.0)
+    theta = np.minimum(upstream.min(downstream.expand(accept)), 1.0)
+    return upstream.expand(theta) * demand
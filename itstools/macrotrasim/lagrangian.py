@@ -0,0 +1,118 @@
+"""
+    Lagrangian LWR model (vehicle-number coordinates)
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+import numpy as np
+
+from itstools.connectv2x.traffic import FundamentalDiagram
+from itstools.connectv2x.vehicles import DT
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class LagrangianLWR:
+    """
+        Godunov scheme of the LWR model in vehicle-number coordinates
+
+        The traffic is split in packets of dn vehicles. x[..., i] is the
+        position of the vehicle numbered i dn counted from the head (last
+        axis, leading axes hold independent copies). The spacing of packet i
+        is s_i = (x_{i-1} - x_i) / dn and every boundary moves at the
+        equilibrium speed of the packet ahead of it
+
+            x_i += dt V(s_i),   V(s) = min(u, w (k_x s - 1))
+
+        which is the upwind Godunov flux for the triangular diagram (with
+        dn = 1 it is Newell's car following model). The CFL condition is
+        w k_x dt <= dn. Boundaries are vehicle trajectories, directly
+        comparable to microscopic ones.
+
+        The head (x[..., 0]) moves at u, at a fixed speed or at a speed
+        given as a function of its position, like the platoon engine leader.
+    """
+
+    def __init__(
+        self, x0, dn: float = 1, dt: float = DT, fd: FundamentalDiagram = None
+    ) -> None:
+        self.fd = FundamentalDiagram() if fd is None else fd
+        if self.fd.w * self.fd.k_x * dt > dn * (1 + 1e-9):
+            raise ValueError(f"CFL condition violated: dt={dt} too large for dn={dn}")
+        self.x = np.array(x0, dtype=np.float64)
+        if np.any(np.diff(self.x, axis=-1) > 0):
+            raise ValueError("Positions must be sorted head first")
+        self.dn = dn
+        self.dt = dt
+        self.k = 0
+
+    @classmethod
+    def from_demand(cls, demand, dn: int = 1, **kwargs) -> "LagrangianLWR":
+        """
+            Packets of dn vehicles from the positions of a Demand
+        """
+        positions = np.sort(np.asarray(demand.full_positions, dtype=float))[::-1]
+        return cls(positions[::dn], dn=dn, **kwargs)
+
+    def __len__(self) -> int:
+        """ Number of packet boundaries"""
+        return self.x.shape[-1]
+
+    @property
+    def t(self) -> float:
+        """ Current time"""
+        return self.k * self.dt
+
+    @property
+    def n(self) -> np.ndarray:
+        """ Vehicle numbers of the packet boundaries"""
+        return np.arange(len(self)) * self.dn
+
+    @property
+    def density(self) -> np.ndarray:
+        """ Density of each packet (behind boundaries 1...)"""
+        with np.errstate(divide="ignore"):
+            return self.dn / (self.x[..., :-1] - self.x[..., 1:])
+
+    def speed(self, control=None) -> np.ndarray:
+        """
+            Speed of every packet boundary
+        """
+        v = np.empty_like(self.x)
+        v[..., 1:] = np.maximum(self.fd.speed(self.density), 0)
+        if control is None:
+            v[..., 0] = self.fd.u
+        elif callable(control):
+            v[..., 0] = control(self.x[..., 0])
+        else:
+            v[..., 0] = control
+        return v
+
+    def step(self, control=None) -> None:
+        """
+            Advance a single time step
+        """
+        self.x += self.dt * self.speed(control)
+        self.k += 1
+
+    def run(self, n_steps: int, control=None, every: int = 1) -> tuple:
+        """
+            Advance n_steps, returns times and positions every `every` steps
+        """
+        n_rec = n_steps // every
+        t = np.zeros(n_rec)
+        x = np.zeros((n_rec,) + self.x.shape)
+        for step in range(n_steps):
+            self.step(control)
+            if (step + 1) % every == 0:
+                i = (step + 1) // every - 1
+                t[i] = self.t
+                x[i] = self.x
+        return t, x
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(n={len(self)},dn={self.dn},dt={self.dt})"
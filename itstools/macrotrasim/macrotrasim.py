@@ -1 +1,132 @@
-"""Main module."""
+"""
+    Cell transmission model (Godunov scheme for the LWR model)
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+import numpy as np
+
+from itstools.connectv2x.traffic import FundamentalDiagram
+from itstools.connectv2x.vehicles import DT, U_I
+
+# ==============================================================================
+# Constants
+# ==============================================================================
+
+DX = U_I * DT  # Cell length [m], CFL number 1 in free flow
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class CellTransmissionModel:
+    """
+        Cell transmission model of a link
+
+        The link is split in cells of length dx. Densities k [veh/m] are kept
+        in an array whose last axis runs over cells (leading axes hold
+        independent copies, e.g. ensembles). Each step computes the flows at
+        all cell interfaces at once
+
+            q_{i+1/2} = min(S(k_i), R(k_{i+1}))
+
+        with the sending and receiving functions of the fundamental diagram,
+        and updates k_i += dt / dx (q_{i-1/2} - q_{i+1/2}).
+
+        The upstream demand and downstream supply [veh/s] are values, arrays
+        broadcasting against the leading axes, or functions of time. By
+        default nothing enters and vehicles leave freely.
+    """
+
+    def __init__(
+        self,
+        n_cells: int,
+        dx: float = DX,
+        dt: float = DT,
+        fd: FundamentalDiagram = None,
+        k0=0.0,
+    ) -> None:
+        self.fd = FundamentalDiagram() if fd is None else fd
+        if dt * max(np.max(self.fd.u), np.max(self.fd.w)) > dx:
+            raise ValueError(f"CFL condition violated: dt={dt} too large for dx={dx}")
+        self.dx = dx
+        self.dt = dt
+        self.k = np.array(
+            np.broadcast_to(k0, np.shape(k0)[:-1] + (n_cells,)), dtype=np.float64
+        )
+        self.q = np.zeros(self.k.shape[:-1] + (n_cells + 1,))  # Interface flows
+        self.step_count = 0
+        self.inflow = np.zeros(self.k.shape[:-1])  # Cumulative counts [veh]
+        self.outflow = np.zeros(self.k.shape[:-1])
+
+    def __len__(self) -> int:
+        """ Number of cells"""
+        return self.k.shape[-1]
+
+    @property
+    def t(self) -> float:
+        """ Current time"""
+        return self.step_count * self.dt
+
+    @property
+    def x(self) -> np.ndarray:
+        """ Cell centers"""
+        return (np.arange(len(self)) + 0.5) * self.dx
+
+    @property
+    def vehicles(self) -> np.ndarray:
+        """ Number of vehicles in the link"""
+        return self.k.sum(axis=-1) * self.dx
+
+    def boundary(self, value, default) -> np.ndarray:
+        """
+            Boundary flow at the current time (value or function of time)
+        """
+        if value is None:
+            return default
+        if callable(value):
+            return value(self.t)
+        return value
+
+    def fluxes(self, demand=None, supply=None) -> np.ndarray:
+        """
+            Flows at all cell interfaces (upstream boundary first)
+        """
+        sending = self.fd.sending(self.k)
+        receiving = self.fd.receiving(self.k)
+        q = self.q
+        np.minimum(sending[..., :-1], receiving[..., 1:], out=q[..., 1:-1])
+        q[..., 0] = np.minimum(self.boundary(demand, 0.0), receiving[..., 0])
+        q[..., -1] = np.minimum(sending[..., -1], self.boundary(supply, np.inf))
+        return q
+
+    def step(self, demand=None, supply=None) -> None:
+        """
+            Advance a single time step
+        """
+        q = self.fluxes(demand, supply)
+        self.k += (self.dt / self.dx) * (q[..., :-1] - q[..., 1:])
+        self.inflow += q[..., 0] * self.dt
+        self.outflow += q[..., -1] * self.dt
+        self.step_count += 1
+
+    def run(self, n_steps: int, demand=None, supply=None, every: int = 1) -> tuple:
+        """
+            Advance n_steps, returns times and densities every `every` steps
+        """
+        n_rec = n_steps // every
+        t = np.zeros(n_rec)
+        k = np.zeros((n_rec,) + self.k.shape)
+        for step in range(n_steps):
+            self.step(demand, supply)
+            if (step + 1) % every == 0:
+                i = (step + 1) // every - 1
+                t[i] = self.t
+                k[i] = self.k
+        return t, k
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(n={len(self)},dx={self.dx},dt={self.dt})"
@@ -0,0 +1,168 @@
+"""
+    Network cell transmission model
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+import numpy as np
+
+from itstools.connectv2x.traffic import FundamentalDiagram
+from itstools.connectv2x.vehicles import DT
+
+from .junctions import Incidence, node_flows
+from .macrotrasim import DX
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class NetworkCTM:
+    """
+        Cell transmission model of a TrafficNetwork
+
+        The cells of all links are stored in a single density array (last
+        axis), link after link in network order. Each link is split in cells
+        of length close to dx, and its jam density scales with its number of
+        lanes. A step computes
+
+            * the flows inside every link in one min(S, R) expression
+            * the flows of every junction with node_flows(), using sparse
+              incidences between movements (network connections) and links
+            * the flows entering source links (no upstream connection) and
+              leaving sink links (no downstream connection)
+
+        so its cost does not depend on the number of links beyond the size
+        of the arrays. Source demands and sink supplies [veh/s] are values,
+        arrays over sources/sinks or functions of time.
+    """
+
+    def __init__(
+        self, network, dx: float = DX, dt: float = DT, fd=None, k0=0.0
+    ) -> None:
+        fd = FundamentalDiagram() if fd is None else fd
+        if dt * max(fd.u, fd.w) > dx:
+            raise ValueError(f"CFL condition violated: dt={dt} too large for dx={dx}")
+        self.dt = dt
+        self.links = tuple(network)
+        index = {idx: i for i, idx in enumerate(self.links)}
+
+        lengths = np.array([network[idx].length for idx in self.links], dtype=float)
+        lanes = np.array([len(network[idx]) for idx in self.links])
+        n_cells = np.maximum(np.floor(lengths / dx), 1).astype(np.int64)
+        self.first = np.concatenate(([0], np.cumsum(n_cells)[:-1]))
+        self.last = self.first + n_cells - 1
+        self.link_of = np.repeat(np.arange(len(self.links)), n_cells)
+        self.dx = (lengths / n_cells)[self.link_of]
+        self.fd = FundamentalDiagram(fd.w, fd.u, fd.k_x * lanes[self.link_of])
+        if np.any(dt * fd.u > self.dx):
+            raise ValueError("CFL condition violated: link shorter than u dt")
+
+        # Cells whose downstream neighbour is in the same link
+        self.inner = np.setdiff1d(np.arange(self.link_of.size), self.last)
+
+        connections = network.connections
+        up = np.array([index[c[0]] for c in connections], dtype=np.int64)
+        down = np.array([index[c[1]] for c in connections], dtype=np.int64)
+        self.split = np.array([c[2] for c in connections], dtype=float)
+        self.upstream = Incidence(up, len(self.links))
+        self.downstream = Incidence(down, len(self.links))
+        self.sinks = np.setdiff1d(np.arange(len(self.links)), up)
+        self.sources = np.setdiff1d(np.arange(len(self.links)), down)
+        self.junction_out = np.unique(up)
+        self.junction_in = np.unique(down)
+
+        self.k = np.array(
+            np.broadcast_to(k0, np.shape(k0)[:-1] + (self.link_of.size,)), dtype=float
+        )
+        self.step_count = 0
+
+    def __len__(self) -> int:
+        """ Number of cells"""
+        return self.k.shape[-1]
+
+    @property
+    def t(self) -> float:
+        """ Current time"""
+        return self.step_count * self.dt
+
+    @property
+    def vehicles(self) -> np.ndarray:
+        """ Number of vehicles in the network"""
+        return np.sum(self.k * self.dx, axis=-1)
+
+    def link_density(self, link) -> np.ndarray:
+        """ Densities of the cells of a link (by link id)"""
+        i = self.links.index(link)
+        return self.k[..., self.first[i] : self.last[i] + 1]
+
+    def boundary(self, value, default) -> np.ndarray:
+        """
+            Boundary flow at the current time (value or function of time)
+        """
+        if value is None:
+            return default
+        if callable(value):
+            return value(self.t)
+        return value
+
+    def fluxes(self, demand=None, supply=None) -> tuple:
+        """
+            Flows entering and leaving every cell
+        """
+        sending = self.fd.sending(self.k)
+        receiving = self.fd.receiving(self.k)
+        f_in = np.zeros_like(self.k)
+        f_out = np.zeros_like(self.k)
+
+        inner = self.inner
+        q = np.minimum(sending[..., inner], receiving[..., inner + 1])
+        f_out[..., inner] = q
+        f_in[..., inner + 1] = q
+
+        q = node_flows(
+            sending[..., self.last],
+            receiving[..., self.first],
+            self.split,
+            self.upstream,
+            self.downstream,
+        )
+        f_out[..., self.last[self.junction_out]] = self.upstream.sum(q)[
+            ..., self.junction_out
+        ]
+        f_in[..., self.first[self.junction_in]] = self.downstream.sum(q)[
+            ..., self.junction_in
+        ]
+
+        src, snk = self.first[self.sources], self.last[self.sinks]
+        f_in[..., src] = np.minimum(self.boundary(demand, 0.0), receiving[..., src])
+        f_out[..., snk] = np.minimum(sending[..., snk], self.boundary(supply, np.inf))
+        return f_in, f_out
+
+    def step(self, demand=None, supply=None) -> None:
+        """
+            Advance a single time step
+        """
+        f_in, f_out = self.fluxes(demand, supply)
+        self.k += (self.dt / self.dx) * (f_in - f_out)
+        self.step_count += 1
+
+    def run(self, n_steps: int, demand=None, supply=None, every: int = 1) -> tuple:
+        """
+            Advance n_steps, returns times and densities every `every` steps
+        """
+        n_rec = n_steps // every
+        t = np.zeros(n_rec)
+        k = np.zeros((n_rec,) + self.k.shape)
+        for step in range(n_steps):
+            self.step(demand, supply)
+            if (step + 1) % every == 0:
+                i = (step + 1) // every - 1
+                t[i] = self.t
+                k[i] = self.k
+        return t, k
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(links={len(self.links)},cells={len(self)})"
@@ -13,7 +13,7 @@ U_MAX = 1  # Control default
 # ==============================================================================
 
 class PID:
-    def __init__(self, k_p, k_i, k_d):
+    def __init__(self, k_p, k_i, k_d, ts=TS):
 
         # Ziegler Nichols method
         # Check here https://en.wikipedia.org/wiki/Ziegler–Nichols_method
@@ -29,7 +29,7 @@ class PID:
         self.k_i = k_i
         self.k_d = k_d
 
-        self.T = TS  # Sampling time
+        self.T = ts  # Sampling time
         self.t = [0]
 
         self.u_p = [0]  # Proportional term
@@ -38,8 +38,8 @@ class PID:
 
         self.control = [0]  # Control memory
 
-        self.integ = Integrator()
-        self.diff = Derivator()
+        self.integ = Integrator(ts=ts)
+        self.diff = Derivator(ts=ts)
 
     def apply_control(self, error):
 
@@ -68,7 +68,7 @@ U_MAX = 10
 
 
 class PIDlim:
-    def __init__(self, k_p, k_i, k_d, u_max=U_MAX):
+    def __init__(self, k_p, k_i, k_d, u_max=U_MAX, ts=TS):
 
         # Ziegler Nichols method
         # Check here https://en.wikipedia.org/wiki/Ziegler–Nichols_method
@@ -83,7 +83,7 @@ class PIDlim:
         self.k_i = k_i
         self.k_d = k_d
 
-        self.T = TS  # Sampling time
+        self.T = ts  # Sampling time
         self.t = [0]
 
         self.u_p = [0]  # Proportional term
@@ -96,8 +96,8 @@ class PIDlim:
         self.control = [0]  # Control memory
         self.control_bnd = [0]
 
-        self.integ = Integrator()
-        self.diff = Derivator()
+        self.integ = Integrator(ts=ts)
+        self.diff = Derivator(ts=ts)
 
     def apply_control(self, error):
 
@@ -129,7 +129,7 @@ class PIDlim:
 
 
 class PIDantiwindup:
-    def __init__(self, k_p, k_i, k_d, u_max=U_MAX):
+    def __init__(self, k_p, k_i, k_d, u_max=U_MAX, ts=TS):
 
         # Ziegler Nichols method
         # Check here https://en.wikipedia.org/wiki/Ziegler–Nichols_method
@@ -144,7 +144,7 @@ class PIDantiwindup:
         self.k_i = k_i
         self.k_d = k_d
 
-        self.T = TS  # Sampling time
+        self.T = ts  # Sampling time
         self.t = [0]
 
         self.u_p = [0]  # Proportional term
@@ -159,8 +159,8 @@ class PIDantiwindup:
 
         self.T_t = 1  # Time constant for integration reset
 
-        self.integ = Integrator()
-        self.diff = Derivator()
+        self.integ = Integrator(ts=ts)
+        self.diff = Derivator(ts=ts)
 
     def apply_control(self, error):
 
@@ -0,0 +1,132 @@
+"""
+    Multi-rate scheduling of platoon control and traffic
+"""
+
+# ==============================================================================
+# Imports
+# ==============================================================================
+
+from math import isclose
+
+from .pid import TS
+
+# ==============================================================================
+# Functions
+# ==============================================================================
+
+
+def speed_error(reference):
+    """
+        Speed error v_ref - v (reference: value or function of position)
+    """
+
+    def error(vehicle):
+        v_ref = reference(vehicle.x_t) if callable(reference) else reference
+        return v_ref - vehicle.v_t
+
+    return error
+
+
+def spacing_error(reference):
+    """
+        Spacing error s - s_ref with respect to the vehicle leader
+    """
+
+    def error(vehicle):
+        return vehicle.veh_lead.x_t - vehicle.x_t - reference
+
+    return error
+
+
+# ==============================================================================
+# Clases
+# ==============================================================================
+
+
+class ControlLoop:
+    """
+        Platoon control loop (controller + vehicle actuator chain)
+
+        Each call measures the error on the vehicle, computes the control and
+        advances the vehicle chain one (fast) sampling period.
+    """
+
+    def __init__(self, vehicle, controller, error) -> None:
+        self.vehicle = vehicle
+        self.controller = controller
+        self.error = error
+
+    def __call__(self) -> float:
+        """ Single control period"""
+        u = self.controller(self.error(self.vehicle))
+        self.vehicle(u)
+        return u
+
+
+class MultiRateScheduler:
+    """
+        Multi-rate stepping: fast platoon controllers, slow traffic
+
+        Within each traffic step of length ts the fast tasks (platoon control
+        loops) run `ratio` times with sampling ts / ratio, then the slow tasks
+        (HDV car following) run once and read the platoon state at the end of
+        the step.
+    """
+
+    def __init__(self, ratio: int = 1, ts: float = TS) -> None:
+        if ratio < 1 or int(ratio) != ratio:
+            raise ValueError(f"ratio must be a positive integer, got {ratio}")
+        self.ratio = int(ratio)
+        self.ts = ts
+        self.fast = []
+        self.slow = []
+        self.k = 0
+
+    @property
+    def ts_fast(self) -> float:
+        """ Sampling time of the fast tasks"""
+        return self.ts / self.ratio
+
+    @property
+    def t(self) -> float:
+        """ Current time"""
+        return self.k * self.ts
+
+    def add_fast(self, task) -> None:
+        """ Register a task running at the fast rate"""
+        self.fast.append(task)
+
+    def add_slow(self, task) -> None:
+        """ Register a task running at the traffic rate"""
+        self.slow.append(task)
+
+    def add_loop(self, vehicle, controller, error) -> ControlLoop:
+        """
+            Register a platoon control loop, checking it samples at ts_fast
+        """
+        for block in (controller, vehicle.g1):
+            if not isclose(block.T, self.ts_fast):
+                raise ValueError(
+                    f"{block.__class__.__name__} samples at {block.T}, "
+                    f"expected {self.ts_fast}"
+                )
+        loop = ControlLoop(vehicle, controller, error)
+        self.add_fast(loop)
+        return loop
+
+    def step(self) -> None:
+        """ Advance one traffic step"""
+        for _ in range(self.ratio):
+            for task in self.fast:
+                task()
+        for task in self.slow:
+            task()
+        self.k += 1
+
+    def run(self, n_steps: int) -> None:
+        """ Advance n_steps traffic steps"""
+        for _ in range(n_steps):
+            self.step()
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(ratio={self.ratio},ts={self.ts})"
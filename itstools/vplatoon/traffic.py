@@ -52,7 +52,7 @@ class FundamentalDiagram:
         xlabel = "Density [veh/km]"
         ylabel = "Flow [veh/h]"
 
-        p = figure(title=title, tools=[], plot_height=500, plot_width=500)
+        p = figure(title=title, tools=[], height=500, width=500)
         p.line(k, q)
         p.xaxis.axis_label = xlabel
         p.yaxis.axis_label = ylabel
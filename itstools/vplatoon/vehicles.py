@@ -26,6 +26,13 @@ T_E = 2
 A_MAX = 0.5
 A_MIN = -0.5
 
+# Integration schemes (System blocks, Integrator rule)
+SCHEMES = {
+    "euler": ("euler", "rectangle"),
+    "heun": ("heun", "trapezoidal"),
+    "rk4": ("rk4", "trapezoidal"),
+}
+
 # ==============================================================================
 # Clases
 # ==============================================================================
@@ -145,10 +152,10 @@ class Vehicle(object):
 
 
 class Derivator:
-    def __init__(self):
+    def __init__(self, ts=DT):
         self.x = [0]
         self.dx = [0]
-        self.T = DT
+        self.T = ts
         self.t = [0]
 
     def diff(self, val):
@@ -176,17 +183,24 @@ class Derivator:
 
 
 class Integrator:
-    def __init__(self, x0=0):
+    def __init__(self, x0=0, ix0=0, method="rectangle", ts=DT):
         self.x = [x0]
-        self.ix = [0]
-        self.T = DT
+        self.ix = [ix0]
+        self.T = ts
         self.t = [0]
+        self.method = method
 
     def integ(self, val):
         """
-            Compute (x_k - x_{k-1})/T and updates the memory 
+            Compute the running integral of x and updates the memory
+
+            rectangle: left rectangle rule T x_{k-1}
+            trapezoidal: T (x_{k-1} + x_k) / 2
         """
-        integral = np.sum(self.T * np.array(self.x))
+        if self.method == "trapezoidal":
+            integral = self.ix[-1] + self.T * (self.x[-1] + val) / 2
+        else:
+            integral = self.ix[-1] + self.T * self.x[-1]
         self.x.append(val)  # memory
         self.ix.append(integral)  # memory
         self.time_update()
@@ -207,25 +221,38 @@ class Integrator:
 
 
 class System:
-    def __init__(self, K=1):
+    def __init__(self, K=1, method="euler", ts=DT):
         self.x = [0]
-        self.K = 1
+        self.K = K
         self.A = TAU  # Constant time
-        self.T = DT  # Sampling time
+        self.T = ts  # Sampling time
         self.t = [0]
+        self.method = method
 
-    def update(self, control):
+    def derivative(self, x, control):
         """
-            Update x_[k+1] as a function of x[k]
+            First order dynamics dx/dt = (K u - x) / A
         """
+        return (self.K * control - x) / self.A
 
-        #  Dynamics first order approximation
-
-        x_k = (
-            self.x[-1]
-            - self.x[-1] * self.T / self.A
-            + self.K * control * self.T / self.A
-        )
+    def update(self, control):
+        """
+            Update x_[k+1] as a function of x[k] (control held over the step)
+        """
+        x, T = self.x[-1], self.T
+        if self.method == "rk4":
+            k1 = self.derivative(x, control)
+            k2 = self.derivative(x + T * k1 / 2, control)
+            k3 = self.derivative(x + T * k2 / 2, control)
+            k4 = self.derivative(x + T * k3, control)
+            x_k = x + T * (k1 + 2 * k2 + 2 * k3 + k4) / 6
+        elif self.method == "heun":
+            k1 = self.derivative(x, control)
+            k2 = self.derivative(x + T * k1, control)
+            x_k = x + T * (k1 + k2) / 2
+        else:
+            #  Dynamics first order approximation
+            x_k = x - x * T / self.A + self.K * control * T / self.A
 
         self.x.append(x_k)  # State
         self.time_update()
@@ -278,6 +305,7 @@ class RegularVehicle:
         "spd",
         "_veh_lead",
         "idx",
+        "scheme",
     ]
 
     def __init__(
@@ -287,9 +315,14 @@ class RegularVehicle:
         init_lane: float,
         veh_type: str = "HDV",
         veh_lead=None,
+        scheme: str = "euler",
+        ts: float = DT,
     ) -> None:
         """ 
             Initializes the class
+
+            scheme: "euler" (block by block), "heun" or "rk4" (full actuator chain)
+            ts: sampling time of the actuator chain
         """
 
         self.idx = next(self.__class__._idx)
@@ -304,15 +337,17 @@ class RegularVehicle:
         self._veh_lead = veh_lead
 
         # Dynamics
+        self.scheme = scheme
+        method, rule = SCHEMES[scheme]
         self.g1, self.g2, self.g3, self.g4 = (
-            System(),
-            System(),
-            System(),
-            System(),
+            System(method=method, ts=ts),
+            System(method=method, ts=ts),
+            System(method=method, ts=ts),
+            System(method=method, ts=ts),
         )
 
-        self.spd = Integrator()
-        self.pos = Integrator()
+        self.spd = Integrator(ix0=init_spd, method=rule, ts=ts)
+        self.pos = Integrator(x0=init_spd, ix0=init_pos, method=rule, ts=ts)
         self.x = [init_pos]
         self.v = [init_spd]
         self.a = [0]
@@ -359,10 +394,67 @@ class RegularVehicle:
         """
         return self.g4.t
 
+    def derivative(self, state, control) -> np.ndarray:
+        """
+            Chain dynamics d/dt (g1, g2, g3, g4, v, x)
+        """
+        g1, g2, g3, g4, v, _ = state
+        return np.array(
+            (
+                self.g1.derivative(g1, control),
+                self.g2.derivative(g2, g1),
+                self.g3.derivative(g3, g2),
+                self.g4.derivative(g4, g3),
+                g4,
+                v,
+            )
+        )
+
+    def chain_step(self, control) -> None:
+        """
+            Heun or RK4 step over the full chain (control held over the step)
+        """
+        T = self.g4.T
+        state = np.array(
+            (
+                self.g1.x[-1],
+                self.g2.x[-1],
+                self.g3.x[-1],
+                self.g4.x[-1],
+                self.v_t,
+                self.x_t,
+            )
+        )
+        k1 = self.derivative(state, control)
+        if self.scheme == "rk4":
+            k2 = self.derivative(state + T * k1 / 2, control)
+            k3 = self.derivative(state + T * k2 / 2, control)
+            k4 = self.derivative(state + T * k3, control)
+            state = state + T * (k1 + 2 * k2 + 2 * k3 + k4) / 6
+        else:
+            k2 = self.derivative(state + T * k1, control)
+            state = state + T * (k1 + k2) / 2
+        g1, g2, g3, g4, v, x = state
+
+        for block, value in zip((self.g1, self.g2, self.g3, self.g4), (g1, g2, g3, g4)):
+            block.x.append(value)
+            block.time_update()
+        for integ, val, value in ((self.spd, g4, v), (self.pos, v, x)):
+            integ.x.append(val)
+            integ.ix.append(value)
+            integ.time_update()
+
+        self.a.append(g4)
+        self.v.append(v)
+        self.x.append(x)
+
     def __call__(self, control):
         """ 
             Makes the class callable
         """
+        if self.scheme != "euler":
+            self.chain_step(control)
+            return self.x
         self.a.append(self.g4(self.g3(self.g2(self.g1(control)))))
         self.v.append(self.spd(self.a[-1]))
         self.x.append(self.pos(self.v[-1]))
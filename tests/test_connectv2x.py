@@ -2,11 +2,73 @@
 
 """Tests for `connectv2x` package."""
 
+import copy
+import gc
+import importlib.util
+import os
+import pickle
 import pytest
+import tempfile
+import time
 import unittest
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
+from itstools.connectv2x import carfollow
+from itstools.connectv2x.calibration import (
+    Calibration,
+    pairs_from_record,
+    replay_followers,
+)
 from itstools.connectv2x.carfollow import Tampere
+from itstools.connectv2x.channel import ConnectedPlatoonEngine, V2VChannel
+from itstools.connectv2x.controller import AcceptanceSchedule, SimulationControl
+from itstools.connectv2x.dashboard import LiveDashboard
+from itstools.connectv2x.decomposition import DomainDecomposition
+from itstools.connectv2x.detection import (
+    CongestionMonitor,
+    StreamingBins,
+    detect_fronts,
+)
+from itstools.connectv2x.engine import PlatoonEngine, parameter_grid
+from itstools.connectv2x.fastforward import FastForwardEngine
+from itstools.connectv2x.messages import SPEED_REDUCTION, X_CONGESTION, Msg1, Msg2
+from itstools.connectv2x.optimizer import (
+    BatchEvaluator,
+    MessageScenario,
+    cross_entropy,
+    random_search,
+    total_travel_time,
+)
+from itstools.connectv2x.pipeline import WavefrontPipeline
+from itstools.connectv2x.plottools import (
+    EMPTY_COLOR,
+    bin_space_time,
+    lttb,
+    plot_histogram,
+    plot_multiple_trajectories,
+    plot_single_trace,
+    plot_space_time,
+    plot_stairs,
+    rasterize_points,
+)
+from itstools.connectv2x.network import L_MAX, EngineLane, TrafficNetwork
+from itstools.connectv2x.replay import (
+    ReplayVehicle,
+    load_trajectories,
+    parquet_cache,
+    save_trajectories,
+)
+from itstools.connectv2x.simulatorinf2veh import (
+    BroadcastSimulator,
+    RoadsideUnit,
+    range_query,
+)
 from itstools.connectv2x.support import speed_pulse
+from itstools.connectv2x.traffic import FundamentalDiagram
+from itstools.connectv2x.vehicles import DT
+from itstools.connectv2x.whatif import WhatIfPlatoon
 import numpy as np
 
 
@@ -83,6 +145,760 @@ class TestVehicle(unittest.TestCase):
 
         self.assertTrue(all([isinstance(x, Tampere) for x in veh_list]))
 
+    def test_compact_vehicle_layout(self):
+        veh_a = Tampere(x0=0, v0=25, veh_type="HDV")
+        veh_b = Tampere(x0=10, v0=25, veh_type="CAV", c1=0.4)
+        veh_c = Tampere(x0=20, v0=25, veh_type="HDV", u=20)
+
+        self.assertFalse(hasattr(veh_a, "__dict__"))
+        self.assertIs(veh_a.traffic, veh_b.traffic)
+        self.assertIsNot(veh_a.params, veh_b.params)
+        self.assertEqual(veh_b.c1, 0.4)
+        self.assertEqual(veh_c.u, 20)
+
+        veh_b.c1 = 0.5
+        self.assertIs(veh_a.params, veh_b.params)
+
+    def test_shared_parameters_copies(self):
+        veh = Tampere(x0=100, v0=20, veh_type="HDV", u=22)
+        veh.c1 = 0.9
+        copies = (copy.copy(veh), copy.deepcopy(veh), pickle.loads(pickle.dumps(veh)))
+        for copied in copies:
+            self.assertEqual((copied.x_t, copied.c1, copied.u), (100, 0.9, 22))
+            self.assertIs(copied.params, veh.params)
+            self.assertIs(copied.traffic, veh.traffic)
+        fresh = Tampere(x0=50, v0=20, veh_type="HDV")
+        self.assertEqual((fresh.c1, fresh.u), (carfollow.C_1, carfollow.U_I))
+        with self.assertRaises(AttributeError):
+            veh.params.c1 = 0.1
+
+    def test_parameter_pool_released(self):
+        veh = Tampere(x0=0, v0=25, veh_type="HDV")
+        pool = type(veh.params)._pool
+        size = len(pool)
+        for value in np.linspace(0.1, 0.9, 100):
+            veh.c1 = value
+        gc.collect()
+        self.assertLessEqual(len(pool), size + 1)  # Only the value in use is kept
+
+
+class TestPlatoonEngine(unittest.TestCase):
+    N_VEH = 20
+    T_STEP = 960
+
+    def setUp(self):
+        self.X0 = np.flip(np.arange(0, self.N_VEH) * 5 / 2)
+
+    def test_engine_matches_object_model(self):
+        veh_list = [Tampere(x0=x0, v0=25, veh_type="HDV") for x0 in self.X0]
+        for i in range(1, self.N_VEH):
+            veh_list[i].set_leader(veh_list[i - 1])
+        engine = PlatoonEngine(self.X0, 25, sigma=0)
+
+        with mock.patch.object(carfollow, "SIGMA_A", 0):
+            for _ in range(self.T_STEP):
+                for veh in veh_list:
+                    veh.step_evolution(control=lead_spd)
+                engine.step(lead_spd)
+
+        np.testing.assert_allclose(engine.x, [veh.x_t for veh in veh_list])
+        np.testing.assert_allclose(engine.v, [veh.v_t for veh in veh_list])
+
+    def test_float32_divergence(self):
+        engine64 = PlatoonEngine(self.X0, 25, sigma=0)
+        engine32 = PlatoonEngine(self.X0, 25, sigma=0, precision="float32")
+        rec64 = engine64.run(self.T_STEP, lead_spd, engine64.recorder(self.T_STEP))
+        rec32 = engine32.run(self.T_STEP, lead_spd, engine32.recorder(self.T_STEP))
+
+        self.assertEqual(rec32.x.dtype, np.float64)
+        self.assertEqual(rec32.v.dtype, np.float32)
+        self.assertLess(rec32.nbytes, 0.7 * rec64.nbytes)
+        # Divergence from the float64 reference after 960 steps
+        self.assertLess(np.abs(rec64.x - rec32.x).max(), 1e-2)  # [m]
+        self.assertLess(np.abs(rec64.v - rec32.v).max(), 1e-3)  # [m/s]
+
+    def test_heun_allows_larger_steps(self):
+        def final_positions(scheme, dt):
+            engine = PlatoonEngine(self.X0, 25, sigma=0, dt=dt, scheme=scheme)
+            engine.run(int(round(480 / dt)), lead_spd)
+            return engine.x
+
+        reference = final_positions("heun", DT / 32)
+        error_euler = np.abs(final_positions("euler", DT / 4) - reference).max()
+        error_heun = np.abs(final_positions("heun", 2 * DT) - reference).max()
+        self.assertLess(error_heun, error_euler)
+
+        with self.assertRaises(ValueError):
+            PlatoonEngine(self.X0, 25, scheme="rk45")
+
+    def test_parameter_batch(self):
+        grid = parameter_grid(c1=[0.3, 0.5], c2=[0.4, 0.6], u=[20, 25, 30])
+        batch = PlatoonEngine.batch(self.X0, 25, sigma=0, w=6.25, **grid)
+        rec = batch.run(300, None, batch.recorder(300))
+        self.assertEqual(rec.x.shape, (300, 12, self.N_VEH))
+        for i in range(12):
+            params = {name: values[i] for name, values in grid.items()}
+            single = PlatoonEngine(self.X0, 25, sigma=0, **params)
+            single.run(300)
+            np.testing.assert_allclose(batch.x[i], single.x)
+            np.testing.assert_allclose(batch.v[i], single.v)
+
+        with self.assertRaises(ValueError):
+            PlatoonEngine.batch(self.X0, 25, c1=[0.3, 0.5], c2=[0.4, 0.5, 0.6])
+
+    def test_noise_batch(self):
+        sigmas = [0.0, 0.05, 0.1]
+        for scheme in ("euler", "heun"):
+            batch = PlatoonEngine.batch(
+                self.X0, 25, sigma=sigmas, seed=7, scheme=scheme
+            )
+            batch.run(100, lead_spd)
+            # Noise stream of the batch, one (sets, followers) draw per step
+            noise = iter(
+                np.random.default_rng(7).standard_normal((100, 3, self.N_VEH - 1))
+            )
+            rows = list(noise)
+            for i, sigma in enumerate(sigmas):
+                stream = iter(row[i] for row in rows)
+                single = PlatoonEngine(self.X0, 25, sigma=sigma, scheme=scheme)
+                single.rng = mock.Mock(
+                    standard_normal=lambda shape, dtype: next(stream)
+                )
+                single.run(100, lead_spd)
+                np.testing.assert_allclose(batch.x[i], single.x)
+                np.testing.assert_allclose(batch.v[i], single.v)
+
+    def test_fast_forward_sparse_traffic(self):
+        rng = np.random.default_rng(2)
+        n_veh, n_step = 200, 600
+        x0 = np.flip(np.cumsum(300 + rng.exponential(1200, n_veh)))
+        x0[-20:] = x0[-20] - np.arange(20) * 25  # Interacting tail
+        v0 = rng.uniform(15, 25, n_veh)
+
+        engine = PlatoonEngine(x0, v0, sigma=0)
+        sparse = FastForwardEngine(x0, v0, sigma=0)
+        engine.run(n_step, lead_spd)
+        sparse.run(n_step, lead_spd)
+        sparse.sync()
+
+        np.testing.assert_allclose(sparse.x, engine.x, rtol=0, atol=1e-6)
+        np.testing.assert_allclose(sparse.v, engine.v, rtol=0, atol=1e-6)
+        self.assertLess(sparse.updates, 0.25 * n_veh * n_step)
+
+
+class TestPlottools(unittest.TestCase):
+    def setUp(self):
+        engine = PlatoonEngine(np.flip(np.arange(100) * 30.0), 25, seed=3)
+        self.rec = engine.run(200, None, engine.recorder(200))
+
+    def test_packed_and_raster_modes(self):
+        rec = self.rec
+        packed = plot_multiple_trajectories(
+            rec.t, rec.x, rec.v, mode="packed", n_out=50
+        )
+        raster = plot_multiple_trajectories(rec.t, rec.x, rec.v, mode="raster")
+        self.assertEqual(len(packed.renderers), 2)
+        self.assertEqual(len(raster.renderers), 1)
+        self.assertEqual(len(packed.renderers[1].data_source.data["x"]), 50 * 100)
+        self.assertEqual(raster.renderers[0].glyph.color_mapper.nan_color, EMPTY_COLOR)
+
+    def test_glyphs_decimation(self):
+        rec = self.rec
+        glyphs = plot_multiple_trajectories(
+            rec.t, rec.x[:, :5], rec.v[:, :5], mode="glyphs", n_out=20
+        )
+        self.assertEqual(len(glyphs.renderers), 10)  # Markers and line per vehicle
+        self.assertEqual(len(glyphs.renderers[0].data_source.data["x"]), 20)
+        with self.assertRaises(ValueError):
+            plot_multiple_trajectories(rec.t, rec.x, rec.v, mode="contour")
+
+    def test_raster_closed_ranges(self):
+        x, y = np.array([0.0, 10.0, 10.0, 11.0]), np.array([0.0, 5.0, 0.0, 5.0])
+        image = rasterize_points(
+            x, y, np.array([1.0, 2.0, 3.0, 4.0]), (0, 10), (0, 5), shape=(2, 2)
+        )
+        np.testing.assert_array_equal(
+            image, [[1, 3], [np.nan, 2]]
+        )  # Point past x_range dropped
+
+    def test_figure_sizes(self):
+        t = np.arange(10.0)
+        for p in (
+            plot_single_trace(t, t, p_height=300, p_width=400),
+            plot_histogram(t),
+            plot_stairs(t, t),
+            FundamentalDiagram().plot_diagram(),
+        ):
+            self.assertGreater(p.height * p.width, 0)
+
+    def test_lttb_keeps_extremes(self):
+        idx = lttb(self.rec.t, self.rec.v, 20)
+        self.assertEqual(idx.shape, (20, 100))
+        self.assertTrue(np.all(idx[0] == 0))
+        self.assertTrue(np.all(idx[-1] == 199))
+        self.assertTrue(np.all(np.diff(idx, axis=0) > 0))
+
+    def test_space_time_heatmap(self):
+        time = np.arange(100.0)
+        x = 25 * time[:, None] + np.arange(0, 4000, 40.0)[None, :]
+        v = np.full_like(x, 25)
+        grid = bin_space_time(time, x, v, dt_bin=20, dx_bin=200, x_range=(0, 4000))
+
+        inner = grid["count"][13:19]  # Cells inside the platoon the whole period
+        self.assertTrue(np.all(inner > 0))
+        np.testing.assert_allclose(grid["density"][13:19], 1 / 40)
+        np.testing.assert_allclose(grid["flow"][13:19], 25 / 40)
+        np.testing.assert_allclose(grid["speed"][13:19], 25)
+        heatmap = plot_space_time(grid)
+        self.assertEqual(len(heatmap.renderers), 1)
+        self.assertEqual(heatmap.renderers[0].glyph.color_mapper.nan_color, EMPTY_COLOR)
+
+
+class TestSimulationControl(unittest.TestCase):
+    def setUp(self):
+        self.network = TrafficNetwork()
+        link = self.network[next(iter(self.network))]
+        self.lane = link[next(iter(link))]
+        for i in range(50):
+            self.lane.attach_vehicle(
+                Tampere(x0=10000 - i * 30.0, v0=25, veh_type="HDV")
+            )
+
+    def test_run_simulation(self):
+        sim = SimulationControl(self.network, 20)
+        self.assertEqual(sim.run_simulation(), 20)
+        x, v = self.lane.state()
+        self.assertTrue(np.all(np.diff(x) < 0))
+        self.assertIs(self.lane.veh_list[1].veh_lead, self.lane.veh_list[0])
+
+    def test_live_dashboard(self):
+        sim = SimulationControl(self.network, 100)
+        dashboard = LiveDashboard(every=5, min_interval=0, rollover=120)
+        sim.add_monitor(dashboard)
+        sim.add_monitor(lambda k, net: k == 40 and dashboard.abort())
+
+        self.assertEqual(sim.run_simulation(), 41)
+        self.assertEqual(dashboard.updates, 8)
+        self.assertEqual(len(dashboard.trajectories.data["x"]), 120)
+        self.assertEqual(list(dashboard.counts.data["n"]), [50] * 8)
+        self.assertEqual(len(dashboard.layout().children), 3)
+
+    def threaded_network(self):
+        network = TrafficNetwork((L_MAX, L_MAX), (2, 3))
+        lanes = [(link, key) for link in network.values() for key in link]
+        for n, (link, key) in enumerate(lanes[:-1]):
+            engine = PlatoonEngine(np.flip(np.arange(500) * 30.0), 25, seed=n)
+            link[key] = EngineLane(engine)
+        link, key = lanes[-1]  # An object lane stepped by the calling thread
+        for i in range(20):
+            link[key].attach_vehicle(
+                Tampere(x0=10000 - i * 30.0, v0=25, veh_type="HDV")
+            )
+        return network
+
+    def test_thread_executor(self):
+        serial, threaded = self.threaded_network(), self.threaded_network()
+        np.random.seed(0)
+        SimulationControl(serial, 50).run_simulation()
+        np.random.seed(0)
+        with ThreadPoolExecutor(4) as executor:
+            SimulationControl(threaded, 50, executor=executor).run_simulation()
+        lanes_s = [lane for link in serial.values() for lane in link.values()]
+        lanes_t = [lane for link in threaded.values() for lane in link.values()]
+        self.assertEqual(sum(lane.parallel for lane in lanes_t), 4)
+        for lane_s, lane_t in zip(lanes_s, lanes_t):
+            np.testing.assert_array_equal(lane_s.state()[0], lane_t.state()[0])
+            np.testing.assert_array_equal(lane_s.state()[1], lane_t.state()[1])
+
+        with self.assertRaises(TypeError):
+            lanes_t[0].attach_vehicle(self.lane.veh_list[0])
+
+    def test_owned_thread_pool(self):
+        serial, threaded = self.threaded_network(), self.threaded_network()
+        np.random.seed(0)
+        SimulationControl(serial, 20).run_simulation()
+        np.random.seed(0)
+        sim = SimulationControl(threaded, 20, executor=2)
+        sim.run_simulation()
+        self.assertIsNone(sim._executor)  # Shut down after the run
+        lanes_s = [lane for link in serial.values() for lane in link.values()]
+        lanes_t = [lane for link in threaded.values() for lane in link.values()]
+        for lane_s, lane_t in zip(lanes_s, lanes_t):
+            np.testing.assert_array_equal(lane_s.state()[0], lane_t.state()[0])
+
+        with ThreadPoolExecutor(2) as executor:
+            with SimulationControl(threaded, 5, executor=executor) as sim:
+                sim.run_simulation()
+            self.assertIs(sim._executor, executor)  # Caller's pool left open
+            self.assertEqual(executor.submit(int, 3).result(), 3)
+        with SimulationControl(threaded, 5, executor=2) as sim:
+            sim.evolve_lanes()
+            pool = sim._executor
+        self.assertIsNone(sim._executor)
+        with self.assertRaises(RuntimeError):
+            pool.submit(int, 3)
+
+    def test_acceptance_schedule(self):
+        vehicles = list(self.lane.veh_list)
+        t_accept = (np.arange(50) * 7) % 40  # Steps 0..39, unsorted
+        msg = Msg1(X_CONGESTION)
+        schedule = AcceptanceSchedule(vehicles, t_accept, msg)
+        sim = SimulationControl(self.network, 20)
+        sim.set_schedule(schedule, dt=1)
+        sim.run_simulation()
+        for veh, t in zip(vehicles, t_accept):
+            self.assertEqual(veh.acc, t <= 19)
+        self.assertEqual(len(schedule), (t_accept > 19).sum())
+        times = [t for t, _ in schedule.log]
+        self.assertEqual(times, sorted(times))
+        self.assertEqual(schedule.accept(19), 0)  # Already consumed
+        self.assertEqual(schedule.accept(100), len(schedule.log) - len(times))
+        self.assertEqual(len(schedule), 0)
+
+    def test_sampled_schedule(self):
+        for i, veh in enumerate(self.lane.veh_list):
+            veh.type = "CAV" if i % 2 else "HDV"
+        schedule = AcceptanceSchedule.sample(
+            self.lane.veh_list, Msg1(X_CONGESTION), 500, 100, seed=0
+        )
+        self.assertEqual(len(schedule), 25)
+        self.assertTrue(np.all((schedule.times > 0) & (schedule.times <= 500)))
+        self.assertTrue(np.all(np.diff(schedule.times) >= 0))
+        self.assertEqual(schedule.accept(500), 25)
+
+
+class TestV2VChannel(unittest.TestCase):
+    def test_latency_and_hold(self):
+        channel = V2VChannel(4, latency=2.0, jitter=0, loss=0, dt=1.0)
+        for k in range(6):
+            channel.broadcast(k + np.arange(4.0), np.ones(4), np.zeros(4))
+        x, v, _, age = channel.receive([0, 1, 2], [1, 2, 3], np.arange(1.0, 4.0))
+        np.testing.assert_array_equal(x, 3 + np.arange(3.0))  # Sent 2 steps ago
+        np.testing.assert_array_equal(age, 2.0)
+
+        channel.loss = 1.0
+        channel.broadcast(10 + np.arange(4.0), np.ones(4), np.zeros(4))
+        x, _, _, age = channel.receive([0, 1, 2], [1, 2, 3], np.arange(1.0, 4.0))
+        np.testing.assert_array_equal(x, 3 + np.arange(3.0))  # Held copy
+        np.testing.assert_array_equal(age, 3.0)
+
+    def test_batch_loss_and_range(self):
+        channel = V2VChannel(10000, latency=0, jitter=0, loss=0.2, radius=50, seed=1)
+        x = -40.0 * np.arange(10000)
+        x[5000:] -= 100  # Gap out of range
+        channel.broadcast(x, np.zeros(10000), np.zeros(10000))
+        senders, receivers = np.arange(9999), np.arange(1, 10000)
+        *_, age = channel.receive(senders, receivers, x[1:])
+        self.assertFalse(np.isfinite(age[4999]))
+        self.assertAlmostEqual(channel.delivery_ratio, 0.8, delta=0.02)
+
+    def test_ideal_channel_matches_engine(self):
+        x0 = -40.0 * np.arange(100)
+        engine = PlatoonEngine(x0, 25, sigma=0)
+        reference = engine.run(300, lead_spd, engine.recorder(300))
+        for channel in (
+            V2VChannel(100, latency=0, jitter=0, loss=0),
+            V2VChannel(100, loss=1.0),  # Never delivered: sensed leader state
+        ):
+            connected = ConnectedPlatoonEngine(x0, 25, channel, sigma=0)
+            record = connected.run(300, lead_spd, connected.recorder(300))
+            np.testing.assert_array_equal(record.x, reference.x)
+
+    def test_latency_changes_platoon(self):
+        x0 = -40.0 * np.arange(100)
+        engine = PlatoonEngine(x0, 25, sigma=0)
+        reference = engine.run(300, lead_spd, engine.recorder(300))
+        channel = V2VChannel(100, latency=1.0, jitter=0, loss=0)
+        connected = ConnectedPlatoonEngine(x0, 25, channel, sigma=0)
+        record = connected.run(300, lead_spd, connected.recorder(300))
+        np.testing.assert_array_equal(record.x[:, 0], reference.x[:, 0])
+        self.assertGreater(np.abs(record.x[:, 1:] - reference.x[:, 1:]).max(), 1)
+
+
+class TestBroadcast(unittest.TestCase):
+    def setUp(self):
+        self.network = TrafficNetwork()
+        link = self.network[next(iter(self.network))]
+        self.lane = link[next(iter(link))]
+        for i in range(200):
+            veh_type = "CAV" if i % 3 == 0 else "HDV"
+            self.lane.attach_vehicle(
+                Tampere(x0=10000 - i * 30.0, v0=25, veh_type=veh_type)
+            )
+
+    def test_range_query(self):
+        x = np.sort(np.random.uniform(0, 1000, 500))
+        lo, hi = range_query(x, [100, 500], [50, 120])
+        np.testing.assert_array_equal(x[lo[0] : hi[0]], x[np.abs(x - 100) <= 50])
+        np.testing.assert_array_equal(x[lo[1] : hi[1]], x[np.abs(x - 500) <= 120])
+
+    def test_delivery_within_radius(self):
+        rsu = RoadsideUnit(8000, Msg1(X_CONGESTION), radius=300)
+        sim = BroadcastSimulator([rsu])
+        sim.deliver(self.lane.veh_list)
+        expected = {
+            veh.idx
+            for veh in self.lane.veh_list
+            if veh.type == "CAV" and abs(veh.x_t - 8000) <= 300
+        }
+        received = {veh.idx for veh in self.lane.veh_list if veh.acc}
+        self.assertEqual(received, expected)
+        self.assertEqual(rsu.delivered, len(expected))
+        self.assertEqual(sim.deliver(self.lane.veh_list), 0)  # Already accepted
+
+    def test_delivery_reads_few_positions(self):
+        class CountingList(list):
+            reads = 0
+
+            def __getitem__(self, i):
+                CountingList.reads += 1
+                return super().__getitem__(i)
+
+        vehicles = CountingList(self.lane.veh_list)
+        sim = BroadcastSimulator([RoadsideUnit(8000, Msg1(X_CONGESTION), radius=50)])
+        sim.deliver(vehicles)
+        self.assertEqual(sum(veh.acc for veh in vehicles), 1)  # CAV at 8020
+        self.assertLess(CountingList.reads, 2 * 8 + 4)  # Binary searches, in range
+
+    def test_broadcast_monitor(self):
+        sim = SimulationControl(self.network, 60)
+        broadcast = BroadcastSimulator([RoadsideUnit(10500, Msg1(X_CONGESTION))])
+        sim.add_monitor(broadcast)
+        sim.run_simulation()
+        for veh in self.lane.veh_list:
+            self.assertEqual(veh.acc, veh.type == "CAV" and veh.x_t >= 10200)
+        times = [t for t, _, _ in broadcast.log]
+        self.assertEqual(times, sorted(times))
+
+
+class TestCongestionDetection(unittest.TestCase):
+    def setUp(self):
+        self.network = TrafficNetwork()
+        link = self.network[next(iter(self.network))]
+        self.lane = link[next(iter(link))]
+        for i in range(200):
+            veh_type = "CAV" if i % 3 == 0 else "HDV"
+            veh = Tampere(x0=10000 - i * 30.0, v0=25, veh_type=veh_type)
+            if 7000 <= veh.x_t < 8000:
+                veh.v_t = 5.0
+            self.lane.attach_vehicle(veh)
+
+    def test_streaming_moments(self):
+        rng = np.random.default_rng(0)
+        bins = StreamingBins(10, dx=100, forget=1.0)
+        x = rng.uniform(0, 1000, (50, 40))
+        v = rng.normal(20, 3, (50, 40))
+        for x_k, v_k in zip(x, v):
+            bins.update(x_k, v_k)
+        cell = (x // 100).astype(int).ravel()
+        for b in range(10):
+            np.testing.assert_allclose(bins.mean[b], v.ravel()[cell == b].mean())
+            np.testing.assert_allclose(bins.variance[b], v.ravel()[cell == b].var())
+            self.assertEqual(bins.weight[b], (cell == b).sum())
+
+    def test_forgetting(self):
+        bins = StreamingBins(1, dx=100, forget=0.5)
+        bins.update([50], [20.0])
+        for _ in range(30):
+            bins.update([50], [5.0])
+        self.assertAlmostEqual(bins.mean[0], 5.0, places=6)
+        self.assertAlmostEqual(bins.weight[0], 2.0, places=6)
+
+    def test_detect_fronts(self):
+        speed = np.array([25, 25, 5, 5, 25, 10, 0, 25])
+        observed = np.array([1, 1, 1, 1, 1, 1, 0, 1], dtype=bool)
+        np.testing.assert_array_equal(detect_fronts(speed, observed), [2, 5])
+
+    def test_message_parameters(self):
+        msg = Msg2(6000, drop=10, x_congestion=7000)
+        self.assertAlmostEqual(msg(0), 25, places=3)
+        self.assertAlmostEqual(msg(6500), 15, places=3)
+        self.assertAlmostEqual(msg(12000), 25, places=3)
+        self.assertAlmostEqual(
+            Msg1(X_CONGESTION)(20000), 25 - SPEED_REDUCTION, places=3
+        )
+
+    def test_announce_at_front(self):
+        monitor = CongestionMonitor(dx=100, horizon=3000)
+        self.assertFalse(monitor(1, self.network))
+        self.assertEqual([front for _, front, _ in monitor.log], [7000])
+        for veh in self.lane.veh_list:
+            warned = veh.type == "CAV" and 4000 <= veh.x_t <= 7000
+            self.assertEqual(veh.acc, warned)
+            if warned:
+                self.assertEqual(veh._vd.x_congestion, 7000)
+        monitor(2, self.network)
+        self.assertEqual(len(monitor.log), 1)  # Front did not move
+
+    def test_reissue_moving_front(self):
+        monitor = CongestionMonitor(dx=100, forget=0.1, tolerance=200)
+        monitor(1, self.network)
+        for veh in self.lane.veh_list:
+            veh.v_t = 5.0 if 6500 <= veh.x_t < 8000 else 25.0
+        monitor(2, self.network)
+        self.assertEqual([front for _, front, _ in monitor.log], [7000, 6500])
+        head = [
+            veh for veh in self.lane.veh_list if veh.type == "CAV" and veh.x_t < 6500
+        ]
+        self.assertTrue(all(veh._vd.x_congestion == 6500 for veh in head))
+
+
+def quadratic(theta):
+    """ Test objective with minimum at (1, 2)"""
+    return float((theta[0] - 1) ** 2 + (theta[1] - 2) ** 2)
+
+
+class TestMessageOptimizer(unittest.TestCase):
+    def test_cache(self):
+        evaluate = BatchEvaluator(quadratic, workers=1)
+        values = evaluate([[0, 0], [1, 2], [0, 0]])
+        np.testing.assert_allclose(values, [5, 0, 5])
+        self.assertEqual((evaluate.hits, evaluate.misses), (1, 2))
+        evaluate([[1, 2], [3, 3]])
+        self.assertEqual((evaluate.hits, evaluate.misses), (2, 3))
+
+    def test_cross_entropy(self):
+        bounds = [[-5, 5], [-5, 5]]
+        evaluate = BatchEvaluator(quadratic, workers=1)
+        theta, value, history = cross_entropy(evaluate, bounds, iterations=15, seed=0)
+        np.testing.assert_allclose(theta, [1, 2], atol=0.05)
+        self.assertTrue(np.all(np.diff(history) <= 0))
+        _, best = random_search(evaluate, bounds, samples=16, seed=0)
+        self.assertGreaterEqual(best, value)
+
+    def test_scenario_pool(self):
+        scenario = MessageScenario(x0=10000 - np.arange(20) * 40.0, n_steps=300)
+        thetas = np.array([[13000, 5.5, 15000], [14000, 0, 15000]])
+        serial = BatchEvaluator(scenario, workers=1)(thetas)
+        with BatchEvaluator(scenario, workers=2) as evaluate:
+            np.testing.assert_allclose(evaluate(thetas), serial)
+        self.assertNotEqual(serial[0], serial[1])
+
+    def test_travel_time(self):
+        scenario = MessageScenario(
+            x0=10000 - np.arange(20) * 40.0, kpi=total_travel_time
+        )
+        slow = scenario([11000, 10, 16000])
+        self.assertGreater(slow, scenario([11000, 0, 16000]))
+
+
+class TestCalibration(unittest.TestCase):
+    def setUp(self):
+        x0 = np.flip(np.arange(30) * 30.0) + 3000
+        engine = PlatoonEngine(x0, 25, sigma=0, c1=0.3, c2=0.2, c3=0.8)
+        self.pairs = pairs_from_record(engine.run(400, lead_spd, engine.recorder(400)))
+
+    def test_replay_matches_engine(self):
+        calibration = Calibration(*self.pairs)
+        error = calibration([[0.3, 0.2, 0.8], [0.5, 0.5, 0.5]])
+        self.assertAlmostEqual(error[0], 0, places=9)
+        self.assertGreater(error[1], 1)
+
+    def test_fit_tampere(self):
+        calibration = Calibration(*self.pairs)
+        params, error = calibration.fit(population=64, iterations=20, seed=0)
+        self.assertLess(error, 0.5)
+        self.assertAlmostEqual(params["c2"], 0.2, delta=0.05)
+
+    def test_fit_idm(self):
+        x_lead, v_lead, x_fol, v_fol = self.pairs
+        x, v = replay_followers(
+            x_lead, v_lead, x_fol[:, 0], v_fol[:, 0], "idm", a_max=1.5, T=1.2
+        )
+        calibration = Calibration(x_lead, v_lead, x.T, v.T, "idm", names=("a_max", "T"))
+        params, error = calibration.fit(population=64, iterations=20, seed=0)
+        self.assertLess(error, 0.5)
+        self.assertAlmostEqual(params["T"], 1.2, delta=0.1)
+
+        with self.assertRaises(ValueError):
+            Calibration(*self.pairs, model="idm", names=("c1",))
+
+
+class TestLeaderReplay(unittest.TestCase):
+    N_VEH = 20
+    T_STEP = 600
+
+    def setUp(self):
+        self.x0 = np.flip(np.arange(self.N_VEH) * 30.0) + 3000
+        self.engine = PlatoonEngine(self.x0, 25, sigma=0)
+        self.rec = self.engine.run(
+            self.T_STEP, lead_spd, self.engine.recorder(self.T_STEP)
+        )
+        self.tmp = tempfile.TemporaryDirectory()
+        # Leader trajectories: the platoon leader and a shifted copy
+        t = np.r_[0, self.rec.t]
+        x = np.r_[self.x0[0], self.rec.x[:, 0]]
+        v = np.r_[25, self.rec.v[:, 0]]
+        self.path = os.path.join(self.tmp.name, "leaders.npy")
+        save_trajectories(self.path, t, [x, x + 100], [v, v])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_memory_mapped_interpolation(self):
+        store = load_trajectories(self.path)
+        self.assertIsInstance(store.data, np.memmap)
+        self.assertEqual((len(store), store.n_steps), (2, self.T_STEP + 1))
+        t = 10 * DT
+        np.testing.assert_allclose(
+            store.interpolate("x", [0, 1], t), self.rec.x[9, 0] + [0, 100]
+        )
+        middle = store.interpolate("x", 0, t + DT / 2)
+        self.assertAlmostEqual(middle, (self.rec.x[9, 0] + self.rec.x[10, 0]) / 2)
+        self.assertEqual(store.interpolate("v", 0, -5), 25)  # Held before the start
+
+    def test_engine_leader_replay(self):
+        store = load_trajectories(self.path)
+        replayed = PlatoonEngine(self.x0, 25, sigma=0, leader=store.leader(0))
+        replayed.run(self.T_STEP)
+        np.testing.assert_allclose(replayed.x, self.engine.x)
+
+        batch = PlatoonEngine(
+            np.tile(self.x0, (2, 1)), 25, sigma=0, leader=store.leader([0, 1])
+        )
+        batch.run(self.T_STEP)
+        np.testing.assert_allclose(batch.x[0], self.engine.x)
+        self.assertAlmostEqual(batch.x[1, 0] - batch.x[0, 0], 100)
+
+    def test_replay_vehicle_leads_lane(self):
+        store = load_trajectories(self.path)
+        network = TrafficNetwork()
+        link = network[next(iter(network))]
+        lane = link[next(iter(link))]
+        lane.attach_vehicle(ReplayVehicle(store.leader(0)))
+        for x0 in self.x0[1:]:
+            lane.attach_vehicle(Tampere(x0=x0, v0=25, veh_type="HDV"))
+        with mock.patch.object(carfollow, "SIGMA_A", 0):
+            SimulationControl(network, self.T_STEP).run_simulation()
+        x, _ = lane.state()
+        np.testing.assert_allclose(x, self.engine.x)
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow not installed")
+    def test_parquet(self):
+        path = os.path.join(self.tmp.name, "leaders.parquet")
+        store = load_trajectories(self.path)
+        save_trajectories(path, store.data[0], store.data[1], store.data[2])
+        loaded = load_trajectories(path)
+        self.assertIsInstance(loaded.data, np.memmap)
+        np.testing.assert_allclose(loaded.data, store.data)
+        self.assertEqual(parquet_cache(path), Path(path + ".npy"))
+
+    def test_parquet_cache(self):
+        # A cache newer than the Parquet file is mapped without pyarrow
+        path = os.path.join(self.tmp.name, "cached.parquet")
+        open(path, "wb").close()
+        os.utime(path, (0, 0))
+        store = load_trajectories(self.path)
+        save_trajectories(path + ".npy", store.data[0], store.data[1], store.data[2])
+        loaded = load_trajectories(path)
+        self.assertIsInstance(loaded.data, np.memmap)
+        np.testing.assert_array_equal(loaded.data, store.data)
+
+
+class TestWhatIf(unittest.TestCase):
+    def setUp(self):
+        self.x0 = np.flip(np.arange(100) * 30.0) + 3000
+
+    def reference(self, **params):
+        engine = PlatoonEngine(self.x0, 25, sigma=0, **params)
+        return engine.run(400, lead_spd, engine.recorder(400))
+
+    def test_edit_follower(self):
+        platoon = WhatIfPlatoon(self.x0, 25, 400, lead_spd)
+        np.testing.assert_allclose(platoon.x[1:], self.reference().x)
+        full = platoon.updates
+
+        platoon.modify(80, c1=0.2, c2=0.3)
+        platoon.modify(90, k_x=0.12)
+        c1, c2, k_x = np.full(100, 0.5), np.full(100, 0.5), np.full(100, 0.16)
+        c1[80], c2[80], k_x[90] = 0.2, 0.3, 0.12
+        np.testing.assert_allclose(
+            platoon.x[1:], self.reference(c1=c1, c2=c2, k_x=k_x).x
+        )
+        self.assertEqual(platoon.updates - full, 400 * 21)
+
+    def test_edit_leader(self):
+        platoon = WhatIfPlatoon(self.x0, 25, 400, lead_spd)
+        platoon.simulate()
+        platoon.modify(0, x0=self.x0[0] + 10)
+        self.x0[0] += 10
+        np.testing.assert_allclose(platoon.x[1:], self.reference().x)
+        self.assertEqual(platoon.updates, 2 * 400 * 100)
+
+        with self.assertRaises(ValueError):
+            platoon.modify(3, sigma=0.1)
+
+
+def failing_control(x):
+    """ Leader control raising inside a pipeline worker"""
+    raise RuntimeError("control failure")
+
+
+class TestWavefrontPipeline(unittest.TestCase):
+    def setUp(self):
+        self.x0 = np.flip(np.arange(200) * 30.0) + 3000
+
+    def test_matches_engine(self):
+        c1 = np.linspace(0.3, 0.7, 200)
+        engine = PlatoonEngine(self.x0, 25, sigma=0, c1=c1)
+        record = engine.run(300, lead_spd, engine.recorder(300))
+        pipeline = WavefrontPipeline(self.x0, 25, blocks=3, depth=8, sigma=0, c1=c1)
+        t, x, v = pipeline.run(300, lead_spd, every=10)
+        np.testing.assert_allclose(t, record.t[9::10])
+        np.testing.assert_array_equal(x, record.x[9::10])
+        np.testing.assert_array_equal(v, record.v[9::10])
+
+        # Two slot rings, every slot is reused many times
+        pipeline = WavefrontPipeline(self.x0, 25, blocks=5, depth=2, sigma=0, c1=c1)
+        _, x, _ = pipeline.run(300, lead_spd, every=10)
+        np.testing.assert_array_equal(x, record.x[9::10])
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            WavefrontPipeline(self.x0, 25, scheme="heun")
+        pipeline = WavefrontPipeline(self.x0, 25, blocks=3)
+        start = time.perf_counter()
+        with self.assertRaisesRegex(RuntimeError, r"blocks \[0\] failed"):
+            pipeline.run(10, failing_control)
+        # Blocks waiting on the failed one are stopped, not left to time out
+        self.assertLess(time.perf_counter() - start, pipeline.timeout / 2)
+
+
+class TestDomainDecomposition(unittest.TestCase):
+    def setUp(self):
+        self.x0 = np.flip(np.arange(300) * 20.0) + 1000
+
+    def test_matches_engine(self):
+        engine = PlatoonEngine(self.x0, 25, sigma=0)
+        engine.run(400, lead_spd)
+        corridor = DomainDecomposition(self.x0, 25, domains=3, sigma=0)
+        self.assertEqual(corridor.domains, 3)
+        x, v, a = corridor.run(400, lead_spd)
+        np.testing.assert_array_equal(x, engine.x)
+        np.testing.assert_array_equal(v, engine.v)
+        np.testing.assert_array_equal(a, engine.a)
+
+    def test_empty_domains(self):
+        engine = PlatoonEngine(self.x0, 25, sigma=0)
+        engine.run(200, lead_spd)
+        # Domains far downstream start empty and fill as vehicles arrive
+        corridor = DomainDecomposition(self.x0, 25, edges=[4000, 7000, 50000], sigma=0)
+        x, _, _ = corridor.run(200, lead_spd)
+        np.testing.assert_array_equal(x, engine.x)
+
+        with self.assertRaises(ValueError):
+            DomainDecomposition(self.x0[::-1], 25)
+
+    def test_outbox_capacity(self):
+        corridor = DomainDecomposition(self.x0, 25, domains=3, sigma=0)
+        self.assertEqual(corridor.capacity, 6)  # Jam density over 28 m
+        # Vehicles 8 m apart at 25 m/s, several cross an edge in one step
+        corridor = DomainDecomposition(
+            self.x0 / 2.5, 25, domains=3, sigma=0, capacity=1, timeout=5
+        )
+        with self.assertRaises(RuntimeError):
+            corridor.run(50, lead_spd)
+
 
 # @pytest.fixture
 # def response():
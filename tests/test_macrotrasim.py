@@ -3,9 +3,20 @@
 """Tests for `macrotrasim` package."""
 
 import pytest
-
+import unittest
 
 from itstools.macrotrasim import macrotrasim
+from itstools.connectv2x.demand import Demand
+from itstools.connectv2x.engine import PlatoonEngine
+from itstools.connectv2x.network import TrafficNetwork
+from itstools.connectv2x.support import speed_pulse
+from itstools.macrotrasim.assimilation import EnsembleKalmanFilter, cav_observations
+from itstools.macrotrasim.hybrid import HybridCorridor, hdv
+from itstools.macrotrasim.junctions import Incidence, diverge, merge, node_flows
+from itstools.macrotrasim.lagrangian import LagrangianLWR
+from itstools.macrotrasim.macrotrasim import DX, CellTransmissionModel
+from itstools.macrotrasim.network import NetworkCTM
+import numpy as np
 
 
 @pytest.fixture
@@ -22,3 +33,178 @@ def test_content(response):
     """Sample pytest test function with the pytest fixture as an argument."""
     # from bs4 import BeautifulSoup
     # assert 'GitHub' in BeautifulSoup(response.content).title.string
+
+
+class TestCellTransmission(unittest.TestCase):
+    def test_conservation(self):
+        ctm = CellTransmissionModel(100, k0=0.02)
+        ctm.run(500, demand=0.5, supply=0.3)
+        self.assertAlmostEqual(ctm.vehicles, 100 * DX * 0.02 + ctm.inflow - ctm.outflow)
+
+    def test_free_flow_steady_state(self):
+        ctm = CellTransmissionModel(100)
+        ctm.run(500, demand=0.4)
+        np.testing.assert_allclose(ctm.k, 0.4 / ctm.fd.u)
+        np.testing.assert_allclose(ctm.q, 0.4)
+
+    def test_shock_speed(self):
+        # Rankine-Hugoniot: (0 - q(0.02)) / (k_x - 0.02)
+        ctm = CellTransmissionModel(200, k0=0.02)
+        fd = ctm.fd
+        t, k = ctm.run(300, demand=0.5, supply=0.0, every=100)
+        speed = -fd.compute_flow(np.array(0.02)) / (fd.k_x - 0.02)
+        jam = np.sum(k[-1] > (fd.k_x + 0.02) / 2) * DX
+        self.assertAlmostEqual(jam, -speed * t[-1], delta=2 * DX)
+
+    def test_ensemble_axis(self):
+        demand = np.array([0.2, 0.5, 0.9])
+        ctm = CellTransmissionModel(50, k0=np.zeros((3, 50)))
+        ctm.run(100, demand=demand)
+        for i, d in enumerate(demand):
+            single = CellTransmissionModel(50)
+            single.run(100, demand=d)
+            np.testing.assert_allclose(ctm.k[i], single.k)
+
+    def test_cfl_condition(self):
+        with self.assertRaises(ValueError):
+            CellTransmissionModel(10, dx=10)
+
+
+class TestNetworkCTM(unittest.TestCase):
+    def test_chain_matches_single_link(self):
+        network = TrafficNetwork((1000, 1000), (1, 1))
+        network.set_physical_connection([[0, 1], [0, 0]])
+        net_ctm = NetworkCTM(network)
+        link_ctm = CellTransmissionModel(80)
+        net_ctm.run(300, demand=0.6, supply=0.2)
+        link_ctm.run(300, demand=0.6, supply=0.2)
+        np.testing.assert_allclose(net_ctm.k, link_ctm.k)
+
+    def test_junction_models(self):
+        # 0 and 1 merge into 3, 2 diverges into 4 and 5
+        sending = np.array([0.5, 0.4, 0.3, 0, 0, 0])
+        receiving = np.array([0, 0, 0, 0.6, 0.6, 0.1])
+        up = Incidence([0, 1, 2, 2], 6)
+        down = Incidence([3, 3, 4, 5], 6)
+        split = np.array([1.0, 1.0, 0.5, 0.5])
+        flows = node_flows(sending, receiving, split, up, down)
+        np.testing.assert_allclose(flows[:2], merge(sending[:2], 0.6))
+        np.testing.assert_allclose(flows[2:], diverge(0.3, receiving[4:], split[2:]))
+
+        np.testing.assert_allclose(merge(sending[:2], 0.6), [1 / 3, 4 / 15])
+        np.testing.assert_allclose(
+            diverge(0.3, np.array([0.6, 0.1]), np.array([0.5, 0.5])), 0.1
+        )
+
+    def test_diverge_merge_conservation(self):
+        network = TrafficNetwork((1000,) * 4, (2, 1, 1, 1))
+        network.set_physical_connection(
+            [[0, 0.7, 0.3, 0], [0, 0, 0, 1], [0, 0, 0, 1], [0, 0, 0, 0]]
+        )
+        ctm = NetworkCTM(network)
+        inflow = outflow = 0
+        for _ in range(1000):
+            f_in, f_out = ctm.fluxes(demand=1.2)
+            inflow += f_in[ctm.first[ctm.sources]].sum() * ctm.dt
+            outflow += f_out[ctm.last[ctm.sinks]].sum() * ctm.dt
+            ctm.step(demand=1.2)
+        self.assertAlmostEqual(ctm.vehicles, inflow - outflow)
+        # Two lanes upstream: the single lane merge is the bottleneck
+        link = ctm.link_density(network.connections[0][0])
+        self.assertGreater(link[-1], ctm.fd.k_c[0])
+
+    def test_invalid_split_ratios(self):
+        network = TrafficNetwork((1000, 1000), (1, 1))
+        with self.assertRaises(ValueError):
+            network.set_physical_connection([[0, 0.5], [0, 0]])
+
+
+class TestHybridCorridor(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(7)
+
+    def test_free_flow_coupling(self):
+        corridor = HybridCorridor(length=10000, window=(4000, 6000))
+        corridor.run(800, demand=0.4)
+        self.assertAlmostEqual(
+            corridor.vehicles, corridor.upstream.inflow - corridor.downstream.outflow
+        )
+        np.testing.assert_allclose(corridor.window_density().mean(), 0.016, rtol=0.05)
+        np.testing.assert_allclose(corridor.downstream.k[:40].mean(), 0.016, rtol=0.05)
+
+    def test_window_congestion_spills_back(self):
+        def slow_vehicle(x0, v0):
+            veh = hdv(x0, v0)
+            veh.register_control_speed(lambda x: 10.0)
+            return veh
+
+        corridor = HybridCorridor(
+            length=10000, window=(4000, 6000), vehicle=slow_vehicle
+        )
+        corridor.run(600, demand=0.7)
+        self.assertGreater(corridor.upstream.k[-1], corridor.fd.k_c)
+        _, v = corridor.lane.state()
+        np.testing.assert_allclose(v[:20], 10, atol=0.5)
+
+
+class TestLagrangianLWR(unittest.TestCase):
+    def test_matches_microscopic_trajectories(self):
+        x0 = -50.0 * np.arange(200)
+        engine = PlatoonEngine(x0, 25, sigma=0)
+
+        def control(x):
+            return speed_pulse(x, drop=5, delay=5000, duration=2000)
+
+        record = engine.run(960, control, engine.recorder(960))
+        for dn, tol in ((1, 0.1), (5, 0.5)):
+            model = LagrangianLWR(x0[::dn], dn=dn)
+            x = np.zeros((960, len(model)))
+            for k in range(960):
+                model.step(record.v[k, 0])  # Leader trajectory of the engine
+                x[k] = model.x
+            rmse = np.sqrt(np.mean((x - record.x[:, ::dn]) ** 2))
+            self.assertLess(rmse, tol)
+
+    def test_from_demand(self):
+        demand = Demand()
+        model = LagrangianLWR.from_demand(demand, dn=2)
+        self.assertEqual(len(model), (len(demand) + 1) // 2)
+        self.assertEqual(model.x[0], demand.full_positions.max())
+        np.testing.assert_array_equal(model.n[:3], [0, 2, 4])
+        self.assertTrue(np.all(np.diff(model.x) <= 0))
+
+    def test_cfl_condition(self):
+        with self.assertRaises(ValueError):
+            LagrangianLWR(-50.0 * np.arange(10), dn=1, dt=2)
+
+
+class TestEnsembleKalmanFilter(unittest.TestCase):
+    def test_cav_observations(self):
+        x = np.array([10.0, 20.0, 30.0, 60.0, 80.0])
+        v = np.array([20.0, 10.0, 5.0, 25.0, 15.0])
+        cells, speeds = cav_observations(
+            x, v, 25, 4, cav=np.array([1, 1, 0, 1, 1], dtype=bool)
+        )
+        np.testing.assert_array_equal(cells, [0, 2, 3])
+        np.testing.assert_allclose(speeds, [15.0, 25.0, 15.0])
+
+    def test_twin_experiment(self):
+        # Unknown downstream bottleneck, estimated from probe speeds
+        rmse = {}
+        for assimilate in (False, True):
+            truth = CellTransmissionModel(200, k0=0.02)
+            enkf = EnsembleKalmanFilter(
+                200, members=40, k0=0.02, seed=1, localization=250
+            )
+            supply = np.random.default_rng(2).uniform(0.3, 0.8, enkf.members)
+            rng = np.random.default_rng(0)
+            for _ in range(600):
+                truth.step(0.5, 0.2)
+                x = rng.uniform(0, 5000, 20)
+                v = truth.fd.speed(truth.k[(x // DX).astype(int)]) + rng.normal(
+                    0, 1, 20
+                )
+                obs = cav_observations(x, v, DX, 200) if assimilate else None
+                enkf.step(0.5, supply, obs)
+            rmse[assimilate] = np.sqrt(np.mean((enkf.mean - truth.k) ** 2))
+        self.assertLess(rmse[True], rmse[False] / 5)
@@ -3,9 +3,15 @@
 """Tests for `vplatoon` package."""
 
 import pytest
+import unittest
 
+import numpy as np
 
 from itstools.vplatoon import vplatoon
+from itstools.vplatoon.carfollow import Tampere
+from itstools.vplatoon.pid import PIDlim
+from itstools.vplatoon.scheduler import MultiRateScheduler, speed_error
+from itstools.vplatoon.vehicles import DT, TAU, Integrator, RegularVehicle, System
 
 
 @pytest.fixture
@@ -22,3 +28,57 @@ def test_content(response):
     """Sample pytest test function with the pytest fixture as an argument."""
     # from bs4 import BeautifulSoup
     # assert 'GitHub' in BeautifulSoup(response.content).title.string
+
+
+def chain_position(scheme, ts, t_total=60):
+    """ Position of a platoon vehicle after a unit control step"""
+    veh = RegularVehicle(0, 20, 0, scheme=scheme, ts=ts)
+    for _ in range(int(round(t_total / ts))):
+        veh(1.0)
+    return veh.x_t
+
+
+class TestIntegration(unittest.TestCase):
+    def test_rectangle_rule(self):
+        integ = Integrator()
+        values = [integ(val) for val in (1, 2, 3, 4)]
+        self.assertEqual(values, [0, DT * 1, DT * 3, DT * 6])
+
+    def test_system_step_response(self):
+        t_final = 10 * DT
+        exact = 1 - np.exp(-t_final / TAU)
+        errors = {}
+        for method in ("euler", "heun", "rk4"):
+            system = System(method=method)
+            for _ in range(10):
+                system(1)
+            errors[method] = abs(system.x[-1] - exact)
+        self.assertLess(errors["heun"], errors["euler"])
+        self.assertLess(errors["rk4"], errors["heun"])
+
+    def test_chain_rk4_larger_steps(self):
+        reference = chain_position("rk4", DT / 64)
+        self.assertLess(abs(chain_position("rk4", 3 * DT) - reference), 1e-3)
+        self.assertLess(abs(chain_position("heun", 3 * DT) - reference), 1e-2)
+
+
+class TestMultiRate(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = MultiRateScheduler(ratio=4)
+        ts = self.scheduler.ts_fast
+        self.lead = RegularVehicle(100, 20, 0, ts=ts)
+        self.hdv = Tampere(70, 20, 0, "HDV", veh_lead=self.lead)
+        self.scheduler.add_loop(self.lead, PIDlim(0.05, 0, 0, ts=ts), speed_error(22))
+        self.scheduler.add_slow(lambda: self.hdv.step_evolution(0))
+
+    def test_rates(self):
+        self.scheduler.run(200)
+        self.assertEqual(len(self.lead.x), 4 * 200 + 1)
+        self.assertEqual(self.scheduler.t, 200 * DT)
+        self.assertAlmostEqual(self.lead.v_t, 22, places=2)
+        self.assertGreater(self.lead.x_t - self.hdv.x_t, 0)
+
+    def test_sampling_mismatch(self):
+        veh = RegularVehicle(0, 20, 0)
+        with self.assertRaises(ValueError):
+            self.scheduler.add_loop(veh, PIDlim(0.05, 0, 0), speed_error(22))